@@ -0,0 +1,314 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: aio.py
+Author: Kris Henderson
+
+asyncio versions of Command, Cardano and Database.
+
+AsyncCardano and AsyncDatabase have the same methods as the classes they
+wrap, each returning an awaitable.  The calls on the payment path (UTXO
+queries, transaction times, senders, signing and submitting) are native:
+cardano-cli runs through asyncio.create_subprocess_exec and db-sync is
+queried through asyncpg when it is installed.  Everything else runs the
+blocking method on a worker thread, so independent calls still overlap.
+
+This is the facade only, the payment loop (tcr.tcr.PaymentProcessor and
+tcr.daemon) still makes the blocking calls.
+"""
+
+from typing import Dict, List, Tuple
+import asyncio
+import json
+import logging
+import os
+import subprocess
+
+from tcr.cardano import Cardano
+from tcr.command import Command, networks, node_socket_env
+from tcr.database import Database
+from tcr.wallet import Wallet
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger('aio')
+
+class AsyncCommand:
+    """
+    Command.run on asyncio.create_subprocess_exec.
+    """
+
+    @staticmethod
+    async def write_to_file(filename, data):
+        """
+        Write a string of data to the given filename.
+        """
+
+        await asyncio.to_thread(Command.write_to_file, filename, data)
+
+    @staticmethod
+    async def run(command: List[str], network: str, input: str = None):
+        """
+        @see Command.run
+        """
+
+        envvars = dict(os.environ)
+
+        if network != None:
+            envvars[node_socket_env['active']] = os.environ[node_socket_env[network]]
+            command.extend(networks[network])
+
+        Command.print_command(command)
+        if input != None:
+            logger.debug('\tinput: {}'.format(input))
+        else:
+            logger.debug('\tinput: None')
+
+        process = await asyncio.create_subprocess_exec(*command,
+                                                       stdin=subprocess.PIPE if input != None else None,
+                                                       stdout=subprocess.PIPE,
+                                                       stderr=subprocess.PIPE,
+                                                       env=envvars)
+        (stdout, stderr) = await process.communicate(input.encode() if input != None else None)
+        stdout = stdout.decode()
+        stderr = stderr.decode()
+        if process.returncode != 0:
+            logger.error('{}, return code: {}'.format(command[0], process.returncode))
+            logger.error('stdout: {}'.format(stdout))
+            logger.error('stderr: {}'.format(stderr))
+            raise subprocess.CalledProcessError(process.returncode, command, output=stdout, stderr=stderr)
+
+        return stdout.strip('\r\n')
+
+class AsyncProxy:
+    """
+    Run the methods of a blocking object on a worker thread.
+    """
+
+    def __init__(self, target):
+        self.target = target
+
+    def __getattr__(self, name):
+        if name == 'target':
+            raise AttributeError(name)
+
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attribute, *args, **kwargs)
+
+        return call
+
+class AsyncCardano(AsyncProxy):
+    """
+    @param max_commands Most cardano-cli processes to run at once
+    """
+
+    def __init__(self, cardano: Cardano, max_commands: int = 8):
+        super().__init__(cardano)
+        self.commands = asyncio.Semaphore(max_commands)
+
+    async def run(self, command: List[str], network: str) -> str:
+        async with self.commands:
+            return await AsyncCommand.run(command, network)
+
+    async def query_tip(self) -> Dict:
+        output = await self.run(['cardano-cli', 'query', 'tip'], self.target.network)
+        return json.loads(output)
+
+    async def query_utxos(self,
+                          wallet: Wallet,
+                          addresses: List[str]=None) -> Tuple[List, int]:
+        """
+        @see Cardano.query_utxos, the addresses are queried at the same time
+        """
+
+        outputs = await asyncio.gather(*[self.run(['cardano-cli', 'query', 'utxo', '--address', payment_address], self.target.network)
+                                         for payment_address in Cardano.get_query_addresses(wallet, addresses)])
+        total_lovelace = 0
+        utxos = []
+        for output in outputs:
+            (address_utxos, address_lovelace) = Cardano.parse_utxos(output)
+            utxos.extend(address_utxos)
+            total_lovelace += address_lovelace
+
+        return (utxos, total_lovelace)
+
+    async def query_utxos_time(self, database, utxos: List):
+        """
+        @see Cardano.query_utxos_time, the UTXOs are looked up at the same time
+
+        @param database An AsyncDatabase or an AsyncProxy of a ChainCache
+        """
+
+        async def query_utxo_time(utxo):
+            for tries in range(0, 5):
+                (txtime, txslotno) = await database.query_txhash_time(utxo['tx-hash'])
+                if txtime != None or txslotno != None:
+                    utxo['time'] = txtime
+                    utxo['slot-no'] = txslotno
+                    return
+
+                logger.warning('time and slotno not found for tx {}, try again'.format(utxo['tx-hash']))
+                await asyncio.sleep(1)
+
+            utxo['time'] = 0
+            utxo['slot-no'] = 0
+
+        await asyncio.gather(*[query_utxo_time(utxo) for utxo in utxos])
+        return utxos
+
+    async def get_transaction_id(self, transaction_signed_file: str) -> str:
+        return await self.run(['cardano-cli', 'transaction', 'txid', '--tx-file', transaction_signed_file], None)
+
+    async def calculate_min_fee(self,
+                                transaction_file: str,
+                                tx_in_count: int,
+                                tx_out_count: int,
+                                witness_count: int) -> int:
+        command = ['cardano-cli', 'transaction', 'calculate-min-fee', '--tx-body-file', transaction_file,
+                   '--tx-in-count', str(tx_in_count), '--tx-out-count', str(tx_out_count),
+                   '--witness-count', str(witness_count),
+                   '--protocol-params-file', self.target.protocol_parameters_file]
+        output = await self.run(command, self.target.network)
+        return int(output.split()[0])
+
+    async def sign_transaction(self,
+                               unsigned_transaction_file: str,
+                               signing_key_file: List[str],
+                               signed_transaction_file: str) -> str:
+        command = ['cardano-cli', 'transaction', 'sign', '--tx-body-file', unsigned_transaction_file]
+        for file in signing_key_file:
+            command.extend(['--signing-key-file', file])
+        command.extend(['--out-file', signed_transaction_file])
+        return await self.run(command, self.target.network)
+
+    async def submit_transaction(self,
+                                 transaction_file: str) -> str:
+        tx_id = await self.get_transaction_id(transaction_file)
+
+        output = await self.run(['cardano-cli', 'transaction', 'submit', '--tx-file', transaction_file], self.target.network)
+        if output != 'Transaction successfully submitted.':
+            logger.error('Error submitting transaction')
+            tx_id = None
+
+        return tx_id
+
+class AsyncDatabase(AsyncProxy):
+    """
+    Database with the db-sync lookups of the payment path on an asyncpg pool.
+
+    Without asyncpg, or for any other query, the blocking Database runs on a
+    worker thread.  Nothing is cached, wrap a ChainCache in AsyncProxy for
+    that.
+    """
+
+    def __init__(self, config_file: str, max_connections: int = 10):
+        super().__init__(Database(config_file))
+        self.max_connections = max_connections
+        self.pool = None
+
+    async def open(self):
+        await asyncio.to_thread(self.target.open)
+
+        if asyncpg == None:
+            logger.info('asyncpg not installed, database queries run on worker threads')
+            return
+
+        config_params = dict(self.target.config_params)
+        if 'port' in config_params:
+            config_params['port'] = int(config_params['port'])
+        self.pool = await asyncpg.create_pool(min_size=1, max_size=self.max_connections, **config_params)
+
+    async def close(self):
+        if self.pool != None:
+            await self.pool.close()
+            self.pool = None
+        await asyncio.to_thread(self.target.close)
+
+    async def query_txhash_time(self, txhash: str):
+        if self.pool == None:
+            return await asyncio.to_thread(self.target.query_txhash_time, txhash)
+
+        sql = ('select block.time, block.slot_no from tx '
+               'inner join block on tx.block_id = block.id '
+               'where tx.hash = $1;')
+        logger.debug('query_txhash_time(), sql = {}, {}'.format(sql, txhash))
+
+        row = await self.pool.fetchrow(sql, bytes.fromhex(txhash))
+        if row == None:
+            logger.warning('Query TX Time: {} not found in database'.format(txhash))
+            return (None, None)
+
+        return (row[0], row[1])
+
+    async def query_utxo_inputs(self, txid: str):
+        if self.pool == None:
+            return await asyncio.to_thread(self.target.query_utxo_inputs, txid)
+
+        sql = ('select tx_out.address, tx_out.value from tx_out '
+               'inner join tx_in on tx_out.tx_id = tx_in.tx_out_id '
+               'inner join tx    on tx.id = tx_in.tx_in_id and tx_in.tx_out_index = tx_out.index '
+               'where tx.hash = $1;')
+        logger.debug('query_utxo_inputs(), sql = {}, {}'.format(sql, txid))
+
+        rows = await self.pool.fetch(sql, bytes.fromhex(txid))
+        return [{'address': row[0], 'value': int(row[1])} for row in rows]
+
+    async def query_stake_addresses(self, addresses: List[str]) -> Dict:
+        if self.pool == None:
+            return await asyncio.to_thread(self.target.query_stake_addresses, addresses)
+
+        sql = ('select distinct on (tx_out.address) tx_out.address, stake_address.view from tx_out '
+               'left join stake_address on tx_out.stake_address_id = stake_address.id '
+               'where tx_out.address = any($1::varchar[]);')
+        logger.debug('query_stake_addresses(), sql = {}, {} addresses'.format(sql, len(addresses)))
+
+        rows = await self.pool.fetch(sql, list(addresses))
+        return {row[0]: row[1] for row in rows}
+
+    async def query_senders(self, txids: List[str]) -> Dict:
+        if self.pool == None:
+            return await asyncio.to_thread(self.target.query_senders, txids)
+
+        sql = ('select distinct on (tx.hash) tx.hash, tx_out.address, stake_address.view, block.slot_no from tx '
+               'inner join block on tx.block_id = block.id '
+               'inner join tx_in on tx_in.tx_in_id = tx.id '
+               'inner join tx_out on tx_out.tx_id = tx_in.tx_out_id and tx_out.index = tx_in.tx_out_index '
+               'left join stake_address on tx_out.stake_address_id = stake_address.id '
+               'where tx.hash = any($1::bytea[]) '
+               'order by tx.hash, tx_in.id;')
+        logger.debug('query_senders(), sql = {}, {} transactions'.format(sql, len(txids)))
+
+        rows = await self.pool.fetch(sql, [bytes.fromhex(txid) for txid in txids])
+
+        senders = {}
+        for row in rows:
+            senders[bytes(row[0]).hex()] = {'address': row[1], 'stake-address': row[2], 'slot': row[3]}
+
+        return senders
@@ -0,0 +1,149 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: car.py
+Author: Kris Henderson
+
+Bundle files into one CARv1 (content addressable archive) so a whole drop
+can be uploaded and pinned with a single IPFS dag/import.
+
+The files are put in one flat UnixFS directory, CIDv1 with raw leaves, so
+each file is addressed as ipfs://<root>/<file name>.  The archive is built in
+two passes over the files, first to calculate the root CID for the header
+and then to stream the blocks.  Only the blocks of one file are held in
+memory at a time.
+
+CARv1 layout:
+    varint header length, DAG-CBOR {'roots': [root], 'version': 1}
+    for each block: varint length, CID bytes, block
+"""
+
+from typing import Dict, Iterator, List, Tuple
+import os
+
+import tcr.cid
+
+# Largest block IPFS nodes exchange, a directory can't be split into more blocks
+MAX_BLOCK_SIZE = 1024 * 1024
+
+def encode_car_header(root: bytes) -> bytes:
+    """
+    The DAG-CBOR header with a single root.  Keys are in canonical order,
+    shortest first.
+    """
+
+    # tag 42 CID, bytes prefixed with the identity multibase 0x00
+    cid = b'\x00' + root
+    if len(cid) < 24:
+        cid = bytes([0x40 + len(cid)]) + cid
+    else:
+        cid = b'\x58' + bytes([len(cid)]) + cid
+
+    header = b'\xa2' + b'\x65roots' + b'\x81\xd8\x2a' + cid + b'\x67version' + b'\x01'
+    return tcr.cid.encode_varint(len(header)) + header
+
+class CarBundle:
+    VERSION = 1
+
+    def __init__(self, files: List[str]):
+        """
+        @param files The files to bundle, the directory holds each file by its
+                     base name so the names must be unique
+        """
+
+        self.files = {}
+        for filename in files:
+            name = os.path.basename(filename)
+            if name in self.files and self.files[name] != filename:
+                raise Exception('Duplicate name in bundle: {}'.format(name))
+            self.files[name] = filename
+
+        self.names = sorted(self.files.keys(), key=lambda name: name.encode('utf-8'))
+        self.links = {}
+        for name in self.names:
+            self.links[name] = tcr.cid.build_file(CarBundle.read_chunks(self.files[name]), CarBundle.VERSION)
+
+        self.directory = tcr.cid.encode_dag_pb([self.links[name] for name in self.names],
+                                               tcr.cid.encode_unixfs_directory(),
+                                               self.names)
+        if len(self.directory) > MAX_BLOCK_SIZE:
+            raise Exception('Too many files for one directory block: {}'.format(len(self.names)))
+
+        self.root = tcr.cid.make_cid(self.directory, tcr.cid.CODEC_DAG_PB, CarBundle.VERSION)
+
+    @staticmethod
+    def read_chunks(filename: str) -> Iterator[bytes]:
+        with open(filename, 'rb') as file:
+            for chunk in iter(lambda: file.read(tcr.cid.CHUNK_SIZE), b''):
+                yield chunk
+
+    def get_root(self) -> str:
+        return tcr.cid.encode_cid(self.root, CarBundle.VERSION)
+
+    def get_names(self) -> List[str]:
+        return self.names
+
+    def get_cids(self) -> Dict[str, str]:
+        """
+        @return {name: CID} of each file in the bundle
+        """
+
+        return {name: tcr.cid.encode_cid(self.links[name][0], CarBundle.VERSION) for name in self.names}
+
+    def blocks(self) -> Iterator[Tuple[bytes, bytes]]:
+        """
+        @return (CID bytes, block) of every block in the bundle, the root last
+        """
+
+        for name in self.names:
+            blocks = []
+            link = tcr.cid.build_file(CarBundle.read_chunks(self.files[name]), CarBundle.VERSION, blocks)
+            if link != self.links[name]:
+                raise Exception('File changed while bundling: {}'.format(self.files[name]))
+
+            for block in blocks:
+                yield block
+
+        yield (self.root, self.directory)
+
+    def stream(self) -> Iterator[bytes]:
+        """
+        The CAR file in pieces, for uploading without writing it to disk.
+        """
+
+        yield encode_car_header(self.root)
+        for (cid, block) in self.blocks():
+            yield tcr.cid.encode_varint(len(cid) + len(block)) + cid + block
+
+    def write(self, car_file: str) -> int:
+        """
+        @return The size of the CAR file
+        """
+
+        size = 0
+        with open(car_file, 'wb') as file:
+            for data in self.stream():
+                file.write(data)
+                size += len(data)
+
+        return size
@@ -30,7 +30,6 @@ from typing import Dict, List, Tuple
 import json
 from tcr.command import Command
 import copy
-from tcr.nft import Nft
 from tcr.wallet import Wallet
 import logging
 from tcr.database import Database
@@ -81,6 +80,27 @@ class Cardano:
     def query_utxos(self,
                     wallet: Wallet,
                     addresses: List[str]=None) -> Tuple[List, int]:
+        total_lovelace = 0
+        utxos = []
+
+        for payment_address in Cardano.get_query_addresses(wallet, addresses):
+            command = ['cardano-cli', 'query', 'utxo', '--address', payment_address]
+            output = Command.run(command, self.network)
+
+            (address_utxos, address_lovelace) = Cardano.parse_utxos(output)
+            utxos.extend(address_utxos)
+            total_lovelace += address_lovelace
+
+        return (utxos, total_lovelace)
+
+    @staticmethod
+    def get_query_addresses(wallet: Wallet,
+                            addresses: List[str]=None) -> List[str]:
+        """
+        The addresses query_utxos looks at, all the known addresses of the
+        wallet when addresses is None.
+        """
+
         if addresses == None:
             # query all the known addresses and make sure the addresses are unique
             # which they may not be if using an "external" wallet
@@ -90,34 +110,39 @@ class Cardano:
                                  wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True),
                                  wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE, delegated=False),
                                  wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE, delegated=True)])
+            for shard in wallet.get_shards():
+                addresses_set.add(wallet.get_payment_address(Wallet.get_shard_address_index(shard), delegated=False))
+                addresses_set.add(wallet.get_payment_address(Wallet.get_shard_address_index(shard), delegated=True))
 
             addresses = list(addresses_set)
-        total_lovelace = 0
-        utxos = []
 
-        for payment_address in addresses:
-            if payment_address == None:
-                # if the requested address is not setup for the wallet then skip it.
-                continue
+        # if the requested address is not setup for the wallet then skip it.
+        return [address for address in addresses if address != None]
 
-            command = ['cardano-cli', 'query', 'utxo', '--address', payment_address]
-            output = Command.run(command, self.network)
+    @staticmethod
+    def parse_utxos(output: str) -> Tuple[List, int]:
+        """
+        Parse the table output of 'cardano-cli query utxo'.
+        """
+
+        total_lovelace = 0
+        utxos = []
 
-            # Calculate total lovelace of the UTXO(s) inside the wallet address
-            utxo_table = output.splitlines()
-            for x in range(2, len(utxo_table)):
-                cells = utxo_table[x].split()
-                assets = {}
-                for x in range(4, len(cells), 3):
-                    if cells[x] == '+':
-                        if cells[x+1].isnumeric():
-                            asset_amount = int(cells[x+1])
-                            asset_name = cells[x+2]
-                            assets[asset_name] = asset_amount
-
-                tx_out_datum_hash = cells[len(cells) - 1]
-                utxos.append({'tx-hash':cells[0], 'tx-ix':int(cells[1]), 'amount': int(cells[2]), 'assets': assets, 'tx-out-datum-hash': tx_out_datum_hash})
-                total_lovelace +=  int(cells[2])
+        # Calculate total lovelace of the UTXO(s) inside the wallet address
+        utxo_table = output.splitlines()
+        for x in range(2, len(utxo_table)):
+            cells = utxo_table[x].split()
+            assets = {}
+            for x in range(4, len(cells), 3):
+                if cells[x] == '+':
+                    if cells[x+1].isnumeric():
+                        asset_amount = int(cells[x+1])
+                        asset_name = cells[x+2]
+                        assets[asset_name] = asset_amount
+
+            tx_out_datum_hash = cells[len(cells) - 1]
+            utxos.append({'tx-hash':cells[0], 'tx-ix':int(cells[1]), 'amount': int(cells[2]), 'assets': assets, 'tx-out-datum-hash': tx_out_datum_hash})
+            total_lovelace +=  int(cells[2])
 
         return (utxos, total_lovelace)
 
@@ -277,9 +302,17 @@ class Cardano:
                                          address_outputs,
                                          fee_amount,
                                          policy_name,
+                                         nft_metadata,
                                          nft_metadata_file,
-                                         transaction_file):
-        nft_metadata = Nft.parse_metadata_file(nft_metadata_file)
+                                         transaction_file,
+                                         invalid_hereafter = None):
+        """
+        @param nft_metadata The parsed nft_metadata_file, @see Nft.parse_metadata_file
+        @param nft_metadata_file Metadata file to pass to cardano-cli
+        @param invalid_hereafter Slot the transaction is invalid from, default
+                                 is the policy lock
+        """
+
         policy_id = nft_metadata['policy-id']
         token_names = nft_metadata['token-names']
 
@@ -322,12 +355,8 @@ class Cardano:
                 token_index += 1
             address_index += 1
 
-        invalid_hereafter = 0
-        with open('policy/{}/{}.script'.format(self.network, policy_name), "r") as file:
-            script = json.loads(file.read())
-            for s in script['scripts']:
-                if s['type'] == 'before':
-                    invalid_hereafter = s['slot']
+        if invalid_hereafter == None:
+            invalid_hereafter = self.get_policy_invalid_hereafter(policy_name)
 
         command = ['cardano-cli', 'transaction', 'build-raw', '--fee', '{}'.format(fee_amount)]
 
@@ -359,8 +388,7 @@ class Cardano:
     def calculate_min_required_utxo_mint(self,
                                          input_utxos: List,
                                          address_outputs: List,
-                                         nft_metadata_file: str):
-        nft_metadata = Nft.parse_metadata_file(nft_metadata_file)
+                                         nft_metadata: Dict):
         policy_id = nft_metadata['policy-id']
         token_names = nft_metadata['token-names']
 
@@ -423,12 +451,7 @@ class Cardano:
             full_name = '{}.{}'.format(policy_id, token_name)
             address_outputs_cp[len(address_outputs_cp)-1]['assets'][full_name] -= nft_token_amount
 
-        invalid_hereafter = 0
-        with open('policy/{}/{}.script'.format(self.network, policy_name), "r") as file:
-            script = json.loads(file.read())
-            for s in script['scripts']:
-                if s['type'] == 'before':
-                    invalid_hereafter = s['slot']
+        invalid_hereafter = self.get_policy_invalid_hereafter(policy_name)
 
         command = ['cardano-cli', 'transaction', 'build-raw', '--fee', '{}'.format(fee_amount)]
 
@@ -541,6 +564,34 @@ class Cardano:
 
         return output
 
+    def get_policy_invalid_hereafter(self, policy_name: str) -> int:
+        """
+        The slot the policy locks at, transactions minting with the policy are
+        built to be invalid from this slot on.
+        """
+
+        invalid_hereafter = 0
+        with open('policy/{}/{}.script'.format(self.network, policy_name), "r") as file:
+            script = json.loads(file.read())
+            for s in script['scripts']:
+                if s['type'] == 'before':
+                    invalid_hereafter = s['slot']
+
+        return invalid_hereafter
+
+    def get_mint_invalid_hereafter(self, policy_name: str, ttl_slots: int) -> int:
+        """
+        The slot a mint transaction built now is invalid from, ttl_slots past
+        the node tip but no later than the policy lock.
+        """
+
+        invalid_hereafter = self.query_tip()['slot'] + ttl_slots
+        policy_invalid_hereafter = self.get_policy_invalid_hereafter(policy_name)
+        if policy_invalid_hereafter > 0:
+            invalid_hereafter = min(invalid_hereafter, policy_invalid_hereafter)
+
+        return invalid_hereafter
+
     def get_policy_id(self,
                       policy_name: str) -> str:
         policy_id = None
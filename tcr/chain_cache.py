@@ -0,0 +1,259 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: chain_cache.py
+Author: Kris Henderson
+
+Persistent read-through cache in front of Database.
+
+Transactions deep enough in the chain never change, so what db-sync says
+about them can be kept in a local SQLite file and reused across runs.  A
+result is only stored once the slot it depends on is at least
+min_depth_slots behind the database tip, anything newer is read from
+db-sync every time.  The least recently used entries are evicted when the
+file holds more than max_entries.
+
+Calls not handled here are passed through to the Database.
+"""
+
+from typing import Dict, List, Tuple
+import datetime
+import logging
+import json
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger('chain-cache')
+
+def get_cache_file(network: str) -> str:
+    return '{}_chain_cache.db'.format(network)
+
+class ChainCache:
+    # About 30 blocks
+    MIN_DEPTH_SLOTS = 600
+    MAX_ENTRIES = 200000
+
+    # How long the database tip is trusted before asking again
+    TIP_REFRESH = 20
+
+    # Access times are written out after this many lookups
+    FLUSH_ACCESSES = 256
+
+    SCHEMA = ['create table if not exists cache (kind text, key text, value text, slot integer, used integer, '
+              '                                  primary key (kind, key))',
+              'create index if not exists cache_used on cache (used)']
+
+    def __init__(self, cache_file: str, database, min_depth_slots: int = MIN_DEPTH_SLOTS, max_entries: int = MAX_ENTRIES):
+        self.cache_file = cache_file
+        self.database = database
+        self.min_depth_slots = min_depth_slots
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute('pragma journal_mode = wal')
+        self.connection.execute('pragma synchronous = normal')
+        for sql in ChainCache.SCHEMA:
+            self.connection.execute(sql)
+        self.connection.commit()
+
+        row = self.connection.execute('select max(used), count(*) from cache').fetchone()
+        self.clock = row[0] if row[0] != None else 0
+        self.entries = row[1]
+        self.accessed = {}
+        self.tip_slot = None
+        self.tip_time = 0
+
+    def __getattr__(self, name: str):
+        # Only called for attributes not found on the cache
+        if name == 'database':
+            raise AttributeError(name)
+
+        return getattr(self.database, name)
+
+    def close(self) -> None:
+        with self.lock:
+            self.flush()
+            self.connection.close()
+            logger.debug('Chain cache: {} hits, {} misses'.format(self.hits, self.misses))
+
+        self.database.close()
+
+    def flush(self) -> None:
+        with self.lock:
+            if len(self.accessed) == 0:
+                return
+
+            with self.connection:
+                self.connection.executemany('update cache set used = ? where kind = ? and key = ?',
+                                            [(used, kind, key) for ((kind, key), used) in self.accessed.items()])
+            self.accessed = {}
+
+    def get_tip_slot(self) -> int:
+        if self.tip_slot == None or time.time() - self.tip_time > ChainCache.TIP_REFRESH:
+            self.tip_slot = self.database.query_latest_slot()
+            self.tip_time = time.time()
+
+        return self.tip_slot
+
+    def is_confirmed(self, slot: int) -> bool:
+        return slot != None and slot <= self.get_tip_slot() - self.min_depth_slots
+
+    def get(self, kind: str, key: str):
+        """
+        @return The decoded value or None if not in the cache
+        """
+
+        with self.lock:
+            row = self.connection.execute('select value from cache where kind = ? and key = ?', (kind, key)).fetchone()
+            if row == None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.clock += 1
+            self.accessed[(kind, key)] = self.clock
+            if len(self.accessed) >= ChainCache.FLUSH_ACCESSES:
+                self.flush()
+
+            return json.loads(row[0])
+
+    def put(self, kind: str, key: str, value, slot: int) -> None:
+        self.put_many(kind, [(key, value, slot)])
+
+    def put_many(self, kind: str, items: List[Tuple]) -> None:
+        """
+        @param items [(key, value, slot)] stored in one transaction
+        """
+
+        with self.lock:
+            rows = []
+            for (key, value, slot) in items:
+                self.clock += 1
+                rows.append((kind, key, json.dumps(value), slot, self.clock))
+
+            with self.connection:
+                self.connection.executemany('insert or replace into cache values (?, ?, ?, ?, ?)', rows)
+            self.entries += len(rows)
+
+            if self.entries > self.max_entries:
+                self.evict()
+
+    def evict(self) -> None:
+        """
+        Drop the least recently used tenth of the cache
+        """
+
+        with self.lock:
+            self.flush()
+            with self.connection:
+                self.connection.execute('delete from cache where rowid in (select rowid from cache order by used limit ?)',
+                                        (max(self.entries - self.max_entries * 9 // 10, 0),))
+            self.entries = self.connection.execute('select count(*) from cache').fetchone()[0]
+            logger.debug('Chain cache evicted to {} entries'.format(self.entries))
+
+    def query_txhash_time(self, txhash: str) -> Tuple:
+        cached = self.get('txhash-time', txhash)
+        if cached != None:
+            return (datetime.datetime.fromisoformat(cached[0]), cached[1])
+
+        (txtime, txslotno) = self.database.query_txhash_time(txhash)
+        if self.is_confirmed(txslotno):
+            self.put('txhash-time', txhash, [txtime.isoformat(), txslotno], txslotno)
+
+        return (txtime, txslotno)
+
+    def query_utxo_inputs(self, txid: str) -> List[Dict]:
+        cached = self.get('utxo-inputs', txid)
+        if cached != None:
+            return cached
+
+        (inputs, txslotno) = self.database.query_utxo_inputs_slot(txid)
+        if len(inputs) > 0 and self.is_confirmed(txslotno):
+            self.put('utxo-inputs', txid, inputs, txslotno)
+
+        return inputs
+
+    def query_stake_address(self, address: str) -> str:
+        # The stake part is encoded in the address itself so it never changes
+        cached = self.get('stake-address', address)
+        if cached != None:
+            return cached
+
+        stake_address = self.database.query_stake_address(address)
+        if stake_address != None:
+            self.put('stake-address', address, stake_address, None)
+
+        return stake_address
+
+    def query_nft_mint(self, fingerprint: str) -> Tuple:
+        # A later mint of the same token replaces the metadata, which can
+        # only happen while the policy is open and isn't checked for here
+        cached = self.get('nft-mint', fingerprint)
+        if cached != None:
+            return tuple(cached)
+
+        (token_policy, token_metadata, slot) = self.database.query_nft_mint(fingerprint)
+        if self.is_confirmed(slot):
+            self.put('nft-mint', fingerprint, [token_policy, token_metadata, slot], slot)
+
+        return (token_policy, token_metadata, slot)
+
+    def query_nft_metadata(self, fingerprint: str) -> Tuple:
+        (token_policy, token_metadata, slot) = self.query_nft_mint(fingerprint)
+        return (token_policy, token_metadata)
+
+    def get_many(self, kind: str, keys: List[str]) -> Dict:
+        cached = {}
+        for key in keys:
+            value = self.get(kind, key)
+            if value != None:
+                cached[key] = value
+
+        return cached
+
+    def query_stake_addresses(self, addresses: List[str]) -> Dict:
+        stake_addresses = self.get_many('stake-address', addresses)
+        missing = [address for address in addresses if not address in stake_addresses]
+        if len(missing) > 0:
+            found = self.database.query_stake_addresses(missing)
+            self.put_many('stake-address', [(address, found[address], None) for address in found if found[address] != None])
+
+            stake_addresses.update(found)
+
+        return stake_addresses
+
+    def query_senders(self, txids: List[str]) -> Dict:
+        senders = self.get_many('sender', txids)
+        missing = [txid for txid in txids if not txid in senders]
+        if len(missing) > 0:
+            found = self.database.query_senders(missing)
+            self.put_many('sender', [(txid, found[txid], found[txid]['slot']) for txid in found if self.is_confirmed(found[txid]['slot'])])
+
+            senders.update(found)
+
+        return senders
@@ -0,0 +1,204 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: cid.py
+Author: Kris Henderson
+
+Calculate the IPFS CID of a file locally, the same as "ipfs add" with the
+default settings, without uploading it.
+
+Files are split into 262144 byte chunks.  Each chunk is a leaf and the leaves
+are linked together in a balanced tree of DAG-PB nodes with at most 174 links
+per node.  A file that fits in one chunk is just the leaf.
+
+    CIDv0: leaves are DAG-PB nodes holding a UnixFS File, base58btc "Qm..."
+    CIDv1: leaves are raw blocks, base32 "bafy..." or "bafk..." when the file
+           is a single raw block
+"""
+
+from typing import Iterable, Iterator, List, Tuple
+import base64
+import hashlib
+
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+CODEC_RAW = 0x55
+CODEC_DAG_PB = 0x70
+
+# multihash sha2-256, 32 bytes
+SHA2_256 = b'\x12\x20'
+
+# UnixFS Data.Type
+UNIXFS_DIRECTORY = 1
+UNIXFS_FILE = 2
+
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+def encode_varint(value: int) -> bytes:
+    result = bytearray()
+    while value >= 0x80:
+        result.append((value & 0x7f) | 0x80)
+        value >>= 7
+    result.append(value)
+    return bytes(result)
+
+def encode_base58(data: bytes) -> str:
+    value = int.from_bytes(data, 'big')
+    result = ''
+    while value > 0:
+        (value, remainder) = divmod(value, 58)
+        result = BASE58_ALPHABET[remainder] + result
+
+    zeros = len(data) - len(data.lstrip(b'\x00'))
+    return BASE58_ALPHABET[0] * zeros + result
+
+def encode_base32(data: bytes) -> str:
+    return base64.b32encode(data).decode('ascii').lower().rstrip('=')
+
+def _field_varint(field: int, value: int) -> bytes:
+    return encode_varint(field << 3) + encode_varint(value)
+
+def _field_bytes(field: int, value: bytes) -> bytes:
+    return encode_varint((field << 3) | 2) + encode_varint(len(value)) + value
+
+def encode_unixfs_file(data: bytes, filesize: int, blocksizes: List[int]) -> bytes:
+    """
+    Protobuf UnixFS Data message of a File.  data is None for a node that
+    only links to other nodes.
+    """
+
+    result = _field_varint(1, UNIXFS_FILE)
+    if data != None and len(data) > 0:
+        result += _field_bytes(2, data)
+    result += _field_varint(3, filesize)
+    for blocksize in blocksizes:
+        result += _field_varint(4, blocksize)
+    return result
+
+def encode_unixfs_directory() -> bytes:
+    return _field_varint(1, UNIXFS_DIRECTORY)
+
+def encode_dag_pb(links: List[Tuple[bytes, int]], data: bytes, names: List[str] = None) -> bytes:
+    """
+    Protobuf DAG-PB PBNode.  The links come before the data and each link
+    has a name, empty for the links of a file, the same as go-ipfs writes
+    them.
+
+    @param links [(CID bytes, total size)]
+    @param names Name of each link, directory entries must be sorted by name
+    """
+
+    result = b''
+    for i in range(0, len(links)):
+        (cid, tsize) = links[i]
+        name = names[i].encode('utf-8') if names != None else b''
+        link = _field_bytes(1, cid) + _field_bytes(2, name) + _field_varint(3, tsize)
+        result += _field_bytes(2, link)
+    return result + _field_bytes(1, data)
+
+def make_cid(block: bytes, codec: int, version: int) -> bytes:
+    multihash = SHA2_256 + hashlib.sha256(block).digest()
+    if version == 0:
+        return multihash
+    return encode_varint(1) + encode_varint(codec) + multihash
+
+def encode_cid(cid: bytes, version: int) -> str:
+    if version == 0:
+        return encode_base58(cid)
+    return 'b' + encode_base32(cid)
+
+def get_version(cid: str) -> int:
+    if len(cid) == 46 and cid.startswith('Qm'):
+        return 0
+    return 1
+
+def _leaves(chunks: Iterable[bytes], version: int) -> Iterator[Tuple[bytes, bytes, int, int]]:
+    """
+    @return (CID bytes, block, total size, file size) of each leaf
+    """
+
+    empty = True
+    for chunk in chunks:
+        empty = False
+        if version == 0:
+            block = encode_dag_pb([], encode_unixfs_file(chunk, len(chunk), []))
+            yield (make_cid(block, CODEC_DAG_PB, version), block, len(block), len(chunk))
+        else:
+            yield (make_cid(chunk, CODEC_RAW, version), chunk, len(chunk), len(chunk))
+
+    if empty:
+        if version == 0:
+            block = encode_dag_pb([], encode_unixfs_file(None, 0, []))
+            yield (make_cid(block, CODEC_DAG_PB, version), block, len(block), 0)
+        else:
+            yield (make_cid(b'', CODEC_RAW, version), b'', 0, 0)
+
+def build_file(chunks: Iterable[bytes], version: int = 0, blocks: List[Tuple[bytes, bytes]] = None) -> Tuple[bytes, int]:
+    """
+    Build the DAG of a file given as its chunks in order.
+
+    @param blocks When given each (CID bytes, block) of the DAG is appended
+    @return (CID bytes, total size) of the root
+    """
+
+    nodes = []
+    for (cid, block, tsize, filesize) in _leaves(chunks, version):
+        nodes.append((cid, tsize, filesize))
+        if blocks != None:
+            blocks.append((cid, block))
+
+    while len(nodes) > 1:
+        parents = []
+        for i in range(0, len(nodes), MAX_LINKS):
+            children = nodes[i:i + MAX_LINKS]
+            filesize = sum([child[2] for child in children])
+            unixfs = encode_unixfs_file(None, filesize, [child[2] for child in children])
+            block = encode_dag_pb([(child[0], child[1]) for child in children], unixfs)
+            tsize = len(block) + sum([child[1] for child in children])
+            cid = make_cid(block, CODEC_DAG_PB, version)
+            parents.append((cid, tsize, filesize))
+            if blocks != None:
+                blocks.append((cid, block))
+        nodes = parents
+
+    return (nodes[0][0], nodes[0][1])
+
+def calculate_chunks(chunks: Iterable[bytes], version: int = 0) -> str:
+    """
+    The CID of a file given as its chunks in order.
+    """
+
+    return encode_cid(build_file(chunks, version)[0], version)
+
+def calculate_bytes(data: bytes, version: int = 0) -> str:
+    return calculate_chunks([data[i:i + CHUNK_SIZE] for i in range(0, len(data), CHUNK_SIZE)], version)
+
+def calculate_file(filename: str, version: int = 0) -> str:
+    """
+    The CID of a file as "ipfs add" would calculate it.  The file is read one
+    chunk at a time.
+    """
+
+    with open(filename, 'rb') as file:
+        return calculate_chunks(iter(lambda: file.read(CHUNK_SIZE), b''), version)
@@ -0,0 +1,215 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: daemon.py
+Author: Kris Henderson
+
+Serve the general sale of several drops from one process.
+
+Each drop keeps its own prices, max_per_tx, wallet, metadata list, sales and
+mint journal in a tcr.tcr.PaymentProcessor.  The drops share one connection
+to the node and one chain cache / db-sync connection, and their payment loops
+are multiplexed on an event loop.  Polls run one at a time on a single worker
+thread because the transaction files are named by process id, so the drops
+are polled round-robin and a slow poll of one drop delays the others.  Run a
+daemon per drop, or the sharded minter, when that matters.  A failed poll is
+logged and the drop is polled again after RETRY_DELAY.
+"""
+
+from typing import Dict
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import traceback
+
+from tcr.cardano import Cardano
+from tcr.chain_cache import ChainCache, get_cache_file
+from tcr.database import Database
+from tcr.tcr import PaymentProcessor
+from tcr.wallet import Wallet
+import tcr.command
+import tcr.nftmint
+
+logger = logging.getLogger('daemon')
+
+# Seconds before polling a drop again after a failed poll
+RETRY_DELAY = 30
+
+def check_payment_addresses(drops: Dict[str, Wallet]) -> None:
+    """
+    Make sure no two drops take payments on the same address, a payment
+    would otherwise be seen, and minted, by both.
+
+    @param drops Minting wallet of each drop, keyed by drop name
+    """
+
+    owners = {}
+    for drop_name in drops:
+        for delegated in [True, False]:
+            address = drops[drop_name].get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=delegated)
+            if address == None:
+                continue
+
+            if address in owners and owners[address] != drop_name:
+                logger.error('Drops {} and {} share payment address: {}'.format(owners[address], drop_name, address))
+                raise Exception('Drops {} and {} share payment address: {}'.format(owners[address], drop_name, address))
+            owners[address] = drop_name
+
+def open_processors(cardano: Cardano,
+                    database: Database,
+                    drops: Dict[str, Dict],
+                    keep_merged: bool = False) -> Dict[str, PaymentProcessor]:
+    """
+    Open the shared database then a payment processor for each drop.  A
+    processor reconciles its mint journal against the chain as it is built.
+
+    @param drops Drops prepared by tcr.nftmint.prepare_drop, keyed by drop name
+    @param keep_merged Record the merged metadata of each mint in the drop's
+                       merged_metadata.jsonl
+    """
+
+    database.open()
+
+    processors = {}
+    try:
+        for drop_name in drops:
+            merged_archive = None
+            if keep_merged:
+                merged_archive = 'nft/{}/{}/merged_metadata.jsonl'.format(cardano.get_network(), drop_name)
+                logger.info('Merged metadata archive: {}'.format(merged_archive))
+
+            processors[drop_name] = PaymentProcessor(cardano,
+                                                     database,
+                                                     drops[drop_name]['wallet'],
+                                                     drops[drop_name]['policy'],
+                                                     drop_name,
+                                                     drops[drop_name]['metadata-set-file'],
+                                                     drops[drop_name]['prices'],
+                                                     drops[drop_name]['max-per-tx'],
+                                                     merged_archive)
+    except Exception:
+        for drop_name in processors:
+            processors[drop_name].close()
+        raise
+
+    return processors
+
+async def serve_drop(drop_name: str,
+                     processor: PaymentProcessor,
+                     executor: concurrent.futures.Executor,
+                     retry_delay: float = RETRY_DELAY) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            delay = await loop.run_in_executor(executor, processor.poll_once)
+        except Exception:
+            # A db-sync or cardano-cli hiccup must not stop the drop for good
+            logger.exception('Drop {}: Poll failed, retry in {}s'.format(drop_name, retry_delay))
+            delay = retry_delay
+        await asyncio.sleep(delay)
+
+async def serve(processors: Dict[str, PaymentProcessor], retry_delay: float = RETRY_DELAY) -> None:
+    """
+    Poll each drop until cancelled.  The polls of all the drops run one at a
+    time, round-robin, on a single worker thread.
+    """
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        tasks = [serve_drop(drop_name, processors[drop_name], executor, retry_delay) for drop_name in processors]
+        await asyncio.gather(*tasks)
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--network', required=True,
+                                     action='store',
+                                     type=str,
+                                     metavar='NAME',
+                                     help='Which network to use, [mainnet | testnet]')
+    parser.add_argument('--drops',   required=True,
+                                     action='store',
+                                     type=str,
+                                     nargs='+',
+                                     metavar='NAME',
+                                     help='Drops to take general sale payments for, polled one at a time')
+    parser.add_argument('--workers', required=False,
+                                     action='store',
+                                     metavar='COUNT',
+                                     type=int,
+                                     default=None,
+                                     help='Worker processes for verification, default = number of CPUs')
+    parser.add_argument('--keep-merged', required=False,
+                                         action='store_true',
+                                         default=False,
+                                         help='Record the merged metadata of each mint in merged_metadata.jsonl')
+
+    args = parser.parse_args()
+    network = args.network
+    drop_names = args.drops
+    workers = args.workers
+    keep_merged = args.keep_merged
+
+    tcr.nftmint.setup_logging(network, 'daemon')
+
+    if not network in tcr.command.networks:
+        logger.error('Invalid Network: {}'.format(network))
+        raise Exception('Invalid Network: {}'.format(network))
+
+    if len(set(drop_names)) != len(drop_names):
+        logger.error('--drops, Drop given more than once')
+        raise Exception('--drops, Drop given more than once')
+
+    # One connection to the node and db-sync for all the drops
+    cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
+
+    logger.info('{} Payment Processor / NFT Minter Daemon'.format(network.upper()))
+    logger.info('Network: {}'.format(network))
+
+    drops = {}
+    for drop_name in drop_names:
+        logger.info('Drop: {}'.format(drop_name))
+        drops[drop_name] = tcr.nftmint.prepare_drop(cardano, drop_name, workers)
+
+    check_payment_addresses({drop_name: drops[drop_name]['wallet'] for drop_name in drops})
+
+    processors = {}
+    try:
+        processors = open_processors(cardano, database, drops, keep_merged)
+
+        logger.info('Process General Sale Payments: {}'.format(', '.join(processors)))
+        asyncio.run(serve(processors))
+    finally:
+        for drop_name in processors:
+            processors[drop_name].close()
+        database.close()
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
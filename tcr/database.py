@@ -25,7 +25,7 @@ File: database.py
 Author: Kris Henderson
 """
 
-from typing import Dict
+from typing import Dict, List, Tuple
 from configparser import ConfigParser
 import psycopg2
 import logging
@@ -168,7 +168,7 @@ class Database:
 
         sql = ('select stake_address.id as stake_address_id, tx_out.address, stake_address.view as stake_address '
                'from tx_out inner join stake_address on tx_out.stake_address_id = stake_address.id '
-               'where address = \'{}\';'.format(address))
+               'where address = \'{}\' limit 1;'.format(address))
 
         logger.debug('query_stake_address(), sql = {}'.format(sql))
 
@@ -179,6 +179,60 @@ class Database:
         cursor.close()
         return row[2]
 
+    def query_stake_addresses(self, addresses: List[str]) -> Dict:
+        """
+        @return {address: stake address} for the addresses found, an address
+                without a stake part maps to None
+        """
+
+        if self.connection == None:
+            raise Exception("Database Not Connected")
+
+        sql = ('select distinct on (tx_out.address) tx_out.address, stake_address.view from tx_out '
+               'left join stake_address on tx_out.stake_address_id = stake_address.id '
+               'where tx_out.address = any(%(addresses)s);')
+        logger.debug('query_stake_addresses(), sql = {}, {} addresses'.format(sql, len(addresses)))
+
+        cursor = self.connection.cursor()
+        cursor.execute(sql, {'addresses': list(addresses)})
+        rows = cursor.fetchall()
+        cursor.close()
+
+        return {row[0]: row[1] for row in rows}
+
+    def query_senders(self, txids: List[str]) -> Dict:
+        """
+        Who paid in each transaction, the address of the first input and its
+        stake address.  Same as query_utxo_inputs(txid)[0]['address'] then
+        query_stake_address() on it, for all the transactions at once.
+
+        @return {txid: {'address', 'stake-address', 'slot'}} for the
+                transactions found, slot is of the block holding txid
+        """
+
+        if self.connection == None:
+            raise Exception("Database Not Connected")
+
+        sql = ('select distinct on (tx.hash) tx.hash, tx_out.address, stake_address.view, block.slot_no from tx '
+               'inner join block on tx.block_id = block.id '
+               'inner join tx_in on tx_in.tx_in_id = tx.id '
+               'inner join tx_out on tx_out.tx_id = tx_in.tx_out_id and tx_out.index = tx_in.tx_out_index '
+               'left join stake_address on tx_out.stake_address_id = stake_address.id '
+               'where tx.hash = any(%(hashes)s) '
+               'order by tx.hash, tx_in.id;')
+        logger.debug('query_senders(), sql = {}, {} transactions'.format(sql, len(txids)))
+
+        cursor = self.connection.cursor()
+        cursor.execute(sql, {'hashes': [bytes.fromhex(txid) for txid in txids]})
+        rows = cursor.fetchall()
+        cursor.close()
+
+        senders = {}
+        for row in rows:
+            senders[bytes(row[0]).hex()] = {'address': row[1], 'stake-address': row[2], 'slot': row[3]}
+
+        return senders
+
     def query_utxo_outputs(self, txid: str):
         if self.connection == None:
             raise Exception("Database Not Connected")
@@ -199,24 +253,36 @@ class Database:
         return outputs
 
     def query_utxo_inputs(self, txid: str):
+        (inputs, slot) = self.query_utxo_inputs_slot(txid)
+        return inputs
+
+    def query_utxo_inputs_slot(self, txid: str):
+        """
+        query_utxo_inputs and the slot of the block holding txid, None if it
+        has no inputs in the database.
+        """
+
         if self.connection == None:
             raise Exception("Database Not Connected")
 
-        sql = ('select tx_out.* from tx_out '
+        sql = ('select tx_out.*, block.slot_no from tx_out '
                'inner join tx_in on tx_out.tx_id = tx_in.tx_out_id '
                'inner join tx    on tx.id = tx_in.tx_in_id and tx_in.tx_out_index = tx_out.index '
+               'inner join block on tx.block_id = block.id '
                'where tx.hash = \'\\x{}\';'.format(txid))
-        logger.debug('query_utxo_inputs(), sql = {}'.format(sql))
+        logger.debug('query_utxo_inputs_slot(), sql = {}'.format(sql))
 
         cursor = self.connection.cursor()
         cursor.execute(sql)
         rows = cursor.fetchall()
-        logger.debug('query_utxo_inputs(), response:\r\n{}'.format(rows))
+        logger.debug('query_utxo_inputs_slot(), response:\r\n{}'.format(rows))
         inputs = []
+        slot = None
         for row in rows:
             inputs.append({'address': row[3], 'value': int(row[7])})
+            slot = row[-1]
         cursor.close()
-        return inputs
+        return (inputs, slot)
 
     def query_txhash_time(self, txhash: str):
         if self.connection == None:
@@ -255,23 +321,36 @@ class Database:
     #   bytes   bytea	        The raw bytes of the payload.
     #   tx_id   integer (64)    The Tx table index of the transaction where this metadata was included.
     def query_nft_metadata(self, fingerprint: str) -> str:
+        (token_policy, token_metadata, slot) = self.query_nft_mint(fingerprint)
+        return (token_policy, token_metadata)
+
+    def query_nft_mint(self, fingerprint: str) -> Tuple:
+        """
+        CIP-25 metadata of the latest mint of a token.
+
+        @return (policy id, token metadata, slot of the mint)
+        """
+
         if self.connection == None:
             raise Exception("Database Not Connected")
 
-        sql = ('select tx_metadata.tx_id, tx_metadata.json, multi_asset.name, multi_asset.policy from tx_metadata '
+        sql = ('select tx_metadata.tx_id, tx_metadata.json, multi_asset.name, multi_asset.policy, block.slot_no from tx_metadata '
                'inner join ma_tx_mint on tx_metadata.tx_id = ma_tx_mint.tx_id '
                'inner join multi_asset on ma_tx_mint.ident = multi_asset.id '
-               'where multi_asset.fingerprint = \'{}\''.format(fingerprint))
-        logger.debug('query_nft_metadata(), sql = {}'.format(sql))
+               'inner join tx on tx_metadata.tx_id = tx.id '
+               'inner join block on tx.block_id = block.id '
+               'where multi_asset.fingerprint = \'{}\' order by tx_metadata.tx_id'.format(fingerprint))
+        logger.debug('query_nft_mint(), sql = {}'.format(sql))
 
         cursor = self.connection.cursor()
         cursor.execute(sql)
         rows = cursor.fetchall()
+        cursor.close()
 
         index = len(rows) - 1
         token_name = bytes(rows[index][2]).decode("utf-8")
         token_policy = bytes(rows[index][3]).hex()
-        return (token_policy, rows[index][1][token_policy][token_name])
+        return (token_policy, rows[index][1][token_policy][token_name], rows[index][4])
 
     def query_mint_transactions(self, policy_id: str) -> Dict:
         if self.connection == None:
@@ -302,33 +381,144 @@ class Database:
         return tokens
 
     # https://github.com/input-output-hk/cardano-db-sync/blob/master/doc/schema.md
-    def query_current_owner(self, policy_id: str):
+    def query_current_owner(self, policy_id: str, slot: int = None):
+        """
+        The stake address holding each token of a policy.  Only outputs that
+        are unspent are considered and the latest one per token is picked by
+        the database.  Rows are streamed through a server side cursor so a big
+        policy isn't loaded into memory at once.
+
+        @param slot Take the snapshot as of this slot instead of the tip
+        @return {token name: {'address': stake address, 'slot': slot}}
+        """
+
         if self.connection == None:
             raise Exception("Database Not Connected")
 
-        sql = ('select multi_asset.name, stake_address.view, block.slot_no from ma_tx_out '
+        params = {'policy': bytes.fromhex(policy_id), 'slot': slot}
+        spent_before = ''
+        created_before = ''
+        if slot != None:
+            spent_before = 'and spend_block.slot_no <= %(slot)s '
+            created_before = 'and block.slot_no <= %(slot)s '
+
+        sql = ('select distinct on (multi_asset.name) multi_asset.name, stake_address.view, block.slot_no from ma_tx_out '
                'inner join tx_out on ma_tx_out.tx_out_id = tx_out.id '
                'inner join tx on tx_out.tx_id = tx.id '
                'inner join block on tx.block_id = block.id '
                'inner join stake_address on tx_out.stake_address_id = stake_address.id '
                'inner join multi_asset on ma_tx_out.ident = multi_asset.id '
-               'where multi_asset.policy=\'\\x{}\';'.format(policy_id))
-        logger.debug('query_current_owner(), sql = {}'.format(sql))
+               'left join (tx_in '
+               '           inner join tx as spend_tx on tx_in.tx_in_id = spend_tx.id '
+               '           inner join block as spend_block on spend_tx.block_id = spend_block.id {}) '
+               '       on tx_in.tx_out_id = tx_out.tx_id and tx_in.tx_out_index = tx_out.index '
+               'where multi_asset.policy = %(policy)s and ma_tx_out.quantity > 0 and tx_in.id is null {}'
+               'order by multi_asset.name, block.slot_no desc, tx_out.id desc;'.format(spent_before, created_before))
+        logger.debug('query_current_owner(), sql = {}, policy = {}, slot = {}'.format(sql, policy_id, slot))
+
+        cursor = self.connection.cursor(name='query_current_owner')
+        cursor.itersize = 2000
+        cursor.execute(sql, params)
+        tokens = {}
+        for row in cursor:
+            name = bytes(row[0]).decode("utf-8")
+            tokens[name] = {'address': row[1], 'slot': row[2]}
+        cursor.close()
+
+        return tokens
+
+    def query_latest_block_id(self) -> int:
+        if self.connection == None:
+            raise Exception("Database Not Connected")
+
+        sql = 'select max(id) from block;'
+        logger.debug('query_latest_block_id(), sql = {}'.format(sql))
 
         cursor = self.connection.cursor()
         cursor.execute(sql)
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0]
+
+    def query_policy_outputs(self, policy_ids: List[str], after_block_id: int, to_block_id: int, unspent: bool = False) -> List[Dict]:
+        """
+        Outputs holding tokens of the policies created in the blocks
+        after_block_id < block.id <= to_block_id.
+
+        @param unspent Only outputs not spent as of to_block_id
+        @return [{'tx-hash', 'tx-ix', 'policy-id', 'name', 'quantity', 'address', 'slot', 'block-id'}]
+        """
+
+        if self.connection == None:
+            raise Exception("Database Not Connected")
+
+        params = {'policies': [bytes.fromhex(policy_id) for policy_id in policy_ids],
+                  'after': after_block_id,
+                  'to': to_block_id}
+        spent = ''
+        unspent_filter = ''
+        if unspent:
+            spent = ('left join (tx_in '
+                     '           inner join tx as spend_tx on tx_in.tx_in_id = spend_tx.id and spend_tx.block_id <= %(to)s) '
+                     '       on tx_in.tx_out_id = tx_out.tx_id and tx_in.tx_out_index = tx_out.index ')
+            unspent_filter = 'and tx_in.id is null '
+
+        sql = ('select tx.hash, tx_out.index, multi_asset.policy, multi_asset.name, ma_tx_out.quantity, stake_address.view, block.slot_no, block.id from ma_tx_out '
+               'inner join multi_asset on ma_tx_out.ident = multi_asset.id '
+               'inner join tx_out on ma_tx_out.tx_out_id = tx_out.id '
+               'inner join tx on tx_out.tx_id = tx.id '
+               'inner join block on tx.block_id = block.id '
+               'inner join stake_address on tx_out.stake_address_id = stake_address.id '
+               '{}'
+               'where multi_asset.policy = any(%(policies)s) and block.id > %(after)s and block.id <= %(to)s {};'.format(spent, unspent_filter))
+        logger.debug('query_policy_outputs(), sql = {}, params = {}'.format(sql, params))
+
+        cursor = self.connection.cursor(name='query_policy_outputs')
+        cursor.itersize = 2000
+        cursor.execute(sql, params)
+        outputs = []
+        for row in cursor:
+            outputs.append({'tx-hash': bytes(row[0]).hex(),
+                            'tx-ix': row[1],
+                            'policy-id': bytes(row[2]).hex(),
+                            'name': bytes(row[3]).decode('utf-8'),
+                            'quantity': int(row[4]),
+                            'address': row[5],
+                            'slot': row[6],
+                            'block-id': row[7]})
+        cursor.close()
+
+        return outputs
+
+    def query_policy_spends(self, policy_ids: List[str], after_block_id: int, to_block_id: int) -> List[Tuple[str, int]]:
+        """
+        Outputs holding tokens of the policies that were spent in the blocks
+        after_block_id < block.id <= to_block_id.
+
+        @return [(tx hash, tx index)] of the spent outputs
+        """
+
+        if self.connection == None:
+            raise Exception("Database Not Connected")
+
+        params = {'policies': [bytes.fromhex(policy_id) for policy_id in policy_ids],
+                  'after': after_block_id,
+                  'to': to_block_id}
+        sql = ('select distinct out_tx.hash, tx_out.index from tx_in '
+               'inner join tx as spend_tx on tx_in.tx_in_id = spend_tx.id '
+               'inner join tx_out on tx_in.tx_out_id = tx_out.tx_id and tx_in.tx_out_index = tx_out.index '
+               'inner join tx as out_tx on tx_out.tx_id = out_tx.id '
+               'inner join ma_tx_out on ma_tx_out.tx_out_id = tx_out.id '
+               'inner join multi_asset on ma_tx_out.ident = multi_asset.id '
+               'where spend_tx.block_id > %(after)s and spend_tx.block_id <= %(to)s and multi_asset.policy = any(%(policies)s);')
+        logger.debug('query_policy_spends(), sql = {}, params = {}'.format(sql, params))
+
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
         rows = cursor.fetchall()
-        tokens = {}
-        for row in rows:
-            name = bytes(row[0]).decode("utf-8")
-            if name in tokens:
-                if tokens[name]['slot'] < row[2]:
-                    tokens[name]['address'] = row[1]
-                    tokens[name]['slot'] = row[2]
-            else:
-                tokens[name] = {'address': row[1], 'slot': row[2]}
+        cursor.close()
 
-        return tokens
+        return [(bytes(row[0]).hex(), row[1]) for row in rows]
 
     def query_owner_by_fingerprint(self, fingerprint: str):
         if self.connection == None:
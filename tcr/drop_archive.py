@@ -0,0 +1,272 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: drop_archive.py
+Author: Kris Henderson
+
+Pack all of the NFT metadata files of a drop into a single file.
+
+File layout, all integers little endian:
+    header:  8 byte magic, uint32 count, uint32 reserved
+    index:   count entries of uint64 offset, uint32 name length, uint32 data length
+    records: UTF-8 name followed by the compact JSON metadata
+
+The name of each record is the path of the original metadata file, the same
+path listed in the drop's metadata set file.  The archive is memory mapped
+so reading one token is an index lookup and a slice.
+"""
+
+from typing import Dict, Iterator, List, Tuple
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import traceback
+
+logger = logging.getLogger('drop-archive')
+
+class DropArchive:
+    MAGIC = b'TCRDROP\x01'
+    HEADER = struct.Struct('<8sII')
+    ENTRY = struct.Struct('<QII')
+
+    def __init__(self, archive_file: str):
+        self.archive_file = archive_file
+        self.names = None
+
+        with open(self.archive_file, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, self.count, reserved) = DropArchive.HEADER.unpack_from(self.mmap, 0)
+        if magic != DropArchive.MAGIC:
+            logger.error('Not a drop archive: {}'.format(archive_file))
+            raise Exception('Not a drop archive: {}'.format(archive_file))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self.mmap.close()
+
+    def get_entry(self, index: int) -> Tuple[int, int, int]:
+        if index < 0 or index >= self.count:
+            raise IndexError('Drop archive index out of range: {}'.format(index))
+
+        return DropArchive.ENTRY.unpack_from(self.mmap, DropArchive.HEADER.size + index * DropArchive.ENTRY.size)
+
+    def get_name(self, index: int) -> str:
+        (offset, name_length, data_length) = self.get_entry(index)
+        return self.mmap[offset:offset + name_length].decode('utf-8')
+
+    def get_names(self) -> List[str]:
+        return [self.get_name(i) for i in range(0, self.count)]
+
+    def read_bytes(self, index: int) -> bytes:
+        """
+        The compact JSON of one record.
+        """
+
+        (offset, name_length, data_length) = self.get_entry(index)
+        start = offset + name_length
+        return self.mmap[start:start + data_length]
+
+    def read(self, index: int) -> Dict:
+        return json.loads(self.read_bytes(index))
+
+    def find(self, name: str) -> int:
+        """
+        Index of the record for the metadata file name, or None.
+        """
+
+        if self.names == None:
+            self.names = {}
+            for i in range(0, self.count):
+                self.names[self.get_name(i)] = i
+
+        if not name in self.names:
+            return None
+
+        return self.names[name]
+
+    def read_file(self, name: str) -> Dict:
+        """
+        The metadata that was packed from the file name.
+        """
+
+        index = self.find(name)
+        if index == None:
+            raise KeyError('Not in drop archive: {}'.format(name))
+
+        return self.read(index)
+
+    def export(self, directory: str = None) -> List[str]:
+        """
+        Write every record back out as a metadata file.
+
+        @param directory Write the files here instead of their original paths.
+
+        @return The names of the files written
+        """
+
+        fnames = []
+        for i in range(0, self.count):
+            fname = self.get_name(i)
+            if directory != None:
+                fname = os.path.join(directory, os.path.basename(fname))
+
+            parent = os.path.dirname(fname)
+            if len(parent) > 0 and not os.path.exists(parent):
+                os.makedirs(parent)
+
+            with open(fname, 'w') as file:
+                file.write(json.dumps(self.read(i), indent=4))
+            fnames.append(fname)
+
+        logger.info('Exported {} files from {}'.format(len(fnames), self.archive_file))
+        return fnames
+
+    @staticmethod
+    def create(archive_file: str, metadata_files: List[str]) -> int:
+        """
+        Pack the metadata files into a new archive.  The archive is written
+        to a temporary file first and then renamed so readers never see a
+        partial archive.
+
+        @return The number of records
+        """
+
+        count = len(metadata_files)
+        index = bytearray(count * DropArchive.ENTRY.size)
+        offset = DropArchive.HEADER.size + len(index)
+
+        tmp_file = '{}.tmp'.format(archive_file)
+        with open(tmp_file, 'wb') as file:
+            file.write(DropArchive.HEADER.pack(DropArchive.MAGIC, count, 0))
+            file.write(index)
+
+            for i in range(0, count):
+                with open(metadata_files[i], 'r') as mdfile:
+                    data = json.dumps(json.load(mdfile), separators=(',', ':')).encode('utf-8')
+                name = metadata_files[i].encode('utf-8')
+
+                DropArchive.ENTRY.pack_into(index, i * DropArchive.ENTRY.size, offset, len(name), len(data))
+                file.write(name)
+                file.write(data)
+                offset += len(name) + len(data)
+
+            file.seek(DropArchive.HEADER.size)
+            file.write(index)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(tmp_file, archive_file)
+        logger.info('Packed {} files into {}'.format(count, archive_file))
+        return count
+
+def get_archive_file(network: str, drop_name: str) -> str:
+    return 'nft/{}/{}/{}.tcrdrop'.format(network, drop_name, drop_name)
+
+def pack_drop(network: str, drop_name: str) -> int:
+    """
+    Pack every file in nft/<network>/<drop>/nft_metadata into the drop archive.
+    """
+
+    md_dir = 'nft/{}/{}/nft_metadata'.format(network, drop_name)
+    metadata_files = ['{}/{}'.format(md_dir, f) for f in sorted(os.listdir(md_dir)) if f.endswith('.json')]
+    return DropArchive.create(get_archive_file(network, drop_name), metadata_files)
+
+def load_documents(source: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    Iterate the metadata of a drop from either a directory of JSON metadata
+    files or a drop archive.
+
+    @return Iterator of (file name, metadata) sorted by file name
+    """
+
+    if os.path.isfile(source):
+        with DropArchive(source) as archive:
+            names = archive.get_names()
+            order = sorted(range(0, len(names)), key=lambda i: names[i])
+            for i in order:
+                yield (names[i], archive.read(i))
+    else:
+        filenames = os.listdir(source)
+        filenames.sort()
+        for filename in filenames:
+            f = os.path.join(source, filename)
+            if os.path.isfile(f) and f.endswith('.json'):
+                with open(f, 'r') as file:
+                    yield (f, json.load(file))
+
+def main():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--network', required=True,
+                                     action='store',
+                                     type=str,
+                                     metavar='NAME',
+                                     help='Which network to use, [mainnet | testnet]')
+    parser.add_argument('--drop',    required=True,
+                                     action='store',
+                                     type=str,
+                                     metavar='NAME',
+                                     help='The name of the NFT drop.')
+    parser.add_argument('--pack',    required=False,
+                                     action='store_true',
+                                     default=False,
+                                     help='Pack nft_metadata/*.json into <drop>.tcrdrop')
+    parser.add_argument('--unpack',  required=False,
+                                     action='store_true',
+                                     default=False,
+                                     help='Write <drop>.tcrdrop back out to nft_metadata/*.json')
+
+    args = parser.parse_args()
+    network = args.network
+    drop_name = args.drop
+
+    logging.basicConfig(level=logging.INFO)
+
+    if args.pack:
+        pack_drop(network, drop_name)
+    elif args.unpack:
+        with DropArchive(get_archive_file(network, drop_name)) as archive:
+            archive.export()
+    else:
+        raise Exception('--pack or --unpack required')
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print('')
+        print('')
+        print('EXCEPTION: {}'.format(e))
+        print('')
+        traceback.print_exc()
@@ -21,16 +21,64 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+from typing import Dict
 from tcr.wallet import Wallet
 from tcr.cardano import Cardano
 from tcr.database import Database
+from tcr.chain_cache import ChainCache, get_cache_file
 import logging
 import argparse
 import traceback
 import tcr.command
 import tcr.nftmint
+import tcr.ownership
 import json
 
+# Holder bonus used when the drop metametadata doesn't define 'holder-bonus'.
+# Each token held of the policy grants extra NFTs by the longest matching
+# token name prefix.
+DEFAULT_HOLDER_BONUS = {
+    'policy': 'tcr_series_1',
+    'prefix': {
+        'TCRx001x05x': 3,
+        'TCRx001x04x': 3,
+        'TCRx001x03x': 3,
+        'TCRx001x02x': 2,
+        'TCRx001x01x': 1
+    }
+}
+
+def compile_bonus_rules(rules: Dict[str, int]) -> Dict:
+    """
+    Build a character trie from {prefix: bonus}.  Each node is a dictionary of
+    the next characters, the bonus for the prefix ending there is under None.
+    """
+
+    trie = {}
+    for prefix in rules:
+        node = trie
+        for c in prefix:
+            node = node.setdefault(c, {})
+        node[None] = rules[prefix]
+
+    return trie
+
+def get_bonus(trie: Dict, name: str) -> int:
+    """
+    @return The bonus of the longest prefix of name in the trie, 0 if none match
+    """
+
+    bonus = trie.get(None, 0)
+    node = trie
+    for c in name:
+        if not c in node:
+            break
+
+        node = node[c]
+        bonus = node.get(None, bonus)
+
+    return bonus
+
 def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('--network', required=True,
@@ -50,12 +98,19 @@ def main():
                                     default=None,
                                     metavar='NAME',
                                     help='filename for whitelist results')
+    parser.add_argument('--slot',   required=False,
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    metavar='SLOT',
+                                    help='Holder snapshot as of this slot, default = latest')
 
     args = parser.parse_args()
     network = args.network
     drop_name = args.drop
     address_index = Wallet.ADDRESS_INDEX_PRESALE
     output = args.output
+    snapshot_slot = args.slot
 
     if not network in tcr.command.networks:
         raise Exception('Invalid Network: {}'.format(network))
@@ -68,7 +123,7 @@ def main():
     cardano.query_protocol_parameters()
     tip_slot = tip['slot']
 
-    database = Database('{}.ini'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
     database.open()
     meta = database.query_chain_metadata()
     db_size = database.query_database_size()
@@ -106,35 +161,33 @@ def main():
     logger.info('      address = {}'.format(wallet.get_payment_address(address_index)))
     logger.info('Stake address = {}'.format(stake_address))
 
-    by_address = {}
-    # TODO: Generalize for any policy / token
-    if cardano.get_policy_id('tcr_series_1') != None:
-        tokens = database.query_current_owner(cardano.get_policy_id('tcr_series_1'))
-        for name in tokens:
-            address = tokens[name]['address']
-            slot = tokens[name]['slot']
+    holder_bonus = metametadata.get('holder-bonus', DEFAULT_HOLDER_BONUS)
+    bonus_trie = compile_bonus_rules(holder_bonus['prefix'])
+    for prefix in holder_bonus['prefix']:
+        logger.info('Holder bonus: {} {}* = +{}'.format(holder_bonus['policy'], prefix, holder_bonus['prefix'][prefix]))
 
-            if address in by_address:
-                by_address[address].append(name)
-            else:
-                by_address[address] = [name]
+    # stake address => token names held, sorted so pop() gives the last name
+    holders = {}
+    if cardano.get_policy_id(holder_bonus['policy']) != None:
+        if snapshot_slot != None:
+            tokens = database.query_current_owner(cardano.get_policy_id(holder_bonus['policy']), snapshot_slot)
+        else:
+            tokens = tcr.ownership.query_current_owner(network, database, cardano.get_policy_id(holder_bonus['policy']))
+        for name in tokens:
+            holders.setdefault(tokens[name]['address'], []).append(name)
     else:
         logger.error('WARNING - WARNING - WARNING')
-        logger.error('Policy: <{}> does not exist'.format('tcr_series_1'))
+        logger.error('Policy: <{}> does not exist'.format(holder_bonus['policy']))
         logger.error('WARNING - WARNING - WARNING')
 
-    hodlers = list(by_address.items())
-    def sort_by_length(item):
-        return len(item[1])
-    hodlers.sort(key=sort_by_length)
-
-    logger.info('HODLERS = {}'.format(len(hodlers)))
-    for hodler in hodlers:
-        hodler[1].sort()
+    logger.info('HODLERS = {}'.format(len(holders)))
+    for names in holders.values():
+        names.sort()
 
     (utxos, lovelace) = cardano.query_utxos(wallet, [wallet.get_payment_address(address_index)])
     utxos = cardano.query_utxos_time(database, utxos)
     utxos.sort(key=lambda item : item['slot-no'])
+    senders = database.query_senders([utxo['tx-hash'] for utxo in utxos])
 
     for price in metametadata['presale']:
         logger.info('{} lovelace = {} NFTs'.format(price, metametadata['presale'][price]))
@@ -163,29 +216,20 @@ def main():
             used_special = True
 
         logger.info('{}: {} lovelace, request mint {}'.format(utxo['tx-hash'], utxo['amount'], nfts_purchased))
-        input_address = database.query_utxo_inputs(utxo['tx-hash'])[0]['address']
-        stake_address = database.query_stake_address(input_address)
-
-        for hodler in hodlers:
-            if stake_address == hodler[0]:
-                logger.info('{} HODL S1'.format(stake_address))
-                for i in range(0, nfts_purchased):
-                    if len(hodler[1]) > 0:
-                        token = hodler[1].pop()
-                        token_bonus = 0
-                        if token.startswith('TCRx001x05x'):
-                            token_bonus += 3
-                        elif token.startswith('TCRx001x04x'):
-                            token_bonus += 3
-                        elif token.startswith('TCRx001x03x'):
-                            token_bonus += 3
-                        elif token.startswith('TCRx001x02x'):
-                            token_bonus += 2
-                        elif token.startswith('TCRx001x01x'):
-                            token_bonus += 1
-
-                        logger.info('{} = +{} BONUS'.format(token, token_bonus))
-                        nfts_bonus += token_bonus
+        if not utxo['tx-hash'] in senders:
+            logger.error('Sender not found: {}'.format(utxo['tx-hash']))
+            raise Exception('Sender not found: {}'.format(utxo['tx-hash']))
+
+        stake_address = senders[utxo['tx-hash']]['stake-address']
+
+        if stake_address in holders:
+            logger.info('{} HODL {}'.format(stake_address, holder_bonus['policy']))
+            held = holders[stake_address]
+            for i in range(0, min(nfts_purchased, len(held))):
+                token = held.pop()
+                token_bonus = get_bonus(bonus_trie, token)
+                logger.info('{} = +{} BONUS'.format(token, token_bonus))
+                nfts_bonus += token_bonus
 
         logger.info("TOTAL Bonus: {}".format(nfts_bonus))
         total_purchased += nfts_purchased
@@ -200,6 +244,8 @@ def main():
     with open('nft/{}/{}/{}'.format(network, drop_name, output), 'w') as file:
         file.write(json.dumps(presale, indent=4))
 
+    database.close()
+
     logger.info('Purchased = {}, Bonus = {}, Total = {}'.format(total_purchased, total_bonus, total_purchased + total_bonus))
 
     print('Presale: ')
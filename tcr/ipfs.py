@@ -32,11 +32,15 @@ import argparse
 import json
 import logging
 import os
-import requests
 import tcr.command
 import tcr.nftmint
+import tcr.drop_archive
 import traceback
 
+from tcr.car import CarBundle
+from tcr.ipfs_client import IpfsClient, UploadManifest, upload_files
+from tcr.metadata_writer import MetadataWriter
+
 
 logger = None
 
@@ -64,40 +68,64 @@ def get_metadataset(network: str, drop_name: str) -> Dict:
         metadataset = json.load(file)
     return metadataset
 
-def ipfs_upload(projectid: str, projectsecret: str, filename: str) -> str:
-    files = {'file': (os.path.basename(filename), open(filename, 'rb'))}
+def get_token(nftmetadata: Dict) -> Dict:
+    """
+    The properties of the single token in a NFT metadata file.
+    """
+
+    policy_id = list(nftmetadata['721'].keys())[0]
+    token_name = list(nftmetadata['721'][policy_id].keys())[0]
+    return nftmetadata['721'][policy_id][token_name]
+
+def rewrite_images(metadata_files: Dict[str, Dict]) -> None:
+    """
+    Write all of the updated metadata files at once.
+
+    @param metadata_files {filename: metadata}
+    """
+
+    directories = {}
+    for filename in metadata_files:
+        directories.setdefault(os.path.dirname(filename), []).append(filename)
+
+    for directory in directories:
+        with MetadataWriter(directory) as writer:
+            for filename in directories[directory]:
+                writer.write(os.path.splitext(os.path.basename(filename))[0], metadata_files[filename])
+
+def get_image_map_file(directory: str) -> str:
+    return os.path.join(directory, 'ipfs_images.json')
 
-    logger.info('Uploading: {}'.format(filename))
-    # Thank you!!  https://curl.trillworks.com/#python
-    response = requests.post('https://ipfs.infura.io:5001/api/v0/add?pin=false',
-                             files=files,
-                             auth=(projectid, projectsecret))
+def load_image_map(directory: str) -> Dict[str, str]:
+    """
+    @return {metadata file name: local image file name} of the drop in
+            directory, @see update_image_map
+    """
 
-    if response.status_code != 200:
-        logger.error('Upload Status Code: {}'.format(response.status_code))
-        raise Exception('Upload Status Code: {}'.format(response.status_code))
+    image_map_file = get_image_map_file(directory)
+    if not os.path.isfile(image_map_file):
+        return {}
 
-    upload_json = response.json()
-    return upload_json['Hash']
+    with open(image_map_file, 'r') as file:
+        return json.load(file)
 
-def ipfs_pin(projectid: str, projectsecret: str, ipfs_hash: str) -> str:
-    logger.info('Pinning: {}'.format(ipfs_hash))
-    # Thank you!!  https://curl.trillworks.com/#python
-    params = {('arg', ipfs_hash)}
-    response = requests.post('https://ipfs.infura.io:5001/api/v0/pin/add',
-                             params=params,
-                             auth=(projectid, projectsecret))
+def update_image_map(directory: str, images: Dict[str, str]) -> None:
+    """
+    Record the local image each metadata file named before its image was
+    replaced by an IPFS link, so ipfs_check knows which file each token
+    should be.
 
-    if response.status_code != 200:
-        logger.error('Pin Status Code: {}'.format(response.status_code))
-        raise Exception('Pin Status Code: {}'.format(response.status_code))
+    @param images {metadata file name: local image file name}
+    """
 
-    pin_json = response.json()
-    if ipfs_hash not in pin_json['Pins']:
-        logger.error('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
-        raise Exception('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+    image_map = load_image_map(directory)
+    image_map.update(images)
 
-    return True
+    image_map_file = get_image_map_file(directory)
+    tmp_file = '{}.tmp'.format(image_map_file)
+    with open(tmp_file, 'w') as file:
+        file.write(json.dumps(image_map, indent=4))
+    os.replace(tmp_file, image_map_file)
 
 def main():
     global logger
@@ -127,6 +155,21 @@ def main():
                                      default=None,
                                      metavar='NAME',
                                      help='Filename to upload and pin')
+    parser.add_argument('--api-url', required=False,
+                                     action='store',
+                                     default=IpfsClient.DEFAULT_API_URL,
+                                     metavar='URL',
+                                     help='IPFS API, default = {}'.format(IpfsClient.DEFAULT_API_URL))
+    parser.add_argument('--bundle',  required=False,
+                                     action='store_true',
+                                     default=False,
+                                     help='Upload all of the drop images as one CAR, images become ipfs://<root>/<file>')
+    parser.add_argument('--workers', required=False,
+                                     action='store',
+                                     type=int,
+                                     default=8,
+                                     metavar='COUNT',
+                                     help='Concurrent uploads, default = 8')
 
     args = parser.parse_args()
 
@@ -135,6 +178,9 @@ def main():
     network = args.network
     drop_name = args.drop
     filename = args.file
+    api_url = args.api_url
+    workers = args.workers
+    bundle = args.bundle
 
     tcr.nftmint.setup_logging(network, 'ipfs')
     logger = logging.getLogger(network)
@@ -160,45 +206,62 @@ def main():
         logger.info('Drop: {}'.format(drop_name))
 
         metametadata = get_metametadata(network, drop_name)
-        if 'cards' in metametadata and len(metametadata['cards']) > 0:
-            for card in metametadata['cards']:
-                nftfilename = './nft/{}/{}/{}'.format(network, drop_name, card['local_source'])
-                ipfs_hash = ipfs_upload(projectid, projectsecret, nftfilename)
-                pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
-                logger.info('PIN State: {}'.format(pin_state))
-                logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
-                logger.info('')
-                card['image'] = 'ipfs://{}'.format(ipfs_hash)
-            set_metametadata(network, drop_name, metametadata)
-        elif 'layer-sets' in metametadata and len(metametadata['layer-sets']) > 0:
-            metadataset = get_metadataset(network, drop_name)
-            for filename in metadataset['files']:
-                nftmetadata = {}
-                logger.info("Open NFT Metadata: {}".format(filename))
-                with open(filename, 'r') as mdfile:
-                    nftmetadata = json.load(mdfile)
-
-                policy_id = list(nftmetadata['721'].keys())[0]
-                token_name = list(nftmetadata['721'][policy_id].keys())[0]
-                if not nftmetadata['721'][policy_id][token_name]['image'].startswith('ipfs://'):
-                    logger.info('Upload: {} / {}'.format(nftmetadata['721'][policy_id][token_name]['image'], filename))
-                    ipfs_hash = ipfs_upload(projectid, projectsecret, nftmetadata['721'][policy_id][token_name]['image'])
-                    pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
-                    logger.info('PIN State: {}'.format(pin_state))
-
-                    nftmetadata['721'][policy_id][token_name]['image'] = 'ipfs://{}'.format(ipfs_hash)
-                    with open(filename, 'w') as f:
-                        f.write(json.dumps(nftmetadata, indent=4))
-                        logger.info('Saved MetaMetaData: {}'.format(filename))
-
-                    logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
-                    logger.info('')
+        manifest_file = 'nft/{}/{}/ipfs_manifest.jsonl'.format(network, drop_name)
+        with IpfsClient(projectid, projectsecret, api_url, workers) as client, UploadManifest(manifest_file) as manifest:
+            if 'cards' in metametadata and len(metametadata['cards']) > 0:
+                nftfilenames = ['./nft/{}/{}/{}'.format(network, drop_name, card['local_source']) for card in metametadata['cards']]
+                cids = upload_files(client, nftfilenames, manifest, workers)
+                for (card, nftfilename) in zip(metametadata['cards'], nftfilenames):
+                    logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(cids[nftfilename]))
+                    card['image'] = 'ipfs://{}'.format(cids[nftfilename])
+                set_metametadata(network, drop_name, metametadata)
+            elif 'layer-sets' in metametadata and len(metametadata['layer-sets']) > 0:
+                metadataset = get_metadataset(network, drop_name)
+                pending = {}
+                for filename in metadataset['files']:
+                    nftmetadata = {}
+                    logger.debug("Open NFT Metadata: {}".format(filename))
+                    with open(filename, 'r') as mdfile:
+                        nftmetadata = json.load(mdfile)
+
+                    image = get_token(nftmetadata)['image']
+                    if not image.startswith('ipfs://'):
+                        logger.info('Upload: {} / {}'.format(image, filename))
+                        pending[filename] = nftmetadata
+
+                # Upload everything first then update the metadata in one pass
+                images = [get_token(pending[filename])['image'] for filename in pending]
+                image_map = {os.path.basename(filename): os.path.basename(get_token(pending[filename])['image']) for filename in pending}
+                if bundle and len(images) > 0:
+                    car = CarBundle(images)
+                    logger.info('Bundle: {} files, root: {}'.format(len(car.get_names()), car.get_root()))
+                    roots = client.dag_import(car.stream())
+                    if not car.get_root() in roots:
+                        logger.error('Bundle root not imported: {} not in {}'.format(car.get_root(), roots))
+                        raise Exception('Bundle root not imported: {} not in {}'.format(car.get_root(), roots))
+                    logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(car.get_root()))
+
+                    for filename in pending:
+                        token = get_token(pending[filename])
+                        token['image'] = 'ipfs://{}/{}'.format(car.get_root(), os.path.basename(token['image']))
+                else:
+                    cids = upload_files(client, images, manifest, workers)
+                    for filename in pending:
+                        token = get_token(pending[filename])
+                        token['image'] = 'ipfs://{}'.format(cids[token['image']])
+
+                rewrite_images(pending)
+                update_image_map('nft/{}/{}'.format(network, drop_name), image_map)
+                logger.info('Saved {} NFT Metadata files'.format(len(pending)))
+
+                # Keep a packed copy of the metadata in sync with the updated files
+                if len(pending) > 0 and os.path.isfile(tcr.drop_archive.get_archive_file(network, drop_name)):
+                    tcr.drop_archive.pack_drop(network, drop_name)
     else:
         # Just upload and pin the specified file
         logger.info('File: {}'.format(filename))
-        ipfs_hash = ipfs_upload(projectid, projectsecret, filename)
-        pin_state = ipfs_pin(projectid, projectsecret, ipfs_hash)
-        logger.info('PIN State: {}'.format(pin_state))
+        with IpfsClient(projectid, projectsecret, api_url) as client:
+            ipfs_hash = client.upload(filename)
         logger.info('   Verify: http://ipfs.io/ipfs/{}'.format(ipfs_hash))
         logger.info('')
 
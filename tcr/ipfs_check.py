@@ -20,14 +20,21 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from typing import Dict
+from typing import Dict, Set, Tuple
 import argparse
-import json
+import concurrent.futures
 import logging
 import os
 import requests
+import requests.adapters
+import threading
+import time
 import tcr.command
 import tcr.nftmint
+from tcr.drop_archive import load_documents
+import tcr.cid
+from tcr.car import CarBundle
+from tcr.ipfs import load_image_map
 import traceback
 import hashlib
 
@@ -37,7 +44,16 @@ Author: Kris Henderson
 
 After files have been uploaded to IPFS with ipfs.py, this utility checks to make
 sure each metadata file has been correctly updated as well as the file on IPFS
-is able to be downloaded and matches the original
+is able to be downloaded and matches the original.
+
+Each token is paired with the local image ipfs.py recorded for it when the
+image was uploaded, so a token pointing at the wrong image fails.  Tokens
+uploaded before that record existed are paired with the local file that has
+the same CID, which only shows the image is available.  Tokens that pass are
+recorded in a progress file by metadata name and CID and skipped when the
+check is run again.  With --local only the CIDs are compared and nothing is
+downloaded, its progress is kept in a file of its own so a later download
+check still downloads every token.
 """
 
 logger = None
@@ -52,9 +68,86 @@ def calc_sha256(filepath: str) :
             buf = afile.read(BLOCKSIZE)
     return hasher.hexdigest()
 
-def sort_filename(value: str) -> int:
-    number = value.split('x')[2]
-    return int(number)
+def get_image_cid(md: Dict) -> str:
+    erc721 = md['721']
+    policy = erc721[list(erc721.keys())[0]]
+    token = policy[list(policy.keys())[0]]
+    return token['image'][7:]
+
+def _file_cid(job: Tuple[str, int]) -> Tuple[str, str]:
+    """
+    Process pool worker, the CID of one local file.
+    """
+
+    (path, version) = job
+    return (tcr.cid.calculate_file(path, version), path)
+
+def build_cid_index(img_dir: str, versions: Set[int], workers: int) -> Dict[str, str]:
+    """
+    @return {CID: local file} for each file in img_dir
+    """
+
+    jobs = [(os.path.join(img_dir, fname), version) for fname in sorted(os.listdir(img_dir)) for version in versions]
+    index = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        for (cid, path) in executor.map(_file_cid, jobs, chunksize=16):
+            index[cid] = path
+
+    return index
+
+def download_sha256(session: requests.Session, url: str, retries: int, backoff: float) -> str:
+    """
+    sha256 of a download, hashed as it streams in.  Failed downloads are tried
+    again with an exponential backoff.
+    """
+
+    for attempt in range(0, retries + 1):
+        try:
+            with session.get(url, stream=True, timeout=60) as response:
+                if response.status_code != 200:
+                    raise Exception('Download Status Code: {}'.format(response.status_code))
+
+                hasher = hashlib.sha256()
+                for chunk in response.iter_content(chunk_size=65536):
+                    hasher.update(chunk)
+                return hasher.hexdigest()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            logger.warning('Download failed: {}, {}, retry in {:.1f}s'.format(url, e, delay))
+            time.sleep(delay)
+
+class Progress:
+    """
+    Tokens that have already been verified, one metadata name and CID per line.
+    """
+
+    def __init__(self, progress_file: str):
+        self.verified = set()
+        self.lock = threading.Lock()
+        if os.path.isfile(progress_file):
+            with open(progress_file, 'r') as file:
+                self.verified = set([line.strip() for line in file if line.endswith('\n')])
+
+        self.file = open(progress_file, 'a')
+
+    def close(self) -> None:
+        self.file.close()
+
+    @staticmethod
+    def get_key(md_name: str, cid: str) -> str:
+        return '{} {}'.format(os.path.basename(md_name), cid)
+
+    def contains(self, md_name: str, cid: str) -> bool:
+        return Progress.get_key(md_name, cid) in self.verified
+
+    def add(self, md_name: str, cid: str) -> None:
+        key = Progress.get_key(md_name, cid)
+        with self.lock:
+            self.verified.add(key)
+            self.file.write(key + '\n')
+            self.file.flush()
 
 def main():
     global logger
@@ -69,57 +162,150 @@ def main():
                                        action='store',
                                        metavar='LOCATION',
                                        help='Directory containing metadata and images')
-    parser.add_argument('--start', required=False,
+    parser.add_argument('--archive', required=False,
+                                       action='store',
+                                       metavar='FILE',
+                                       default=None,
+                                       help='Read the metadata from this drop archive instead of <directory>/nft_metadata')
+    parser.add_argument('--local', required=False,
+                                       action='store_true',
+                                       default=False,
+                                       help='Compare the metadata CID to the CID calculated from the local file, no download')
+    parser.add_argument('--gateway', required=False,
+                                       action='store',
+                                       metavar='URL',
+                                       default='http://ipfs.io/ipfs',
+                                       help='IPFS gateway to download from, default = http://ipfs.io/ipfs')
+    parser.add_argument('--workers', required=False,
+                                       action='store',
+                                       metavar='COUNT',
+                                       type=int,
+                                       default=8,
+                                       help='Concurrent downloads, default = 8')
+    parser.add_argument('--retries', required=False,
                                        action='store',
-                                       metavar='index',
+                                       metavar='COUNT',
                                        type=int,
-                                       default=0,
-                                       help='Start index, default = 0')
+                                       default=4,
+                                       help='Retries for each download, default = 4')
+    parser.add_argument('--restart', required=False,
+                                       action='store_true',
+                                       default=False,
+                                       help='Ignore the progress of previous checks and verify everything again')
 
     args = parser.parse_args()
     directory = args.directory
     network = args.network
-    start = args.start
+    archive_file = args.archive
+    local = args.local
+    gateway = args.gateway.rstrip('/')
+    workers = args.workers
+    retries = args.retries
+    restart = args.restart
 
     tcr.nftmint.setup_logging(network, 'ipfs_check')
     logger = logging.getLogger(network)
 
     img_dir = os.path.join(directory, 'nft_img')
-    md_dir = os.path.join(directory, 'nft_metadata')
+    md_source = os.path.join(directory, 'nft_metadata')
+    if archive_file != None:
+        md_source = archive_file
 
-    image_files = os.listdir(img_dir)
-    metadata_files = os.listdir(md_dir)
+    progress_file = os.path.join(directory, 'ipfs_check_progress.txt')
+    if local:
+        progress_file = os.path.join(directory, 'ipfs_check_local_progress.txt')
+    if restart and os.path.isfile(progress_file):
+        os.remove(progress_file)
+    progress = Progress(progress_file)
 
-    image_files.sort()
-    metadata_files.sort(key=sort_filename)
+    tokens = [(md_name, get_image_cid(md)) for (md_name, md) in load_documents(md_source)]
+    pending = [(md_name, cid) for (md_name, cid) in tokens if not progress.contains(md_name, cid)]
+    logger.info('Tokens: {}, already verified: {}'.format(len(tokens), len(tokens) - len(pending)))
 
-    if len(image_files) != len(metadata_files):
-        logger.error('Length not equal, {} != {}'.format(len(image_files), len(metadata_files)))
+    # The local image of each token as recorded by ipfs.py when it was uploaded
+    image_map = load_image_map(directory)
+    unmapped = [md_name for (md_name, cid) in pending if not os.path.basename(md_name) in image_map]
+    if len(unmapped) > 0:
+        logger.warning('No local image recorded for {} tokens, these are only checked against a file with the same CID'.format(len(unmapped)))
 
-    logger.info('Start at index = {}'.format(start))
-    for i in range(start, len(image_files)):
-        with open(os.path.join(md_dir, metadata_files[i]), 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
+    # Images uploaded with ipfs.py --bundle are ipfs://<root>/<file name>
+    cid_index = {}
+    if local or len(unmapped) > 0:
+        versions = set([tcr.cid.get_version(cid) for (md_name, cid) in pending if not '/' in cid])
+        cid_index = build_cid_index(img_dir, versions, workers)
+    logger.info('Local files: {}'.format(len(os.listdir(img_dir))))
 
-                image = token['image']
-                cid = image[7:]
+    bundles = {}
+    for (md_name, cid) in tokens:
+        if '/' in cid:
+            (root, name) = cid.split('/', 1)
+            bundles.setdefault(root, []).append(os.path.join(img_dir, name))
 
-                logger.info('Verify: {}'.format(metadata_files[i]))
-                download_url = 'http://ipfs.io/ipfs/{}'.format(cid)
-                logger.info('Download: {}'.format(download_url))
-                r = requests.get(download_url)
-                hasher = hashlib.sha256()
-                hasher.update(r.content)
-                ipfs_hash = hasher.hexdigest()
-                logger.info('Compare: {}'.format(image_files[i]))
-                local_hash = calc_sha256(os.path.join(img_dir, image_files[i]))
-
-                if local_hash != ipfs_hash:
-                    logger.error('HASH Not Equal!!')
-                    raise Exception('HASH Not Equal!!')
+    # The root of a bundle covers every file in it, rebuild the bundle from the
+    # local files to check them all at once
+    valid_roots = set()
+    if local:
+        for root in bundles:
+            try:
+                local_root = CarBundle(bundles[root]).get_root()
+            except FileNotFoundError as e:
+                logger.error('Bundle {} missing local file: {}'.format(root, e.filename))
+                continue
+
+            if local_root == root:
+                valid_roots.add(root)
+            else:
+                logger.error('Bundle root Not Equal!! {} != {}'.format(local_root, root))
+
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=workers))
+
+    def verify(md_name: str, cid: str) -> None:
+        expected_file = None
+        if os.path.basename(md_name) in image_map:
+            expected_file = os.path.join(img_dir, image_map[os.path.basename(md_name)])
+
+        if '/' in cid:
+            (root, name) = cid.split('/', 1)
+            local_file = os.path.join(img_dir, name)
+            if local and not root in valid_roots:
+                raise Exception('Bundle does not match local files: {}, {}'.format(md_name, cid))
+        elif expected_file != None and not local:
+            # The download is compared to the file the token should be
+            local_file = expected_file
+        elif cid in cid_index:
+            local_file = cid_index[cid]
+        else:
+            raise Exception('No local file matches: {}, {}'.format(md_name, cid))
+
+        if expected_file != None and local_file != expected_file:
+            raise Exception('Wrong image: {}, {} is {}, expected {}'.format(md_name, cid, local_file, expected_file))
+
+        logger.debug('Verify: {} = {}'.format(md_name, local_file))
+        if not local:
+            ipfs_hash = download_sha256(session, '{}/{}'.format(gateway, cid), retries, 1.0)
+            if ipfs_hash != calc_sha256(local_file):
+                raise Exception('HASH Not Equal!! {}, {}'.format(md_name, local_file))
+
+        progress.add(md_name, cid)
+
+    failures = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(verify, md_name, cid): md_name for (md_name, cid) in pending}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failures += 1
+                logger.error('{}: {}'.format(futures[future], e))
+
+    session.close()
+    progress.close()
+
+    logger.info('Verified: {}, Failed: {}'.format(len(pending) - failures, failures))
+    if failures > 0:
+        raise Exception('{} tokens failed verification'.format(failures))
 
 if __name__ == '__main__':
     try:
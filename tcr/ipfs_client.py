@@ -0,0 +1,309 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: ipfs_client.py
+Author: Kris Henderson
+
+Upload and pin files through the IPFS HTTP API.  Connections are pooled in
+one requests.Session and files are uploaded by a pool of threads.  The CID of
+each uploaded file is saved in a manifest keyed by the sha256 of the file so
+an interrupted upload can be resumed without sending the same files again.
+"""
+
+from typing import Dict, Iterable, Iterator, List
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+import tcr.cid
+
+logger = logging.getLogger('ipfs-client')
+
+def file_sha256(filename: str, chunk_size: int = 1024 * 1024) -> str:
+    sha256 = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+class IpfsClient:
+    DEFAULT_API_URL = 'https://ipfs.infura.io:5001/api/v0'
+
+    def __init__(self, projectid: str, projectsecret: str, api_url: str = None, pool_size: int = 16):
+        """
+        @param api_url Base URL of the IPFS API, default = infura.io
+        @param pool_size Maximum number of connections kept open
+        """
+
+        self.api_url = (api_url if api_url != None else IpfsClient.DEFAULT_API_URL).rstrip('/')
+        self.session = requests.Session()
+        if projectid != None:
+            self.session.auth = (projectid, projectsecret)
+
+        # Retry busy or failing gateways.  Uploads are idempotent, the same
+        # content always gets the same CID.  The API reports ordinary errors,
+        # e.g. not pinned, as 500 so those aren't retried.
+        retry = urllib3.util.retry.Retry(total=3,
+                                         backoff_factor=0.5,
+                                         status_forcelist=(429, 502, 503, 504),
+                                         allowed_methods=None,
+                                         raise_on_status=False)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def add(self, filename: str) -> str:
+        """
+        Upload a file without pinning it.
+
+        @return The CID of the file
+        """
+
+        logger.info('Uploading: {}'.format(filename))
+        with open(filename, 'rb') as file:
+            response = self.session.post('{}/add'.format(self.api_url),
+                                         params={'pin': 'false'},
+                                         files={'file': (os.path.basename(filename), file)})
+
+        if response.status_code != 200:
+            logger.error('Upload Status Code: {}'.format(response.status_code))
+            raise Exception('Upload Status Code: {}'.format(response.status_code))
+
+        return response.json()['Hash']
+
+    def pin(self, ipfs_hash: str) -> bool:
+        logger.info('Pinning: {}'.format(ipfs_hash))
+        response = self.session.post('{}/pin/add'.format(self.api_url),
+                                     params={'arg': ipfs_hash})
+
+        if response.status_code != 200:
+            logger.error('Pin Status Code: {}'.format(response.status_code))
+            raise Exception('Pin Status Code: {}'.format(response.status_code))
+
+        pin_json = response.json()
+        if ipfs_hash not in pin_json['Pins']:
+            logger.error('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+            raise Exception('WUT?  {} != {}'.format(pin_json['Pins'], ipfs_hash))
+
+        return True
+
+    def is_pinned(self, ipfs_hash: str) -> bool:
+        response = self.session.post('{}/pin/ls'.format(self.api_url),
+                                     params={'arg': ipfs_hash, 'type': 'recursive'})
+
+        # Not pinned is reported as an error
+        if response.status_code != 200:
+            return False
+
+        return ipfs_hash in response.json().get('Keys', {})
+
+    def dag_import(self, car_stream: Iterable[bytes]) -> List[str]:
+        """
+        Upload a CAR file and pin its roots.  The CAR is sent as it is read
+        from car_stream without buffering it.  A stream can't be sent twice so
+        this request isn't retried, importing the same CAR again is harmless.
+
+        @return The pinned root CIDs
+        """
+
+        boundary = uuid.uuid4().hex
+
+        def body() -> Iterator[bytes]:
+            yield ('--{}\r\n'
+                   'Content-Disposition: form-data; name="file"; filename="bundle.car"\r\n'
+                   'Content-Type: application/vnd.ipld.car\r\n\r\n').format(boundary).encode('utf-8')
+            for data in car_stream:
+                yield data
+            yield '\r\n--{}--\r\n'.format(boundary).encode('utf-8')
+
+        logger.info('Importing CAR')
+        with requests.Session() as session:
+            session.auth = self.session.auth
+            response = session.post('{}/dag/import'.format(self.api_url),
+                                    params={'pin-roots': 'true'},
+                                    data=body(),
+                                    headers={'Content-Type': 'multipart/form-data; boundary={}'.format(boundary)})
+
+        if response.status_code != 200:
+            logger.error('Import Status Code: {}'.format(response.status_code))
+            raise Exception('Import Status Code: {}'.format(response.status_code))
+
+        roots = []
+        for line in response.text.splitlines():
+            if len(line.strip()) == 0:
+                continue
+            result = json.loads(line)
+            if not 'Root' in result:
+                continue
+            if len(result['Root'].get('PinErrorMsg', '')) > 0:
+                logger.error('Pin Error: {}'.format(result['Root']['PinErrorMsg']))
+                raise Exception('Pin Error: {}'.format(result['Root']['PinErrorMsg']))
+            roots.append(result['Root']['Cid']['/'])
+
+        return roots
+
+    def upload(self, filename: str) -> str:
+        """
+        Upload and pin a file.
+
+        @return The CID of the file
+        """
+
+        ipfs_hash = self.add(filename)
+        self.pin(ipfs_hash)
+        return ipfs_hash
+
+class UploadManifest:
+    """
+    CIDs of uploaded and pinned files keyed by the sha256 of the file.
+
+    The manifest is a JSON lines file that is only appended to, one line per
+    upload, so it is safe to interrupt at any time.  A partial last line is
+    ignored.
+    """
+
+    def __init__(self, manifest_file: str):
+        self.manifest_file = manifest_file
+        self.cids = {}
+        self.lock = threading.Lock()
+
+        complete = True
+        if os.path.isfile(self.manifest_file):
+            with open(self.manifest_file, 'r') as file:
+                for line in file:
+                    complete = line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        logger.warning('Skip invalid manifest line: {}'.format(line.strip()))
+                        continue
+                    self.cids[entry['sha256']] = entry['cid']
+
+        self.file = open(self.manifest_file, 'a')
+        if not complete:
+            self.file.write('\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.cids)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def get(self, sha256: str) -> str:
+        return self.cids.get(sha256)
+
+    def put(self, sha256: str, cid: str) -> None:
+        with self.lock:
+            self.cids[sha256] = cid
+            self.file.write(json.dumps({'sha256': sha256, 'cid': cid}, separators=(',', ':')) + '\n')
+            self.file.flush()
+
+def upload_files(client: IpfsClient,
+                 filenames: List[str],
+                 manifest: UploadManifest = None,
+                 workers: int = 8,
+                 check_pinned: bool = True) -> Dict[str, str]:
+    """
+    Upload and pin files concurrently.  Files already in the manifest are not
+    sent again.  Files that uploaded are kept in the manifest even when others
+    fail, the first error is raised after all of the uploads finish.
+
+    @param check_pinned Calculate the CID of files not in the manifest and
+                        only upload them when that CID isn't already pinned
+
+    @return {filename: CID}
+    """
+
+    start = time.time()
+    uploaded = [0]
+    lock = threading.Lock()
+
+    def upload(filename: str) -> str:
+        sha256 = None
+        if manifest != None:
+            sha256 = file_sha256(filename)
+            cid = manifest.get(sha256)
+            if cid != None:
+                logger.debug('Already uploaded: {} = {}'.format(filename, cid))
+                return cid
+
+        cid = None
+        if check_pinned:
+            local_cid = tcr.cid.calculate_file(filename)
+            if client.is_pinned(local_cid):
+                logger.debug('Already pinned: {} = {}'.format(filename, local_cid))
+                cid = local_cid
+
+        if cid == None:
+            cid = client.upload(filename)
+            with lock:
+                uploaded[0] += 1
+
+        if manifest != None:
+            manifest.put(sha256, cid)
+
+        return cid
+
+    filenames = list(dict.fromkeys(filenames))
+    cids = {}
+    error = None
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(upload, filename): filename for filename in filenames}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                cids[futures[future]] = future.result()
+            except Exception as e:
+                logger.error('Upload failed: {}, {}'.format(futures[future], e))
+                if error == None:
+                    error = e
+
+    if error != None:
+        raise error
+
+    logger.info('Uploaded {} of {} files in {:.2f}s'.format(uploaded[0], len(filenames), time.time() - start))
+    return cids
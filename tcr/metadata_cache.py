@@ -0,0 +1,86 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: metadata_cache.py
+Author: Kris Henderson
+"""
+
+from typing import Any, Callable, Dict
+import collections
+import json
+import os
+import threading
+
+class MetadataCache:
+    """
+    Size bounded LRU cache of parsed metadata files.
+
+    Entries are keyed by the file path and its modification time and size so
+    a file that is rewritten, e.g. by ipfs.py, is parsed again.  The parsed
+    objects are shared between callers and must not be modified.
+    """
+
+    def __init__(self, parse: Callable[[Dict], Any], max_entries: int = 4096):
+        """
+        @param parse Converts the loaded JSON into the object to cache
+        @param max_entries The least recently used entries are dropped past this
+        """
+
+        self.parse = parse
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def get_key(path: str):
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self, path: str) -> Any:
+        """
+        The parsed metadata for path, parsing the file only if it isn't cached
+        or it has changed.
+        """
+
+        key = MetadataCache.get_key(path)
+        with self.lock:
+            if path in self.entries and self.entries[path][0] == key:
+                self.entries.move_to_end(path)
+                return self.entries[path][1]
+
+        with open(path, 'r') as file:
+            value = self.parse(json.load(file))
+
+        with self.lock:
+            self.store(path, key, value)
+
+        return value
+
+    def store(self, path: str, key, value: Any) -> None:
+        self.entries[path] = (key, value)
+        self.entries.move_to_end(path)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -59,6 +59,34 @@ class MetadataList:
     def revert(self) -> None:
         self.peek_index = 0
 
+    def append_files(self, files) -> None:
+        """
+        Add files to the end of the list and save it.
+        """
+
+        self.metadata_list['files'].extend(files)
+        with open(self.metadata_set_file, 'w') as file:
+            file.write(json.dumps(self.metadata_list, indent=4))
+
+    def remove_files(self, files) -> int:
+        """
+        Remove files that are already minted, wherever they are in the list.
+
+        @return The number of files removed
+        """
+
+        minted = set(files)
+        remaining = [filename for filename in self.metadata_list['files'] if not filename in minted]
+        removed = len(self.metadata_list['files']) - len(remaining)
+        if removed > 0:
+            logger.info('MetadataList, Remove {} minted files'.format(removed))
+            self.metadata_list['files'] = remaining
+            self.peek_index = 0
+            with open(self.metadata_set_file, 'w') as file:
+                file.write(json.dumps(self.metadata_list, indent=4))
+
+        return removed
+
     def commit(self) -> None:
         while self.peek_index > 0:
             self.metadata_list['files'].pop(0)
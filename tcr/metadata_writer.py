@@ -0,0 +1,107 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: metadata_writer.py
+Author: Kris Henderson
+"""
+
+from typing import Dict
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger('metadata-writer')
+
+class MetadataWriter:
+    """
+    Write many NFT metadata files into one directory.
+
+    The directory is created once.  Each document is encoded on the calling
+    thread and the file is written by a small pool of threads so generating
+    a large drop isn't held up by one open/write/close at a time.  The number
+    of encoded documents waiting to be written is bounded.
+
+    Files are written compact.  Use beautify.py to pretty print one.
+    """
+
+    def __init__(self, directory: str, workers: int = 8, max_pending: int = 256):
+        self.directory = directory
+        self.count = 0
+        self.size = 0
+        self.futures = []
+        self.pending = threading.BoundedSemaphore(max_pending)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self.start_time = time.time()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def write(self, name: str, document: Dict) -> str:
+        """
+        Queue one document to be written to <directory>/<name>.json
+
+        @return The name of the file
+        """
+
+        filename = '{}/{}.json'.format(self.directory, name)
+        data = json.dumps(document, separators=(',', ':')).encode('utf-8')
+        self.count += 1
+        self.size += len(data)
+
+        self.pending.acquire()
+        future = self.executor.submit(MetadataWriter.write_file, filename, data)
+        future.add_done_callback(lambda f: self.pending.release())
+        self.futures.append(future)
+
+        return filename
+
+    def close(self) -> None:
+        """
+        Wait for all of the files to be written.  Raises the first error from
+        any of the writes.
+        """
+
+        self.executor.shutdown(wait=True)
+        for future in self.futures:
+            future.result()
+        self.futures = []
+
+        elapsed = max(time.time() - self.start_time, 0.000001)
+        logger.info('Metadata Writer: {} files, {} bytes in {:.2f}s, {:.0f} files/s'.format(self.count,
+                                                                                          self.size,
+                                                                                          elapsed,
+                                                                                          self.count / elapsed))
+
+    @staticmethod
+    def write_file(filename: str, data: bytes) -> None:
+        with open(filename, 'wb') as file:
+            file.write(data)
@@ -0,0 +1,156 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: mint_journal.py
+Author: Kris Henderson
+
+Write-ahead journal of mint transactions.
+
+Every mint goes through reserve -> built -> submitted -> confirmed, or ends
+in failed.  Each step is appended to a JSON lines file and synced to disk
+before the minter acts on it, so after a crash the entries that didn't
+reach confirmed or failed are all that needs to be checked against the
+chain, @see tcr.tcr.reconcile_mint_journal.
+"""
+
+from typing import Dict, List
+import logging
+import json
+import os
+import time
+
+logger = logging.getLogger('mint-journal')
+
+def get_journal_file(network: str, drop_name: str, shard: int = 0) -> str:
+    if shard != 0:
+        return 'nft/{}/{}/mint_journal_shard{}.jsonl'.format(network, drop_name, shard)
+
+    return 'nft/{}/{}/mint_journal.jsonl'.format(network, drop_name)
+
+class MintJournal:
+    RESERVE = 'reserve'
+    BUILT = 'built'
+    SUBMITTED = 'submitted'
+    CONFIRMED = 'confirmed'
+    FAILED = 'failed'
+
+    def __init__(self, journal_file: str):
+        self.journal_file = journal_file
+        self.entries = {}
+        self.next_id = 1
+
+        complete = True
+        if os.path.exists(journal_file):
+            with open(journal_file, 'r') as file:
+                for line in file:
+                    complete = line.endswith('\n')
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # partial line written during a crash, the step never happened
+                        logger.warning('Mint journal, skip partial record in {}'.format(journal_file))
+                        continue
+
+                    self.entries.setdefault(record['id'], {}).update(record)
+                    self.next_id = max(self.next_id, record['id'] + 1)
+
+        self.file = open(journal_file, 'a')
+        if not complete:
+            self.file.write('\n')
+
+    def close(self) -> None:
+        self.file.close()
+
+    def append(self, record: Dict) -> None:
+        record['time'] = round(time.time())
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.entries.setdefault(record['id'], {}).update(record)
+
+    def reserve(self, input_utxos: List, files: List[str]) -> int:
+        """
+        Record the payments and metadata files of a mint about to be built.
+
+        @param input_utxos [{'utxo': Dict, 'count': N}], @see tcr.tcr.mint_nft_external
+        @return The journal id of the mint
+        """
+
+        journal_id = self.next_id
+        self.next_id += 1
+
+        inputs = []
+        for item in input_utxos:
+            inputs.append({'tx-hash': item['utxo']['tx-hash'],
+                           'tx-ix': item['utxo']['tx-ix'],
+                           'amount': item['utxo']['amount'],
+                           'count': item['count']})
+        self.append({'id': journal_id, 'state': MintJournal.RESERVE, 'inputs': inputs, 'files': files})
+        return journal_id
+
+    def built(self, journal_id: int, txid: str, signed_tx: Dict, ttl: int = None) -> None:
+        """
+        @param signed_tx The signed transaction envelope so it can be submitted
+                         again after a crash
+        @param ttl The transaction is invalid from this slot on
+        """
+
+        self.append({'id': journal_id, 'state': MintJournal.BUILT, 'txid': txid, 'signed-tx': signed_tx, 'ttl': ttl})
+
+    def submitted(self, journal_id: int, txid: str) -> None:
+        self.append({'id': journal_id, 'state': MintJournal.SUBMITTED, 'txid': txid})
+
+    def confirmed(self, journal_id: int) -> None:
+        self.append({'id': journal_id, 'state': MintJournal.CONFIRMED})
+
+    def failed(self, journal_id: int) -> None:
+        self.append({'id': journal_id, 'state': MintJournal.FAILED})
+
+    def get_entry(self, journal_id: int) -> Dict:
+        return self.entries[journal_id]
+
+    def get_unresolved(self) -> List[Dict]:
+        unresolved = [entry for entry in self.entries.values() if not entry['state'] in (MintJournal.CONFIRMED, MintJournal.FAILED)]
+        unresolved.sort(key=lambda entry: entry['id'])
+        return unresolved
+
+    def compact(self) -> None:
+        """
+        Rewrite the journal with only the unresolved entries.
+        """
+
+        unresolved = self.get_unresolved()
+        temp_file = self.journal_file + '.tmp'
+        with open(temp_file, 'w') as file:
+            for entry in unresolved:
+                file.write(json.dumps(entry) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.file.close()
+        os.replace(temp_file, self.journal_file)
+        self.file = open(self.journal_file, 'a')
+
+        resolved = len(self.entries) - len(unresolved)
+        self.entries = {entry['id']: entry for entry in unresolved}
+        logger.debug('Mint journal, compacted {} resolved entries'.format(resolved))
@@ -0,0 +1,291 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: mint_shards.py
+Author: Kris Henderson
+
+Mint the general sale from several deposit addresses at once.
+
+Each shard takes payments on its own address of the policy owner's wallet
+and runs process_incoming_payments in its own process with its own metadata
+set file, sales and mint journal.  The coordinator, in the parent process,
+owns the drop's metadata set file and hands out ranges of it to the shards
+when they run low.  A range is removed from the drop's list before it is
+sent, so no file is ever given to two shards.  A shard that dies between the
+two loses that range rather than risk minting it twice.
+
+A shard with no payments waiting releases what it holds back to the
+coordinator, so a busy shard can take it over.  The files left in the list of
+a shard process that exits are taken back the same way.  A shard only treats the drop
+as sold out when the coordinator's list is empty and no other shard holds any
+files, until then its buyers wait.
+"""
+
+from typing import Dict, List
+import logging
+import multiprocessing
+import os
+import queue
+import json
+
+from tcr.cardano import Cardano
+from tcr.database import Database
+from tcr.chain_cache import ChainCache, get_cache_file
+from tcr.metadata_list import MetadataList
+from tcr.wallet import Wallet
+import tcr.nftmint
+import tcr.tcr
+
+logger = logging.getLogger('mint-shards')
+
+def get_shard_metadata_set_file(metadata_set_file: str, shard: int) -> str:
+    return '{}_shard{}.json'.format(os.path.splitext(metadata_set_file)[0], shard)
+
+class ShardAllocator:
+    """
+    Given to a shard process, asks the coordinator for more metadata files.
+    """
+
+    def __init__(self, shard: int, requests, response):
+        self.shard = shard
+        self.requests = requests
+        self.response = response
+        self.sold_out = False
+        # The coordinator counts files against this shard until they are released
+        self.holding = True
+
+    def __call__(self, count: int, remaining: int = 0) -> List[str]:
+        """
+        Ask for count more files.
+
+        @param remaining Files the shard still has, the coordinator counts
+                         them as held by the shard
+        """
+
+        self.requests.put(('allocate', self.shard, count, remaining))
+        (files, self.sold_out) = self.response.get()
+        self.holding = remaining + len(files) > 0
+        return files
+
+    def release(self, files: List[str]) -> None:
+        """
+        Give files back to the coordinator, the shard must have removed them
+        from its own list first.
+        """
+
+        self.requests.put(('release', self.shard, files))
+        self.holding = False
+
+class ShardCoordinator:
+    # Smallest range handed out at a time
+    RANGE_SIZE = 20
+
+    def __init__(self, metadata_set_file: str, shards: int, range_size: int = RANGE_SIZE):
+        self.metadata = MetadataList(metadata_set_file)
+        self.shards = shards
+        self.range_size = range_size
+
+        context = multiprocessing.get_context('spawn')
+        self.context = context
+        self.requests = context.Queue()
+        self.responses = [context.Queue() for shard in range(0, shards)]
+
+        # Files handed to a shard stay with it across restarts, make sure the
+        # drop's list doesn't still have any of them after a crash
+        self.shard_files = []
+        self.held = []
+        for shard in range(0, shards):
+            shard_file = get_shard_metadata_set_file(metadata_set_file, shard)
+            if not os.path.exists(shard_file):
+                with open(shard_file, 'w') as file:
+                    file.write(json.dumps({'files': []}, indent=4))
+
+            shard_metadata = MetadataList(shard_file)
+            self.metadata.remove_files(shard_metadata.metadata_list['files'])
+            logger.info('Shard {}: {} NFTs allocated'.format(shard, shard_metadata.get_remaining()))
+            self.shard_files.append(shard_file)
+            self.held.append(shard_metadata.get_remaining())
+
+        extra = get_shard_metadata_set_file(metadata_set_file, shards)
+        if os.path.exists(extra):
+            logger.warning('Shard {} and above have metadata files but are not running: {}'.format(shards, extra))
+
+    def get_allocator(self, shard: int) -> ShardAllocator:
+        return ShardAllocator(shard, self.requests, self.responses[shard])
+
+    def allocate(self, shard: int, count: int, remaining: int = 0) -> List[str]:
+        """
+        Hand out at least range_size files, or what is left.
+
+        @param remaining Files the shard still has
+        """
+
+        files = []
+        count = min(max(count, self.range_size), self.metadata.get_remaining())
+        for i in range(0, count):
+            files.append(self.metadata.peek_next_file())
+        self.metadata.commit()
+        self.held[shard] = remaining + len(files)
+
+        logger.info('Shard {}: allocate {} NFTs, {} unallocated'.format(shard, len(files), self.metadata.get_remaining()))
+        return files
+
+    def release(self, shard: int, files: List[str]) -> None:
+        """
+        Take back all of a shard's files so another shard can have them.
+        """
+
+        if len(files) > 0:
+            self.metadata.append_files(files)
+        self.held[shard] = 0
+
+        logger.info('Shard {}: release {} NFTs, {} unallocated'.format(shard, len(files), self.metadata.get_remaining()))
+
+    def reclaim(self, shard: int) -> None:
+        """
+        Take back the files of a shard whose process has exited.  Files of a
+        mint in its journal were already removed from its list.
+        """
+
+        shard_metadata = MetadataList(self.shard_files[shard])
+        files = list(shard_metadata.metadata_list['files'])
+        shard_metadata.remove_files(files)
+        logger.warning('Shard {}: exited holding {} NFTs'.format(shard, len(files)))
+        self.release(shard, files)
+
+    def is_sold_out(self, shard: int) -> bool:
+        """
+        Nothing left to hand out and no other shard that might release files.
+        """
+
+        if self.metadata.get_remaining() > 0:
+            return False
+
+        return all([self.held[other] == 0 for other in range(0, self.shards) if other != shard])
+
+    def serve(self, processes: List) -> None:
+        """
+        Answer allocation requests until all the shard processes exit.
+        """
+
+        while any([process.is_alive() for process in processes]):
+            for shard in range(0, len(processes)):
+                if self.held[shard] > 0 and not processes[shard].is_alive():
+                    self.reclaim(shard)
+
+            try:
+                request = self.requests.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            if request[0] == 'release':
+                (action, shard, files) = request
+                self.release(shard, files)
+            else:
+                (action, shard, count, remaining) = request
+                files = self.allocate(shard, count, remaining)
+                self.responses[shard].put((files, self.is_sold_out(shard)))
+
+def run_shard(network: str,
+              shard: int,
+              allocator: ShardAllocator,
+              wallet_name: str,
+              policy_name: str,
+              drop_name: str,
+              metadata_set_file: str,
+              prices: Dict[int, int],
+              max_per_tx: int,
+              merged_archive: str) -> None:
+    """
+    Shard process, a connection to cardano-cli and db-sync of its own then
+    the payment loop on the shard's address.
+    """
+
+    tcr.nftmint.setup_logging(network, 'nftmint_shard{}'.format(shard))
+    cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
+    database.open()
+
+    # Each shard appends to a merged metadata archive of its own, like its sales
+    if merged_archive != None and shard != 0:
+        (base, extension) = os.path.splitext(merged_archive)
+        merged_archive = '{}_shard{}{}'.format(base, shard, extension)
+
+    mint_wallet = Wallet(wallet_name, cardano.get_network())
+    try:
+        tcr.tcr.process_incoming_payments(cardano,
+                                          database,
+                                          mint_wallet,
+                                          policy_name,
+                                          drop_name,
+                                          metadata_set_file,
+                                          prices,
+                                          max_per_tx,
+                                          merged_archive,
+                                          shard,
+                                          allocator)
+    except Exception:
+        logger.exception('Shard {}: Caught Exception'.format(shard))
+    finally:
+        database.close()
+
+def process_incoming_payments(cardano: Cardano,
+                              mint_wallet: Wallet,
+                              policy_name: str,
+                              drop_name: str,
+                              metadata_set_file: str,
+                              prices: Dict[int, int],
+                              max_per_tx: int,
+                              merged_archive: str,
+                              shards: int) -> None:
+    """
+    Run the general sale on shards deposit addresses until every shard exits.
+    """
+
+    network = cardano.get_network()
+    for shard in range(0, shards):
+        address_index = Wallet.get_shard_address_index(shard)
+        if mint_wallet.get_payment_address(address_index) == None:
+            mint_wallet.setup_address(address_index)
+        logger.info('Shard {}: Payment address {}'.format(shard, mint_wallet.get_payment_address(address_index)))
+
+    coordinator = ShardCoordinator(metadata_set_file, shards)
+    processes = []
+    for shard in range(0, shards):
+        process = coordinator.context.Process(target=run_shard,
+                                              args=(network,
+                                                    shard,
+                                                    coordinator.get_allocator(shard),
+                                                    mint_wallet.get_name(),
+                                                    policy_name,
+                                                    drop_name,
+                                                    coordinator.shard_files[shard],
+                                                    prices,
+                                                    max_per_tx,
+                                                    merged_archive))
+        process.start()
+        processes.append(process)
+
+    coordinator.serve(processes)
+    for process in processes:
+        process.join()
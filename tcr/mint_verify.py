@@ -0,0 +1,197 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: mint_verify.py
+Author: Kris Henderson
+
+Verify the metadata of a drop before minting: one token per file, the drop
+policy id and an image uploaded to IPFS.  Files are checked in a process pool
+and the results are saved to a manifest.  On the next start only files whose
+size or modification time changed are checked again.
+
+Manifest layout:
+{
+    'policy-id': 'the-policy-id',
+    'files': {
+        'path': {'size': N, 'mtime': N, 'sha256': 'hex', 'verdict': 'ok'},
+        ...
+    },
+    'seal': 'sha256 of the policy id and files'
+}
+
+The seal is a plain digest, not a signature.  It catches a manifest that was
+truncated or edited by hand, in which case everything is verified again.
+"""
+
+from typing import Dict, List, Tuple
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger('mint-verify')
+
+VERDICT_OK = 'ok'
+
+def get_manifest_file(network: str, drop_name: str) -> str:
+    return 'nft/{}/{}/verify_manifest.json'.format(network, drop_name)
+
+def check_metadata(raw_md: Dict, policy_id: str) -> str:
+    """
+    @return VERDICT_OK or the reason the metadata can't be minted
+    """
+
+    if not '721' in raw_md or len(raw_md['721']) == 0:
+        return 'Missing 721 metadata'
+
+    md_policy_id = list(raw_md['721'].keys())[0]
+    token_names = list(raw_md['721'][md_policy_id].keys())
+    if len(token_names) != 1:
+        return 'There should only be one token name'
+
+    if md_policy_id != policy_id:
+        return 'Policy ID mismatch'
+
+    image = raw_md['721'][md_policy_id][token_names[0]].get('image')
+    if not isinstance(image, str) or not image.startswith('ipfs://'):
+        return 'Image not uploaded to IPFS'
+
+    return VERDICT_OK
+
+def _verify(job: Tuple) -> Tuple[str, Dict]:
+    """
+    Process pool worker.  Top level so it can be pickled.
+    """
+
+    (name, stat, policy_id) = job
+    with open(name, 'rb') as file:
+        data = file.read()
+    try:
+        verdict = check_metadata(json.loads(data), policy_id)
+    except Exception as e:
+        verdict = 'Invalid metadata: {}'.format(e)
+
+    return (name, {'size': stat[0],
+                   'mtime': stat[1],
+                   'sha256': hashlib.sha256(data).hexdigest(),
+                   'verdict': verdict})
+
+class MintVerifier:
+    # Below this many files the pool start up costs more than it saves
+    MIN_POOL_FILES = 64
+
+    def __init__(self, manifest_file: str, policy_id: str, workers: int = None):
+        """
+        @param workers Worker processes, default = number of CPUs
+        """
+
+        self.manifest_file = manifest_file
+        self.policy_id = policy_id
+        self.workers = workers
+        self.checked = 0
+        self.reused = 0
+
+    @staticmethod
+    def get_seal(policy_id: str, files: Dict) -> str:
+        body = json.dumps({'policy-id': policy_id, 'files': files}, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(body.encode('utf-8')).hexdigest()
+
+    def load_manifest(self) -> Dict:
+        """
+        Previous results, or empty if there is no manifest or it can't be
+        trusted.
+        """
+
+        if not os.path.isfile(self.manifest_file):
+            return {}
+
+        try:
+            with open(self.manifest_file, 'r') as file:
+                manifest = json.load(file)
+        except ValueError:
+            logger.warning('Unreadable manifest: {}'.format(self.manifest_file))
+            return {}
+
+        if manifest.get('policy-id') != self.policy_id:
+            logger.info('Policy changed, verify all files')
+            return {}
+
+        if manifest.get('seal') != MintVerifier.get_seal(manifest['policy-id'], manifest.get('files')):
+            logger.warning('Manifest seal mismatch, verify all files: {}'.format(self.manifest_file))
+            return {}
+
+        return manifest['files']
+
+    def save_manifest(self, files: Dict) -> None:
+        manifest = {'policy-id': self.policy_id,
+                    'files': files,
+                    'seal': MintVerifier.get_seal(self.policy_id, files)}
+
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w') as file:
+            file.write(json.dumps(manifest, separators=(',', ':')))
+        os.replace(tmp_file, self.manifest_file)
+
+    def verify(self, metadata_files: List[str]) -> List[Tuple[str, str]]:
+        """
+        Verify the metadata files, reusing the manifest result of files that
+        haven't changed.
+
+        @return [(file, verdict)] of each file that failed
+        """
+
+        start = time.time()
+        previous = self.load_manifest()
+
+        files = {}
+        jobs = []
+        for name in metadata_files:
+            file_stat = os.stat(name)
+            stat = (file_stat.st_size, file_stat.st_mtime_ns)
+
+            entry = previous.get(name)
+            if entry != None and entry['size'] == stat[0] and entry['mtime'] == stat[1]:
+                files[name] = entry
+            else:
+                jobs.append((name, stat, self.policy_id))
+
+        self.reused = len(files)
+        self.checked = len(jobs)
+        workers = self.workers if self.workers != None else os.cpu_count()
+        if len(jobs) < MintVerifier.MIN_POOL_FILES or workers == 1:
+            for (name, entry) in map(_verify, jobs):
+                files[name] = entry
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(jobs) // (4 * workers))
+                for (name, entry) in executor.map(_verify, jobs, chunksize=chunksize):
+                    files[name] = entry
+
+        if self.checked > 0 or len(files) != len(previous):
+            self.save_manifest(files)
+
+        logger.info('Verified {} files, {} unchanged, {:.2f}s'.format(self.checked, self.reused, time.time() - start))
+
+        return [(name, files[name]['verdict']) for name in metadata_files if files[name]['verdict'] != VERDICT_OK]
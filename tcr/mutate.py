@@ -23,6 +23,7 @@
 from tcr.wallet import Wallet
 from tcr.cardano import Cardano
 from tcr.database import Database
+from tcr.chain_cache import ChainCache, get_cache_file
 import logging
 import argparse
 import tcr.command
@@ -164,7 +165,7 @@ def process_requests(network: str, wallet_name: str, requests_file: str) -> None
     cardano.query_protocol_parameters()
     tip_slot = tip['slot']
 
-    database = Database('{}.ini'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
     database.open()
     latest_slot = database.query_latest_slot()
     sync_progress = database.query_sync_progress()
@@ -185,10 +186,16 @@ def process_requests(network: str, wallet_name: str, requests_file: str) -> None
     (utxos, total_lovelace) = cardano.query_utxos(wallet,
                                                   [wallet.get_payment_address(addr_index, delegated=True),
                                                    wallet.get_payment_address(addr_index, delegated=False)])
+    senders = database.query_senders([utxo['tx-hash'] for utxo in utxos])
     for utxo in utxos:
-        inputs = database.query_utxo_inputs(utxo['tx-hash'])
-        utxo['from'] = inputs[0]['address']
-        utxo['from_stake'] = database.query_stake_address(utxo['from'])
+        if not utxo['tx-hash'] in senders:
+            logger.warning('Sender not found, waiting for DB SYNC: {}'.format(utxo['tx-hash']))
+            utxo['from'] = None
+            utxo['from_stake'] = None
+            continue
+
+        utxo['from'] = senders[utxo['tx-hash']]['address']
+        utxo['from_stake'] = senders[utxo['tx-hash']]['stake-address']
 
     # Setup directories for output files
     if not os.path.exists('normie_pkg'):
@@ -224,7 +231,7 @@ def process_requests(network: str, wallet_name: str, requests_file: str) -> None
         # search for a payment that matches the request
         payment = None
         for utxo in utxos:
-            if utxo['from_stake'] == normie_owner:
+            if utxo['from_stake'] != None and utxo['from_stake'] == normie_owner:
                 payment = utxo
                 break
 
@@ -269,6 +276,8 @@ def process_requests(network: str, wallet_name: str, requests_file: str) -> None
     shutil.make_archive(subdir, 'zip', subdir)
     logger.info('Normies Package: {}.zip'.format(subdir))
 
+    database.close()
+
 def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('--requests', required=False,
@@ -25,12 +25,16 @@ File: nft.py
 Author: Kris Henderson
 """
 
-from typing import Dict, List
+from typing import Dict, List, Tuple
+import concurrent.futures
 import json
 import os
+import tempfile
 import time
 import random
-from tcr.command import Command
+from tcr.metadata_cache import MetadataCache
+from tcr.metadata_writer import MetadataWriter
+import tcr.phash
 import logging
 import hashlib
 import numpy
@@ -39,7 +43,47 @@ from PIL import Image
 
 logger = logging.getLogger('nft')
 
+# Decoded base layers, kept for the life of a create_drop_combos worker process
+_combo_base_images = {}
+
+def _render_combo(job: Tuple) -> Tuple[str, Tuple]:
+    """
+    Render one Character x Mutation pair for Nft.create_drop_combos.  Runs in a
+    worker process.
+
+    @return (result_name, thumbnail) where thumbnail is None or the (mode, size,
+            bytes) of a downscaled copy for the contact sheet.
+    """
+
+    ((base_path, base_x, base_y), (layer_path, layer_x, layer_y), result_name, size, thumb_size) = job
+
+    if not base_path in _combo_base_images:
+        with Image.open(base_path) as im:
+            base = im.convert('RGBA')
+        canvas = Image.new('RGBA', base.size)
+        Nft.composite_layer(canvas, base, base_x, base_y)
+        _combo_base_images[base_path] = canvas
+
+    image = _combo_base_images[base_path].copy()
+    with Image.open(layer_path) as im:
+        Nft.composite_layer(image, im.convert('RGBA'), layer_x, layer_y)
+
+    image = image.resize(Nft.fit_size(image.size, size), Image.LANCZOS)
+    image.save(result_name)
+
+    thumbnail = None
+    if thumb_size != None:
+        thumb = image.resize(Nft.fit_size(image.size, thumb_size), Image.LANCZOS)
+        thumbnail = (thumb.mode, thumb.size, thumb.tobytes())
+
+    return (result_name, thumbnail)
+
 class Nft:
+    # Parsed metadata shared by the mint path, see load_metadata_file
+    metadata_cache = None
+    # tmpfs for metadata files only cardano-cli reads, see create_temp_metadata_file
+    TEMP_METADATA_DIR = '/dev/shm'
+
     @staticmethod
     def parse_metadata_file(metadata_file: str) -> Dict:
         """
@@ -58,56 +102,113 @@ class Nft:
         }
 
         """
-        metadata = {}
-
         with open(metadata_file, 'r') as file:
             raw_md = json.load(file)
-            policy_id = list(raw_md['721'].keys())[0]
-            token_names = list(raw_md['721'][policy_id].keys())
-            metadata['policy-id'] = policy_id
-            metadata['token-names'] = token_names
-            metadata['properties'] = {}
-            for token_name in token_names:
-                metadata['properties'][token_name] = raw_md['721'][policy_id][token_name]
+
+        return Nft.parse_metadata(raw_md)
+
+    @staticmethod
+    def parse_metadata(raw_md: Dict) -> Dict:
+        """
+        Same as parse_metadata_file for metadata that has already been loaded,
+        e.g. from a DropArchive.
+        """
+
+        metadata = {}
+        policy_id = list(raw_md['721'].keys())[0]
+        token_names = list(raw_md['721'][policy_id].keys())
+        metadata['policy-id'] = policy_id
+        metadata['token-names'] = token_names
+        metadata['properties'] = {}
+        for token_name in token_names:
+            metadata['properties'][token_name] = raw_md['721'][policy_id][token_name]
 
         return metadata
 
     @staticmethod
-    def merge_metadata_files(policy_id: str, nft_metadata_files: List[str]) -> str:
-        directory = os.path.dirname(nft_metadata_files[0])
-        merged_file = os.path.join(directory, 'nft_merged_metadata_{}.json'.format(round(time.time())))
+    def load_metadata_file(metadata_file: str) -> Dict:
+        """
+        Same as parse_metadata_file but the result is kept in a cache so the
+        file is only parsed again when it changes.  The returned dictionary is
+        shared and must not be modified.
+        """
+
+        if Nft.metadata_cache == None:
+            Nft.metadata_cache = MetadataCache(Nft.parse_metadata)
+
+        return Nft.metadata_cache.get(metadata_file)
+
+    @staticmethod
+    def merge_metadata(policy_id: str, nft_metadata_files: List[str]) -> Dict:
+        """
+        Merge single token metadata files to mint all of the tokens in one
+        transaction.  The merged metadata only exists in memory, @see
+        create_temp_metadata_file when cardano-cli needs it as a file.
+
+        @return Parsed merged metadata, @see parse_metadata
+        """
 
         nft_merged_metadata = {}
         nft_merged_metadata['721'] = {}
         nft_merged_metadata['721'][policy_id] = {}
         for fname in nft_metadata_files:
-            nftmd = Nft.parse_metadata_file(fname)
+            nftmd = Nft.load_metadata_file(fname)
             token_name = nftmd['token-names'][0]
             nft_merged_metadata['721'][policy_id][token_name] = nftmd['properties'][token_name]
 
-        with open(merged_file, 'w') as file:
-            file.write(json.dumps(nft_merged_metadata, indent=4))
+        return Nft.parse_metadata(nft_merged_metadata)
+
+    @staticmethod
+    def get_raw_metadata(nft_metadata: Dict) -> Dict:
+        """
+        Rebuild the CIP-25 721 document from parsed metadata.
+        """
 
-        return merged_file
+        return {'721': {nft_metadata['policy-id']: {token_name: nft_metadata['properties'][token_name]
+                                                    for token_name in nft_metadata['token-names']}}}
 
     @staticmethod
-    def create_metadata(network: str,
-                        policy_id: str,
-                        drop_name: str,
-                        token_name: str,
-                        nft_name: str,
-                        mdin: Dict) -> str:
+    def create_temp_metadata_file(nft_metadata: Dict) -> str:
+        """
+        Write parsed metadata to a temporary file for cardano-cli.  /dev/shm is
+        used when available so the file never touches the disk.  The caller
+        must remove the file.
         """
-        Write JSON metadata according to the Cardano NFT metadata format proposal.
 
-        Test the output at https://pool.pm/test/metadata
+        directory = Nft.TEMP_METADATA_DIR if os.path.isdir(Nft.TEMP_METADATA_DIR) else None
+        (fd, metadata_file) = tempfile.mkstemp(prefix='tcr_merged_metadata_',
+                                               suffix='.json',
+                                               dir=directory)
+        with os.fdopen(fd, 'w') as file:
+            file.write(json.dumps(Nft.get_raw_metadata(nft_metadata), separators=(',', ':')))
+
+        return metadata_file
+
+    @staticmethod
+    def archive_metadata(archive_file: str, nft_metadata: Dict) -> None:
+        """
+        Append merged metadata to a JSON lines file, one compact line per mint,
+        to keep a record of what was minted.
         """
 
-        md_dir = 'nft/{}/{}/nft_metadata'.format(network, drop_name)
-        metadata_file = '{}/{}.json'.format(md_dir, token_name)
+        record = {'time': round(time.time()), 'metadata': Nft.get_raw_metadata(nft_metadata)}
+        with open(archive_file, 'a') as file:
+            file.write(json.dumps(record, separators=(',', ':')) + '\n')
 
-        if not os.path.exists(md_dir):
-            os.makedirs(md_dir)
+    @staticmethod
+    def get_metadata_dir(network: str, drop_name: str) -> str:
+        return 'nft/{}/{}/nft_metadata'.format(network, drop_name)
+
+    @staticmethod
+    def build_metadata(policy_id: str,
+                       token_name: str,
+                       nft_name: str,
+                       mdin: Dict) -> Dict:
+        """
+        Build JSON metadata according to the Cardano NFT metadata format proposal.
+
+        Test the output at https://pool.pm/test/metadata
+        """
 
         metadata = {}
         metadata["721"] = {}
@@ -122,11 +223,58 @@ class Nft:
         for key in mdin['properties']:
             metadata["721"][policy_id][token_name][key] = mdin['properties'][key]
 
+        return metadata
+
+    @staticmethod
+    def create_metadata(network: str,
+                        policy_id: str,
+                        drop_name: str,
+                        token_name: str,
+                        nft_name: str,
+                        mdin: Dict) -> str:
+        """
+        Write a single JSON metadata file.  Use MetadataWriter with
+        Nft.build_metadata when creating the metadata for a whole drop.
+        """
+
+        md_dir = Nft.get_metadata_dir(network, drop_name)
+        metadata_file = '{}/{}.json'.format(md_dir, token_name)
+
+        if not os.path.exists(md_dir):
+            os.makedirs(md_dir)
+
+        metadata = Nft.build_metadata(policy_id, token_name, nft_name, mdin)
         with open(metadata_file, 'w') as file:
             file.write(json.dumps(metadata, indent=4))
 
         return metadata_file
 
+    @staticmethod
+    def create_card_metadata(writer: MetadataWriter,
+                             policy_id: str,
+                             nft_id: int,
+                             token_name: str,
+                             nft_name: str,
+                             metadata: Dict,
+                             codewords: List[str]) -> str:
+        """
+        Create the metadata file for one edition of a card.
+        """
+
+        if 'id' in metadata['properties']:
+            metadata['properties']['id'] = nft_id
+
+        if 'code' in metadata['properties']:
+            metadata['properties']['code'] = random.randint(0, 0xFFFFFFFF)
+
+        if 'word' in metadata['properties']:
+            metadata['properties']['word'] = codewords.pop()
+
+        return writer.write(token_name, Nft.build_metadata(policy_id,
+                                                           token_name,
+                                                           nft_name,
+                                                           metadata))
+
     @staticmethod
     def create_card_metadata_set(network: str,
                                  policy_id: str,
@@ -138,23 +286,16 @@ class Nft:
                                  codewords: List[str]) -> List[str]:
         count = metadata['count']
         fnames = []
-        for i in range(0, count):
-            if 'id' in metadata['properties']:
-                metadata['properties']['id'] = base_nft_id + i
-
-            if 'code' in metadata['properties']:
-                metadata['properties']['code'] = random.randint(0, 0xFFFFFFFF)
-
-            if 'word' in metadata['properties']:
-                metadata['properties']['word'] = codewords.pop()
-
-            fname = Nft.create_metadata(network,
-                                        policy_id,
-                                        series_name,
-                                        token_name.format(i+1),
-                                        nft_name.format(i+1),
-                                        metadata)
-            fnames.append(fname)
+        with MetadataWriter(Nft.get_metadata_dir(network, series_name)) as writer:
+            for i in range(0, count):
+                fname = Nft.create_card_metadata(writer,
+                                                 policy_id,
+                                                 base_nft_id + i,
+                                                 token_name.format(i+1),
+                                                 nft_name.format(i+1),
+                                                 metadata,
+                                                 codewords)
+                fnames.append(fname)
         return fnames
 
     @staticmethod
@@ -209,46 +350,62 @@ class Nft:
                 buf = afile.read(BLOCKSIZE)
         return hasher.hexdigest()
 
+    @staticmethod
+    def get_card_order(counts: List[int], rng: numpy.random.RandomState) -> List[int]:
+        """
+        The mint order of a card drop as the index of the card of each
+        edition.  One entry per edition, a single permutation of them mixes
+        the cards in proportion to their counts.
+        """
+
+        return rng.permutation(numpy.repeat(numpy.arange(len(counts)), counts)).tolist()
+
     @staticmethod
     def create_cards_set(network: str,
                          policy_id: str,
                          metametadata: Dict,
                          codewords: List[str],
                          rng: numpy.random.RandomState) -> List[str]:
+        """
+        Create the metadata for every edition of every card and return the
+        files in a random mint order.  Each card is weighted by its count so
+        the cards stay evenly mixed through the whole drop.
+        """
+
         series = metametadata['series']
         drop_name = metametadata['drop-name']
         init_nft_id = metametadata['init-nft-id']
         base_token_name = metametadata['token-name']
         base_nft_name = metametadata['nft-name']
 
-        card_lists = []
-        total = 0
-        for card in metametadata['cards']:
-            token_name = base_token_name.format(series, card['id'], '{:03}')
-            nft_name = base_nft_name.format(series, card['id'], '{}', card['count'])
-            files = Nft.create_card_metadata_set(network,
-                                                    policy_id,
-                                                    drop_name,
-                                                    init_nft_id,
-                                                    token_name,
-                                                    nft_name,
-                                                    card,
-                                                    codewords)
-            card_lists.append(files)
-            total += card['count']
+        cards = metametadata['cards']
+        token_names = []
+        nft_names = []
+        base_nft_ids = []
+        for card in cards:
+            token_names.append(base_token_name.format(series, card['id'], '{:03}'))
+            nft_names.append(base_nft_name.format(series, card['id'], '{}', card['count']))
+            base_nft_ids.append(init_nft_id)
             init_nft_id += card['count']
 
+        order = Nft.get_card_order([card['count'] for card in cards], rng)
+
+        # Editions of each card are still numbered 1..count in mint order.
+        # Every file is written here, the minter reads them from the list.
+        editions = [0] * len(cards)
         fnames = []
-        while total > 0:
-            num = rng.randint(0, total)
-            for l in card_lists:
-                if num > len(l):
-                    num -= len(l)
-                elif len(l) > 0:
-                    item = l.pop(0)
-                    fnames.append(item)
-                    break
-            total -=1
+        with MetadataWriter(Nft.get_metadata_dir(network, drop_name)) as writer:
+            for card_index in order:
+                edition = editions[card_index]
+                editions[card_index] += 1
+                fname = Nft.create_card_metadata(writer,
+                                                 policy_id,
+                                                 base_nft_ids[card_index] + edition,
+                                                 token_names[card_index].format(edition+1),
+                                                 nft_names[card_index].format(edition+1),
+                                                 cards[card_index],
+                                                 codewords)
+                fnames.append(fname)
 
         return fnames
 
@@ -266,47 +423,135 @@ class Nft:
 
         return geometry
 
+    @staticmethod
+    def fit_size(size: Tuple[int, int], box: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Scale size so it fits inside box while keeping the aspect ratio.  This
+        matches the ImageMagick '-resize WxH' geometry.
+        """
+
+        scale = min(box[0] / size[0], box[1] / size[1])
+        return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+    @staticmethod
+    def composite_layer(base: Image.Image,
+                        layer: Image.Image,
+                        offset_x: int,
+                        offset_y: int) -> None:
+        """
+        Alpha composite layer on top of base at the given offset.  base is
+        modified in place.  Negative offsets and layers that extend past the
+        edge of base are clipped.
+        """
+
+        left = max(0, -offset_x)
+        top = max(0, -offset_y)
+        right = min(layer.width, base.width - offset_x)
+        bottom = min(layer.height, base.height - offset_y)
+        if right <= left or bottom <= top:
+            return
+
+        base.alpha_composite(layer,
+                             dest=(offset_x + left, offset_y + top),
+                             source=(left, top, right, bottom))
+
+    @staticmethod
+    def create_contact_sheet(thumbnails: List[Image.Image],
+                             sheet_file: str,
+                             columns: int = 10) -> str:
+        """
+        Tile the thumbnails into a grid and save it as one image.  All
+        thumbnails are expected to be about the same size.
+        """
+
+        cell_w = max(thumb.width for thumb in thumbnails)
+        cell_h = max(thumb.height for thumb in thumbnails)
+        rows = (len(thumbnails) + columns - 1) // columns
+        sheet = Image.new('RGBA', (cell_w * min(columns, len(thumbnails)), cell_h * rows))
+        for i in range(0, len(thumbnails)):
+            sheet.paste(thumbnails[i], ((i % columns) * cell_w, (i // columns) * cell_h))
+
+        sheet.save(sheet_file)
+        return sheet_file
+
     @staticmethod
     def create_drop_combos(network: str,
                            policy_id: str,
-                           metametadata: Dict) -> None:
+                           metametadata: Dict,
+                           workers: int = None,
+                           contact_sheet: bool = False) -> None:
+        """
+        Render every Character x Mutation pair of each layer set so the artist
+        can preview all of the combinations.
+
+        The pairs are rendered in parallel by a pool of worker processes.  Each
+        worker decodes a Character image once and reuses it for all of the
+        pairs it renders.
+
+        @param workers Number of worker processes.  Default is one per CPU.
+        @param contact_sheet Also save a downscaled contact sheet of each
+                             layer set in nft/<network>/<drop>/contact_sheets
+        """
+
         drop_name = metametadata['drop-name']
 
         total_combinations = Nft.calculate_total_combinations(metametadata)
         logger.info('Total Combinations: {} images, Layer Sets: {} sets'.format(total_combinations, len(metametadata['layer-sets'])))
 
+        size = (1200, 1680)
+        if 'output-width' in metametadata and 'output-height' in metametadata:
+            size = (metametadata['output-width'], metametadata['output-height'])
+
+        thumb_size = None
+        if contact_sheet:
+            thumb_size = (size[0] // 8, size[1] // 8)
+
+        img_dir = 'nft/{}/{}/nft_img'.format(network, drop_name)
+        if not os.path.exists(img_dir):
+            os.makedirs(img_dir)
+
+        # Collect the pairs to render for each layer set
+        jobs = {}
         layer_sets = metametadata['layer-sets']
-        layer_set_obj = None
         card_number = 1
         for layer_set_item in layer_sets:
             dir = os.path.dirname(os.path.abspath(metametadata['self']))
             with open(os.path.join(dir, layer_set_item['file']), 'r') as ls_file:
                 layer_set_obj = json.load(ls_file)
-                layers = layer_set_obj['layers']
-                for layer in layers:
-                    # TODO: Generalize layer names as parameters
-                    if layer['name'] == 'Character':
-                        character_image = layer['images'][0]['image']
-                        character_geometry = Nft.get_geometry(layer['images'][0]['offset-x'],
-                                                              layer['images'][0]['offset-y'])
-
-                    # TODO: Generalize layer names as parameters
-                    if layer['name'] == 'Mutation':
-                        for image in layer['images']:
-                            mutation_image = image['image']
-                            mutation_geometry = Nft.get_geometry(image['offset-x'],
-                                                                 image['offset-y'])
-                            result_name = 'nft/{}/{}/nft_img/{:05}_{}'.format(network, drop_name, card_number, os.path.basename(mutation_image))
-                            command = ['convert']
-                            command.extend(['nft/{}/{}/{}'.format(network, drop_name, character_image),
-                                            '-geometry', character_geometry])
-                            command.extend(['nft/{}/{}/{}'.format(network, drop_name, mutation_image),
-                                            '-geometry', mutation_geometry, '-composite'])
-                            command.extend(['-resize', '1200x1680'])
-                            command.append(result_name)
-                            logger.info('Create: {}'.format(result_name))
-                            Command.run_generic(command)
-                            card_number += 1
+
+            jobs[layer_set_obj['name']] = []
+            for layer in layer_set_obj['layers']:
+                # TODO: Generalize layer names as parameters
+                if layer['name'] == 'Character':
+                    character = (os.path.join(dir, layer['images'][0]['image']),
+                                 layer['images'][0]['offset-x'],
+                                 layer['images'][0]['offset-y'])
+
+                # TODO: Generalize layer names as parameters
+                if layer['name'] == 'Mutation':
+                    for image in layer['images']:
+                        mutation = (os.path.join(dir, image['image']),
+                                    image['offset-x'],
+                                    image['offset-y'])
+                        result_name = '{}/{:05}_{}'.format(img_dir, card_number, os.path.basename(image['image']))
+                        jobs[layer_set_obj['name']].append((character, mutation, result_name, size, thumb_size))
+                        card_number += 1
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            for name in jobs:
+                thumbnails = []
+                for (result_name, thumb) in executor.map(_render_combo, jobs[name], chunksize=4):
+                    logger.info('Create: {}'.format(result_name))
+                    if thumb != None:
+                        thumbnails.append(Image.frombytes(thumb[0], thumb[1], thumb[2]))
+
+                if len(thumbnails) > 0:
+                    sheet_dir = 'nft/{}/{}/contact_sheets'.format(network, drop_name)
+                    if not os.path.exists(sheet_dir):
+                        os.makedirs(sheet_dir)
+
+                    sheet_file = Nft.create_contact_sheet(thumbnails, '{}/{}.png'.format(sheet_dir, name))
+                    logger.info('Contact Sheet: {}'.format(sheet_file))
 
         return None
 
@@ -324,141 +569,144 @@ class Nft:
         image_hashes = {}
         image_names = {}
 
+        # Perceptual hashes of the images created so far.  Two images within
+        # max_hash_distance bits of each other are considered duplicates.
+        image_index = tcr.phash.BKTree()
+        max_hash_distance = 0
+        if 'max-hash-distance' in metametadata:
+            max_hash_distance = metametadata['max-hash-distance']
+
         total_combinations = Nft.calculate_total_combinations(metametadata)
         logger.info('Total Combinations: {} images, Layer Sets: {} sets'.format(total_combinations, len(metametadata['layer-sets'])))
         logger.info('NFTs to generate: {}'.format(metametadata['total']))
 
         total_to_generate = metametadata['total']
         fnames = []
-
         frequencies = [0] * 101
 
-        while len(fnames) < total_to_generate:
-            images = []
-            metadata = {}
-            properties = {}
-
-            logger.info('Created: {}'.format(len(fnames)))
-            # 1.  Randomly choose a layer-set according to weight of all
-            # layer sets.  The weight must add to 100
-            sum = 0
-            num = rng.random() * 100
-            frequencies[round(num)] += 1
-            layer_sets = metametadata['layer-sets']
-            layer_set_obj = None
-            for layer_set_item in layer_sets:
-                if num <= sum + layer_set_item['weight']:
-                    dir = os.path.dirname(os.path.abspath(metametadata['self']))
-                    with open(os.path.join(dir, layer_set_item['file']), 'r') as ls_file:
-                        layer_set_obj = json.load(ls_file)
-                    break
-                sum += layer_set_item['weight']
-
-            if layer_set_obj == None:
-                logger.error('Unexpected layer_set_obj == None')
-                raise Exception('Unexpected layer_set_obj == None')
-
-            card_number = len(fnames) + 1
-            result_name = 'nft/{}/{}/nft_img/{:05}_'.format(network, drop_name, card_number)
-            image_name = '{}_'.format(layer_set_obj['name'])
-
-            # 2. Now iterate each layer in the chosen layer set and randomly
-            # select an image from it
-            for layer in layer_set_obj['layers']:
+        with MetadataWriter(Nft.get_metadata_dir(network, drop_name)) as writer:
+            while len(fnames) < total_to_generate:
+                images = []
+                metadata = {}
+                properties = {}
+
+                logger.info('Created: {}'.format(len(fnames)))
+                # 1.  Randomly choose a layer-set according to weight of all
+                # layer sets.  The weight must add to 100
                 sum = 0
                 num = rng.random() * 100
                 frequencies[round(num)] += 1
-                img_obj = None
-                img_idx = 0
-                for image in layer['images']:
-                    if num <= sum + image['weight']:
-                        img_obj = image
+                layer_sets = metametadata['layer-sets']
+                layer_set_obj = None
+                for layer_set_item in layer_sets:
+                    if num <= sum + layer_set_item['weight']:
+                        dir = os.path.dirname(os.path.abspath(metametadata['self']))
+                        with open(os.path.join(dir, layer_set_item['file']), 'r') as ls_file:
+                            layer_set_obj = json.load(ls_file)
                         break
-                    sum += image['weight']
-                    img_idx += 1
-
-                if img_obj == None:
-                    logger.error('Unexpected image_obj == None')
-                    raise Exception('Unexpected image_obj == None')
-
-                image_name = image_name + '_{}'.format(img_idx)
-                if img_obj['image'] != None:
-                    images.append(img_obj)
-
-                # Add any metadata / properties associated with the image layer.  I suppose
-                # later layers could override some properties from previous layers
-                if 'properties' in img_obj:
-                    layer_properties = img_obj['properties']
-                    for k in layer_properties:
-                        properties[k] = layer_properties[k]
-
-            # Construct the command to merge image layers
-            if image_name in image_names:
-                logger.info('Already exists, try again: {}'.format(image_name))
-                continue
-
-            image_names[image_name] = True
-            result_name = result_name + image_name + '.png'
-            logger.info('Create: {}'.format(result_name))
-            command = ['convert']
-            for image in images:
-                if 'offset-x' in image:
-                    if image['offset-x'] >= 0:
-                        geometry = '+{}'.format(image['offset-x'])
-                    else:
-                        geometry = '{}'.format(image['offset-x'])
-                else:
-                    geometry = '+0'
-
-                if 'offset-y' in image:
-                    if image['offset-y'] >= 0:
-                        geometry += '+{}'.format(image['offset-y'])
-                    else:
-                        geometry += '{}'.format(image['offset-y'])
-                else:
-                    geometry += '+0'
-
-                if len(command) == 1:
-                    command.extend(['nft/{}/{}/{}'.format(network, drop_name, image['image']), '-geometry', geometry])
-                else:
-                    command.extend(['nft/{}/{}/{}'.format(network, drop_name, image['image']), '-geometry', geometry, '-composite'])
-
-            # Resize if requested in the metametadata
-            if 'output-width' in metametadata and 'output-height' in metametadata:
-                command.extend(['-resize', '{}x{}'.format(metametadata['output-width'],
-                                                          metametadata['output-height'])])
-
-            # Set output name and run the command
-            command.append(result_name)
-            Command.run_generic(command)
-
-            # Make sure it got created
-            if not os.path.isfile(result_name):
-                logger.error('File is missing: {}'.format(result_name))
-                raise Exception('File is missing: {}'.format(result_name))
-
-            # Make sure the generated file is unique
-            logger.info('Verify Unique: {}'.format(result_name))
-            hash = Nft.calc_sha256(result_name)
-            if hash in image_hashes:
-                logger.error('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
-                raise Exception('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
-            image_hashes[hash] = result_name
-
-            token_name = base_token_name.format(series, card_number, 1)
-            nft_name = base_nft_name.format(series, card_number, 1, 1)
-
-            metadata['image'] = result_name
-            if 'id' in properties:
-                properties['id'] = init_nft_id + card_number - 1
-            metadata['properties'] = properties
-            metadata_file = Nft.create_metadata(network,
-                                                policy_id,
-                                                drop_name,
-                                                token_name,
-                                                nft_name,
-                                                metadata)
-            fnames.append(metadata_file)
+                    sum += layer_set_item['weight']
+
+                if layer_set_obj == None:
+                    logger.error('Unexpected layer_set_obj == None')
+                    raise Exception('Unexpected layer_set_obj == None')
+
+                card_number = len(fnames) + 1
+                result_name = 'nft/{}/{}/nft_img/{:05}_'.format(network, drop_name, card_number)
+                image_name = '{}_'.format(layer_set_obj['name'])
+
+                # 2. Now iterate each layer in the chosen layer set and randomly
+                # select an image from it
+                for layer in layer_set_obj['layers']:
+                    sum = 0
+                    num = rng.random() * 100
+                    frequencies[round(num)] += 1
+                    img_obj = None
+                    img_idx = 0
+                    for image in layer['images']:
+                        if num <= sum + image['weight']:
+                            img_obj = image
+                            break
+                        sum += image['weight']
+                        img_idx += 1
+
+                    if img_obj == None:
+                        logger.error('Unexpected image_obj == None')
+                        raise Exception('Unexpected image_obj == None')
+
+                    image_name = image_name + '_{}'.format(img_idx)
+                    if img_obj['image'] != None:
+                        images.append(img_obj)
+
+                    # Add any metadata / properties associated with the image layer.  I suppose
+                    # later layers could override some properties from previous layers
+                    if 'properties' in img_obj:
+                        layer_properties = img_obj['properties']
+                        for k in layer_properties:
+                            properties[k] = layer_properties[k]
+
+                if image_name in image_names:
+                    logger.info('Already exists, try again: {}'.format(image_name))
+                    continue
+
+                image_names[image_name] = True
+                result_name = result_name + image_name + '.png'
+
+                # Merge the image layers in memory
+                image = None
+                for img_obj in images:
+                    offset_x = img_obj['offset-x'] if 'offset-x' in img_obj else 0
+                    offset_y = img_obj['offset-y'] if 'offset-y' in img_obj else 0
+                    with Image.open('nft/{}/{}/{}'.format(network, drop_name, img_obj['image'])) as im:
+                        layer = im.convert('RGBA')
+
+                    if image == None:
+                        image = Image.new('RGBA', layer.size)
+                    Nft.composite_layer(image, layer, offset_x, offset_y)
+
+                # Resize if requested in the metametadata
+                if 'output-width' in metametadata and 'output-height' in metametadata:
+                    image = image.resize(Nft.fit_size(image.size, (metametadata['output-width'],
+                                                                    metametadata['output-height'])),
+                                         Image.LANCZOS)
+
+                # Reject the image before it is written if it looks the same as
+                # one already created.  e.g. a layer that is transparent or hidden
+                # behind another layer.
+                image_hash = tcr.phash.dhash(image)
+                matches = image_index.search(image_hash, max_hash_distance)
+                if len(matches) > 0:
+                    logger.info('Near duplicate of {}, distance {}, try again: {}'.format(matches[0][1], matches[0][0], image_name))
+                    continue
+
+                logger.info('Create: {}'.format(result_name))
+                image.save(result_name)
+
+                # Make sure it got created
+                if not os.path.isfile(result_name):
+                    logger.error('File is missing: {}'.format(result_name))
+                    raise Exception('File is missing: {}'.format(result_name))
+
+                # Make sure the generated file is unique
+                logger.info('Verify Unique: {}'.format(result_name))
+                hash = Nft.calc_sha256(result_name)
+                if hash in image_hashes:
+                    logger.error('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
+                    raise Exception('Found Duplicate NFT Image: {} exists at {} for {}'.format(image_hashes[hash], hash, result_name))
+                image_hashes[hash] = result_name
+                image_index.add(image_hash, result_name)
+
+                token_name = base_token_name.format(series, card_number, 1)
+                nft_name = base_nft_name.format(series, card_number, 1, 1)
+
+                metadata['image'] = result_name
+                if 'id' in properties:
+                    properties['id'] = init_nft_id + card_number - 1
+                metadata['properties'] = properties
+                metadata_file = writer.write(token_name, Nft.build_metadata(policy_id,
+                                                                            token_name,
+                                                                            nft_name,
+                                                                            metadata))
+                fnames.append(metadata_file)
 
         for i in range(0, len(frequencies)):
             logger.info('frequencies[{}] = {}'.format(i, frequencies[i]))
@@ -471,7 +719,9 @@ class Nft:
                                    metametadata: Dict,
                                    codewords: List[str],
                                    rng: numpy.random.RandomState,
-                                   test_combos) -> List[str]:
+                                   test_combos,
+                                   workers: int = None,
+                                   contact_sheet: bool = False) -> List[str]:
         if "cards" in metametadata:
             fnames = Nft.create_cards_set(network,
                                           policy_id,
@@ -482,7 +732,9 @@ class Nft:
             if test_combos:
                 Nft.create_drop_combos(network,
                                        policy_id,
-                                       metametadata)
+                                       metametadata,
+                                       workers,
+                                       contact_sheet)
                 fnames = None
             else:
                 fnames = Nft.create_random_drop_set(network,
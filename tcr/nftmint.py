@@ -30,12 +30,16 @@ import traceback
 from datetime import datetime
 
 from tcr.database import Database
+from tcr.chain_cache import ChainCache, get_cache_file
 from tcr.cardano import Cardano
 from tcr.nft import Nft
 from tcr.wallet import Wallet
 from tcr.wallet import WalletExternal
 from tcr.metadata_list import MetadataList
+from tcr.mint_verify import MintVerifier
 import tcr.command
+import tcr.mint_shards
+import tcr.mint_verify
 import tcr.tcr
 import tcr.words
 import numpy
@@ -58,7 +62,7 @@ def setup_logging(network: str, application: str) -> None:
     file_format = logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s')
     file_handler.setFormatter(file_format)
 
-    logger_names = [network, 'tcr', 'nft', 'cardano', 'wallet', 'command', 'database', 'metadata-list']
+    logger_names = [network, 'tcr', 'nft', 'cardano', 'wallet', 'command', 'database', 'metadata-list', 'metadata-writer', 'drop-archive', 'mint-verify', 'ipfs-client', 'ownership', 'chain-cache', 'mint-journal', 'mint-shards', 'daemon', 'aio']
     for logger_name in logger_names:
         other_logger = logging.getLogger(logger_name)
         other_logger.setLevel(logging.DEBUG)
@@ -95,11 +99,72 @@ def get_series_metadata_set_file(cardano: Cardano, policy_name: str, drop_name:
 
     return metadata_set_file
 
+def prepare_drop(cardano: Cardano, drop_name: str, workers: int = None) -> Dict:
+    """
+    Load and verify a drop for minting.
+
+    @return {'policy', 'wallet', 'metadata-set-file', 'prices', 'max-per-tx'}
+    """
+
+    metametadata = get_metametadata(cardano, drop_name)
+    policy_name = metametadata['policy']
+
+    # Set the policy name
+    logger.info('Policy: {}'.format(policy_name))
+    if cardano.get_policy_id(policy_name) == None:
+        logger.error('Policy: {}, does not exist'.format(policy_name))
+        raise Exception('Policy: {}, does not exist'.format(policy_name))
+
+    # Initialize the wallet
+    wallet_name = cardano.get_policy_owner(policy_name)
+    mint_wallet = Wallet(wallet_name, cardano.get_network())
+    logger.info('Mint Wallet: {}'.format(wallet_name))
+    if not mint_wallet.exists():
+        logger.error('Wallet: {}, does not exist'.format(wallet_name))
+        raise Exception('Wallet: {}, does not exist'.format(wallet_name))
+
+    metadata_set_file = get_series_metadata_set_file(cardano, policy_name, drop_name)
+    logger.info('Metadata Set File: {}'.format(metadata_set_file))
+
+    # verify the metadata for each NFT and uploaded to IPFS.  These are the
+    # files the mint reads, not the packed drop archive
+    metadatalist = MetadataList(metadata_set_file)
+    metadata_files = []
+    while metadatalist.get_remaining() > 0:
+        metadata_files.append(metadatalist.peek_next_file())
+    metadatalist.revert()
+
+    verifier = MintVerifier(tcr.mint_verify.get_manifest_file(cardano.get_network(), drop_name),
+                            cardano.get_policy_id(policy_name),
+                            workers=workers)
+    failures = verifier.verify(metadata_files)
+    if len(failures) > 0:
+        for (metadata_file, verdict) in failures:
+            logger.error('{}: {}'.format(metadata_file, verdict))
+        raise Exception(failures[0][1])
+
+    # Set prices for the drop from metametadata file.  JSON stores keys as strings
+    # so convert the keys to integers
+    prices = {}
+    for price in metametadata['prices']:
+        prices[int(price)] = metametadata['prices'][price]
+    logger.info('prices: {}'.format(prices))
+
+    max_per_tx = metametadata['max_per_tx']
+
+    return {'policy': policy_name,
+            'wallet': mint_wallet,
+            'metadata-set-file': metadata_set_file,
+            'prices': prices,
+            'max-per-tx': max_per_tx}
+
 def create_series_metadata_set_file(cardano: Cardano,
                                     policy_name: str,
                                     drop_name: str,
                                     rng: numpy.random.RandomState,
-                                    test_combos: bool) -> str:
+                                    test_combos: bool,
+                                    workers: int = None,
+                                    contact_sheet: bool = False) -> str:
     metadata_set_file = 'nft/{}/{}/{}.json'.format(cardano.get_network(), drop_name, drop_name)
 
     if os.path.isfile(metadata_set_file):
@@ -115,7 +180,9 @@ def create_series_metadata_set_file(cardano: Cardano,
                                            series_metametadata,
                                            codewords,
                                            rng,
-                                           test_combos)
+                                           test_combos,
+                                           workers,
+                                           contact_sheet)
     series_metametadata = set_metametadata(cardano, series_metametadata)
     metadata_set = {'files': files}
     with open(metadata_set_file, 'w') as file:
@@ -191,6 +258,26 @@ def main():
                                          action='store_true',
                                          default=False,
                                          help='Generate all combinations of two layers for --create-drop')
+    parser.add_argument('--workers',     required=False,
+                                         action='store',
+                                         metavar='COUNT',
+                                         type=int,
+                                         default=None,
+                                         help='Worker processes for --test-combos and --mint verification, default = number of CPUs')
+    parser.add_argument('--contact-sheet', required=False,
+                                           action='store_true',
+                                           default=False,
+                                           help='Also save a downscaled contact sheet for --test-combos')
+    parser.add_argument('--keep-merged', required=False,
+                                         action='store_true',
+                                         default=False,
+                                         help='Record the merged metadata of each --mint transaction in merged_metadata.jsonl')
+    parser.add_argument('--shards', required=False,
+                                    action='store',
+                                    metavar='COUNT',
+                                    type=int,
+                                    default=1,
+                                    help='Deposit addresses for --mint general sale payments, each minted by its own process')
     parser.add_argument('--token',  required=False,
                                     action='store',
                                     metavar='NAME',
@@ -212,7 +299,11 @@ def main():
     rng_seed = args.seed
     confirm = args.confirm
     test_combos = args.test_combos
+    workers = args.workers
+    contact_sheet = args.contact_sheet
     whitelist = args.whitelist
+    keep_merged = args.keep_merged
+    shards = args.shards
 
     setup_logging(network, 'nftmint')
     logger = logging.getLogger(network)
@@ -223,7 +314,7 @@ def main():
 
     # Setup connection to cardano node, cardano wallet, and cardano db sync
     cardano = Cardano(network, '{}_protocol_parameters.json'.format(network))
-    database = Database('{}.ini'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
 
     logger.info('{} Payment Processor / NFT Minter'.format(network.upper()))
     logger.info('Copyright 2021 Kristofer Henderson & thecardroom.io')
@@ -320,7 +411,7 @@ def main():
         logger.info('Create RNG with SEED: {}'.format(rng_seed))
 
         rng = numpy.random.default_rng(rng_seed)
-        metadata_set_file = create_series_metadata_set_file(cardano, policy_name, create_drop, rng, test_combos)
+        metadata_set_file = create_series_metadata_set_file(cardano, policy_name, create_drop, rng, test_combos, workers, contact_sheet)
         logger.info('Successfully created new drop: {} '.format(metadata_set_file))
     elif create_drop_template != None:
         #
@@ -344,53 +435,17 @@ def main():
             logger.error('--mint, Wallet and policy derived from metadata')
             raise Exception('--mint, Wallet and policy derived from metadata')
 
-        metametadata = get_metametadata(cardano, drop_name)
-        policy_name = metametadata['policy']
-
-        # Set the policy name
-        logger.info('Policy: {}'.format(policy_name))
-        if cardano.get_policy_id(policy_name) == None:
-            logger.error('Policy: {}, does not exist'.format(policy_name))
-            raise Exception('Policy: {}, does not exist'.format(policy_name))
-
-        # Initialize the wallet
-        wallet_name = cardano.get_policy_owner(policy_name)
-        mint_wallet = Wallet(wallet_name, cardano.get_network())
-        logger.info('Mint Wallet: {}'.format(wallet_name))
-        if not mint_wallet.exists():
-            logger.error('Wallet: {}, does not exist'.format(wallet_name))
-            raise Exception('Wallet: {}, does not exist'.format(wallet_name))
+        drop = prepare_drop(cardano, drop_name, workers)
+        policy_name = drop['policy']
+        mint_wallet = drop['wallet']
+        metadata_set_file = drop['metadata-set-file']
+        prices = drop['prices']
+        max_per_tx = drop['max-per-tx']
 
-        metadata_set_file = get_series_metadata_set_file(cardano, policy_name, drop_name)
-        logger.info('Metadata Set File: {}'.format(metadata_set_file))
-
-        # verify the metadata for each NFT and uploaded to IPFS
-        metadatalist = MetadataList(metadata_set_file)
-        while metadatalist.get_remaining() > 0:
-            nftmd = Nft.parse_metadata_file(metadatalist.peek_next_file())
-            if len(nftmd['token-names']) != 1:
-                logger.error('There should only be one token name')
-                raise Exception('There should only be one token name')
-
-            if nftmd['policy-id'] != cardano.get_policy_id(policy_name):
-                logger.error('Policy ID mismatch')
-                raise Exception('Policy ID mismatch')
-
-            token = nftmd['token-names'][0]
-            if not nftmd['properties'][token]['image'].startswith('ipfs://'):
-                logger.error('Image not uploaded to IPFS')
-                raise Exception('Image not uploaded to IPFS')
-        metadatalist.revert()
-
-        # Set prices for the drop from metametadata file.  JSON stores keys as strings
-        # so convert the keys to integers
-        metametadata = get_metametadata(cardano, drop_name)
-        prices = {}
-        for price in metametadata['prices']:
-            prices[int(price)] = metametadata['prices'][price]
-        logger.info('prices: {}'.format(prices))
-
-        max_per_tx = metametadata['max_per_tx']
+        merged_archive = None
+        if keep_merged:
+            merged_archive = 'nft/{}/{}/merged_metadata.jsonl'.format(network, drop_name)
+            logger.info('Merged metadata archive: {}'.format(merged_archive))
 
         if whitelist != None:
             logger.info('Process Presale Whitelist Payments: {}'.format(whitelist))
@@ -407,7 +462,8 @@ def main():
                                       drop_name,
                                       metadata_set_file,
                                       wl_payments,
-                                      max_per_tx)
+                                      max_per_tx,
+                                      merged_archive)
             logger.info('Process Whitelist Complete')
         else:
             logger.info('Whitelist Not Given')
@@ -416,14 +472,26 @@ def main():
             logger.info('Process General Sale Payments:')
             # Listen for incoming payments and mint NFTs when a UTXO matching a payment
             # value is found
-            tcr.tcr.process_incoming_payments(cardano,
-                                              database,
-                                              mint_wallet,
-                                              policy_name,
-                                              drop_name,
-                                              metadata_set_file,
-                                              prices,
-                                              max_per_tx)
+            if shards > 1:
+                tcr.mint_shards.process_incoming_payments(cardano,
+                                                          mint_wallet,
+                                                          policy_name,
+                                                          drop_name,
+                                                          metadata_set_file,
+                                                          prices,
+                                                          max_per_tx,
+                                                          merged_archive,
+                                                          shards)
+            else:
+                tcr.tcr.process_incoming_payments(cardano,
+                                                  database,
+                                                  mint_wallet,
+                                                  policy_name,
+                                                  drop_name,
+                                                  metadata_set_file,
+                                                  prices,
+                                                  max_per_tx,
+                                                  merged_archive)
         except Exception as e:
             logger.exception("Caught Exception")
     elif burn == True:
@@ -506,7 +574,7 @@ def main():
         logger.info('\t$ nftmint --network=<testnet | mainnet> --create-policy=<name> --wallet=<name>')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --create-drop=<name> --policy=<name> --seed=<value>')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --create-drop-template=<name>')
-        logger.info('\t$ nftmint --network=<testnet | mainnet> --mint --drop=<name>')
+        logger.info('\t$ nftmint --network=<testnet | mainnet> --mint --drop=<name> [--shards=<count>]')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --presale --drop=<name> --whitelist=<file>')
         logger.info('\t$ nftmint --network=<testnet | mainnet> --burn --wallet=<name> --policy=<name> [--confirm | --token=<name>]')
 
@@ -0,0 +1,169 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: ownership.py
+Author: Kris Henderson
+
+Local copy of who holds the tokens of a set of policies.
+
+The first time a policy is added every unspent output holding its tokens is
+copied from db-sync.  After that only blocks past the stored block id
+watermark are read, adding the new outputs and removing the spent ones, so
+a holder query is a read of the local SQLite file.  Blocks newer than the
+confirmation margin aren't applied so a rollback doesn't have to be undone.
+"""
+
+from typing import Dict, List
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger('ownership')
+
+class OwnershipStore:
+    SCHEMA = ['create table if not exists meta (key text primary key, value integer)',
+              'create table if not exists policies (policy_id text primary key)',
+              'create table if not exists outputs (tx_hash text, tx_ix integer, policy_id text, name text, quantity integer, '
+              '                                    address text, slot integer, block_id integer, '
+              '                                    primary key (tx_hash, tx_ix, policy_id, name))',
+              'create index if not exists outputs_policy on outputs (policy_id, name)']
+
+    def __init__(self, store_file: str, database, confirmations: int = 10):
+        """
+        @param database Database, or anything with the same query_latest_block_id,
+                        query_policy_outputs and query_policy_spends
+        @param confirmations Blocks behind the tip that are considered final
+        """
+
+        self.store_file = store_file
+        self.database = database
+        self.confirmations = confirmations
+        self.connection = sqlite3.connect(store_file)
+        for sql in OwnershipStore.SCHEMA:
+            self.connection.execute(sql)
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def get_watermark(self) -> int:
+        row = self.connection.execute('select value from meta where key = ?', ('block-id',)).fetchone()
+        return row[0] if row != None else None
+
+    def get_policies(self) -> List[str]:
+        return [row[0] for row in self.connection.execute('select policy_id from policies order by policy_id')]
+
+    def get_confirmed_block_id(self) -> int:
+        return self.database.query_latest_block_id() - self.confirmations
+
+    def insert_outputs(self, outputs: List[Dict]) -> None:
+        self.connection.executemany('insert or replace into outputs values (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    [(o['tx-hash'], o['tx-ix'], o['policy-id'], o['name'], o['quantity'],
+                                      o['address'], o['slot'], o['block-id']) for o in outputs])
+
+    def add_policy(self, policy_id: str) -> None:
+        """
+        Start tracking a policy.  Its unspent outputs are copied as of the
+        current watermark.
+        """
+
+        if policy_id in self.get_policies():
+            return
+
+        start = time.time()
+        watermark = self.get_watermark()
+        if watermark == None:
+            watermark = self.get_confirmed_block_id()
+
+        outputs = self.database.query_policy_outputs([policy_id], 0, watermark, unspent=True)
+        with self.connection:
+            self.insert_outputs(outputs)
+            self.connection.execute('insert into policies values (?)', (policy_id,))
+            self.connection.execute('insert or replace into meta values (?, ?)', ('block-id', watermark))
+
+        logger.info('Ownership, bootstrap {}: {} outputs at block {}, {:.2f}s'.format(policy_id, len(outputs), watermark, time.time() - start))
+
+    def update(self) -> int:
+        """
+        Apply the blocks past the watermark that have enough confirmations.
+
+        @return The number of blocks applied
+        """
+
+        policies = self.get_policies()
+        watermark = self.get_watermark()
+        if len(policies) == 0 or watermark == None:
+            return 0
+
+        to_block_id = self.get_confirmed_block_id()
+        if to_block_id <= watermark:
+            return 0
+
+        start = time.time()
+        outputs = self.database.query_policy_outputs(policies, watermark, to_block_id)
+        spends = self.database.query_policy_spends(policies, watermark, to_block_id)
+        with self.connection:
+            # outputs created and spent in the same range are inserted then deleted
+            self.insert_outputs(outputs)
+            self.connection.executemany('delete from outputs where tx_hash = ? and tx_ix = ?', spends)
+            self.connection.execute('insert or replace into meta values (?, ?)', ('block-id', to_block_id))
+
+        logger.info('Ownership, blocks {} to {}: {} new outputs, {} spent, {:.2f}s'.format(watermark + 1,
+                                                                                          to_block_id,
+                                                                                          len(outputs),
+                                                                                          len(spends),
+                                                                                          time.time() - start))
+        return to_block_id - watermark
+
+    def get_owners(self, policy_id: str) -> Dict:
+        """
+        Same as Database.query_current_owner from the local store.
+
+        @return {token name: {'address': stake address, 'slot': slot}}
+        """
+
+        sql = ('select name, address, slot from outputs where policy_id = ? and quantity > 0 '
+               'order by name, slot, block_id, tx_hash')
+        tokens = {}
+        for (name, address, slot) in self.connection.execute(sql, (policy_id,)):
+            # ordered by slot so the latest output wins
+            tokens[name] = {'address': address, 'slot': slot}
+
+        return tokens
+
+def get_store_file(network: str) -> str:
+    return '{}_ownership.db'.format(network)
+
+def query_current_owner(network: str, database, policy_id: str) -> Dict:
+    """
+    Token owners of a policy from the local store for the network, adding the
+    policy to the store the first time.
+    """
+
+    store = OwnershipStore(get_store_file(network), database)
+    try:
+        store.add_policy(policy_id)
+        store.update()
+        return store.get_owners(policy_id)
+    finally:
+        store.close()
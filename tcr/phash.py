@@ -0,0 +1,125 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: phash.py
+Author: Kris Henderson
+
+Perceptual image hashes and a BK-tree index to find near duplicate images by
+Hamming distance.
+"""
+
+from typing import Any, List, Tuple
+
+def dhash(image, hash_size: int = 16) -> int:
+    """
+    Calculate the difference hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit is set when a pixel is brighter than its right neighbor.
+    Images that look the same produce the same or a very close hash even when
+    the encoded files differ.
+
+    @param image A PIL image.
+    @param hash_size Width and height of the hash grid.  The hash has
+                     hash_size * hash_size bits.
+
+    @return The hash as an integer
+    """
+
+    width = hash_size + 1
+    pixels = list(image.convert('L').resize((width, hash_size)).getdata())
+
+    value = 0
+    for row in range(0, hash_size):
+        for col in range(0, hash_size):
+            left = pixels[row * width + col]
+            right = pixels[row * width + col + 1]
+            value = (value << 1) | (1 if left > right else 0)
+
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    """
+    Number of bits that are different between two hashes.
+    """
+
+    return bin(a ^ b).count('1')
+
+class BKTree:
+    """
+    Burkhard-Keller tree of hashes using the Hamming distance as the metric.
+
+    Searching for every hash within a small distance of a query only visits
+    the subtrees that can contain a match, so lookups stay fast as the number
+    of hashes grows into the tens of thousands.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, value: int, item: Any) -> None:
+        """
+        Add a hash and the item it belongs to, e.g. the image file name.
+        """
+
+        self.count += 1
+        if self.root == None:
+            self.root = (value, item, {})
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if not distance in node[2]:
+                node[2][distance] = (value, item, {})
+                return
+            node = node[2][distance]
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, Any]]:
+        """
+        Find all items whose hash is within max_distance of value.
+
+        @return List of (distance, item) sorted by distance
+        """
+
+        matches = []
+        if self.root == None:
+            return matches
+
+        nodes = [self.root]
+        while len(nodes) > 0:
+            node = nodes.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.append((distance, node[1]))
+
+            for child_distance in node[2]:
+                if abs(child_distance - distance) <= max_distance:
+                    nodes.append(node[2][child_distance])
+
+        matches.sort(key=lambda match: match[0])
+        return matches
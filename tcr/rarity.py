@@ -21,9 +21,198 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import os
+"""
+File: rarity.py
+Author: Kris Henderson
+
+Trait and trait combination frequencies and token rarity scores of a drop.
+
+Each trait is stored as a column of integer category codes, one row per
+token, so counting a trait or a combination of traits is a numpy.unique or
+numpy.bincount over the columns instead of a loop over the tokens.
+"""
+
+from typing import Dict, List, Tuple
 import argparse
+import concurrent.futures
+import itertools
 import json
+import os
+import traceback
+
+import numpy
+
+from tcr.drop_archive import load_documents
+
+# Properties that are unique to each token or the same for every token
+SKIP_TRAITS = ['name', 'image', 'publisher', 'description', 'artist', 'id', 'mediaType', 'files']
+
+# Properties that must be different for every token
+UNIQUE_TRAITS = ['name', 'image', 'id']
+
+MISSING = '<none>'
+
+def get_token(md: Dict) -> Dict:
+    erc721 = md['721']
+    policy = erc721[list(erc721.keys())[0]]
+    return policy[list(policy.keys())[0]]
+
+def _load_file(filename: str) -> Tuple[str, Dict]:
+    """
+    Process pool worker, the token properties of one metadata file.
+    """
+
+    with open(filename, 'r') as file:
+        return (filename, get_token(json.load(file)))
+
+def load_tokens(source: str, workers: int = None) -> List[Tuple[str, Dict]]:
+    """
+    Token properties of each metadata file in a directory, parsed in a process
+    pool, or in a drop archive.
+
+    @return [(file name, token properties)] sorted by file name
+    """
+
+    if os.path.isfile(source):
+        return [(name, get_token(md)) for (name, md) in load_documents(source)]
+
+    filenames = sorted([os.path.join(source, f) for f in os.listdir(source) if f.endswith('.json')])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_load_file, filenames, chunksize=256))
+
+def to_value(value) -> str:
+    """
+    Category of a property.  A list, e.g. multiple tags, is one category of
+    all of its values.
+    """
+
+    if value == None:
+        return MISSING
+    if type(value) is list:
+        return '+'.join([str(v) for v in value])
+    return str(value)
+
+class TraitTable:
+    def __init__(self, tokens: List[Tuple[str, Dict]], skip: List[str] = SKIP_TRAITS):
+        """
+        @param tokens [(token file name, token properties)], @see load_tokens
+        @param skip Properties that aren't traits
+        """
+
+        self.names = [name for (name, token) in tokens]
+        self.traits = []
+        self.lists = {}
+        for (name, token) in tokens:
+            for key in token:
+                if not key in skip and not key in self.traits:
+                    self.traits.append(key)
+                if type(token[key]) is list:
+                    self.lists.setdefault(key, []).extend([str(v) for v in token[key]])
+
+        # categories[trait] = sorted values, codes[:, i] = index into categories[traits[i]]
+        self.categories = {}
+        self.codes = numpy.zeros((len(tokens), len(self.traits)), dtype=numpy.int32)
+        for i in range(0, len(self.traits)):
+            trait = self.traits[i]
+            column = numpy.array([to_value(token.get(trait)) for (name, token) in tokens])
+            (self.categories[trait], self.codes[:, i]) = numpy.unique(column, return_inverse=True)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def is_list(self, trait: str) -> bool:
+        return trait in self.lists
+
+    def list_counts(self, trait: str) -> Tuple[List[str], numpy.ndarray]:
+        """
+        Frequency of each value of a trait that is a list, e.g. tags, counting
+        every value in each list.
+        """
+
+        (labels, counts) = numpy.unique(numpy.array(self.lists[trait]), return_counts=True)
+        return (labels.tolist(), counts)
+
+    def get_column(self, trait: str) -> numpy.ndarray:
+        return self.codes[:, self.traits.index(trait)]
+
+    def counts(self, traits: Tuple[str, ...]) -> Tuple[List[str], numpy.ndarray, numpy.ndarray]:
+        """
+        Frequency of each combination of the values of traits that occurs.
+
+        @return (combination labels, count of each combination, index of the
+                 combination of each token)
+        """
+
+        # mixed radix key of the codes of each trait
+        keys = numpy.zeros(len(self.names), dtype=numpy.int64)
+        for trait in traits:
+            keys = keys * len(self.categories[trait]) + self.get_column(trait)
+
+        (unique_keys, inverse, counts) = numpy.unique(keys, return_inverse=True, return_counts=True)
+
+        # decode the keys back to the value of each trait
+        codes = []
+        for trait in reversed(traits):
+            (unique_keys, code) = numpy.divmod(unique_keys, len(self.categories[trait]))
+            codes.insert(0, code)
+
+        labels = self.categories[traits[0]][codes[0]]
+        for i in range(1, len(traits)):
+            labels = numpy.char.add(numpy.char.add(labels, '+'), self.categories[traits[i]][codes[i]])
+
+        labels = labels.tolist()
+        return (labels, counts, inverse.reshape(-1))
+
+    def scores(self, traits: List[str] = None) -> Dict[str, numpy.ndarray]:
+        """
+        Rarity scores of every token.
+
+        'statistical': product of the frequency of each trait value, lower is rarer
+        'rarity':      sum of 1 / frequency of each trait value, higher is rarer
+        'normalized':  same as rarity with each trait divided by its number of
+                       values so traits with many values don't dominate
+        """
+
+        if traits == None:
+            traits = self.traits
+
+        total = len(self.names)
+        statistical = numpy.ones(total)
+        rarity = numpy.zeros(total)
+        normalized = numpy.zeros(total)
+        for trait in traits:
+            column = self.get_column(trait)
+            frequency = numpy.bincount(column, minlength=len(self.categories[trait])) / total
+            statistical *= frequency[column]
+            rarity += 1 / frequency[column]
+            normalized += 1 / (frequency[column] * len(self.categories[trait]))
+
+        return {'statistical': statistical, 'rarity': rarity, 'normalized': normalized}
+
+def parse_combos(combos: List[str], traits: List[str]) -> List[Tuple[str, ...]]:
+    """
+    @param combos Each is either trait names joined by '+' or a number N for
+                  every combination of N traits
+    """
+
+    result = []
+    for combo in combos:
+        if combo.isdigit():
+            result.extend(itertools.combinations(traits, int(combo)))
+        else:
+            result.append(tuple(combo.split('+')))
+
+    return result
+
+def print_counts(title: str, labels: List[str], counts: numpy.ndarray, total: int) -> None:
+    print('{}'.format(title))
+    order = numpy.argsort(-counts, kind='stable')
+    i = 1
+    for index in order:
+        print('\t{}. {:30} = {:5}/{} = {}%'.format(i, labels[index], counts[index], total, (counts[index]*100)/total))
+        i += 1
+
+    print('')
 
 def main():
     parser = argparse.ArgumentParser(add_help=False)
@@ -31,78 +220,62 @@ def main():
                                     action='store',
                                     type=str,
                                     metavar='NAME',
-                                    help='')
+                                    help='Directory of metadata files or a drop archive (.tcrdrop)')
+    parser.add_argument('--combos', required=False,
+                                    action='store',
+                                    nargs='*',
+                                    default=[],
+                                    metavar='TRAITS',
+                                    help='Trait combinations to count, e.g. saliva+teeth+scene, or N for all N trait combinations')
+    parser.add_argument('--top', required=False,
+                                    action='store',
+                                    type=int,
+                                    default=0,
+                                    metavar='COUNT',
+                                    help='Print the COUNT rarest tokens')
+    parser.add_argument('--workers', required=False,
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    metavar='COUNT',
+                                    help='Processes parsing metadata files, default = number of CPUs')
     args = parser.parse_args()
     directory = args.directory
+    combos = args.combos
+    top = args.top
+    workers = args.workers
+
+    tokens = load_tokens(directory, workers)
+    table = TraitTable(tokens)
+    total = len(table)
+
+    for trait in UNIQUE_TRAITS:
+        (values, counts) = numpy.unique(numpy.array([to_value(token.get(trait)) for (name, token) in tokens]), return_counts=True)
+        for index in numpy.nonzero(counts != 1)[0]:
+            print("ERROR, invalid {} count: {}".format(trait, counts[index]))
+
+    for trait in table.traits:
+        if table.is_list(trait):
+            (labels, counts) = table.list_counts(trait)
+        else:
+            (labels, counts, inverse) = table.counts((trait,))
+        print_counts(trait, labels, counts, total)
 
-    properties = {}
-
-    filenames= os.listdir(directory)
-    filenames.sort()
-    for filename in filenames:
-        f = os.path.join(directory, filename)
-        if os.path.isfile(f) and f.endswith('.json'):
-            with open(f, 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
-
-                # TODO, search feature would be nice
-                #character = 'x'
-                #mutation = 'x'
-                #if token['character'] == character and token['mutation'] == mutation:
-                #    print('{} {}: {}'.format(character, mutation, filename))
-
-                token['saliva+teeth'] = token['saliva'] + '+' + token['teeth']
-                token['saliva+scene'] = token['saliva'] + '+' + token['scene']
-                token['teeth+scene'] = token['teeth'] + '+' + token['scene']
-                token['saliva+teeth+scene'] = token['saliva'] + '+' + token['teeth'] + '+' + token['scene']
-                token['flavor+potency'] = token['flavor'] + '+' + token['potency']
-
-                for key in token:
-                    if not key in properties:
-                        properties[key] = {}
-
-                    value = token[key]
-                    if type(value) is list:
-                        for subvalue in value:
-                            if not subvalue in properties[key]:
-                                properties[key][subvalue] = 1
-                            else:
-                                properties[key][subvalue] += 1
-                    else:
-                        if not value in properties[key]:
-                            properties[key][value] = 1
-                        else:
-                            properties[key][value] += 1
-
-    for name in properties['name']:
-        if properties['name'][name] != 1:
-            print("ERROR, invalid name count: {}".format(properties['name'][name]))
-
-    for image in properties['image']:
-        if properties['image'][image] != 1:
-            print("ERROR, invalid image count: {}".format(properties['image'][image]))
-
-    for id in properties['id']:
-        if properties['id'][id] != 1:
-            print("ERROR, invalid id count: {}".format(properties['id'][id]))
-
-    total = len(properties['name'])
-
-    for key in properties:
-        if key == 'name' or key == 'image' or key == 'publisher' or key == 'description' or key == 'artist' or key == 'id':
-            continue
-
-        values = list(properties[key].keys())
-        values.sort(reverse=True, key=lambda item: properties[key][item])
-        print('{}'.format(key))
-        i = 1
-        for value in values:
-            print('\t{}. {:30} = {:5}/{} = {}%'.format(i, value, properties[key][value], total, (properties[key][value]*100)/total))
-            i += 1
+    for combo in parse_combos(combos, table.traits):
+        (labels, counts, inverse) = table.counts(combo)
+        print_counts('+'.join(combo), labels, counts, total)
 
+    if top > 0:
+        scores = table.scores()
+        order = numpy.argsort(-scores['normalized'], kind='stable')
+        print('Rarest')
+        for rank in range(0, min(top, total)):
+            i = order[rank]
+            print('\t{}. {:40} normalized = {:10.2f}, rarity = {:10.2f}, statistical = {:.3e}'.format(rank + 1,
+                                                                                                   os.path.basename(table.names[i]),
+                                                                                                   scores['normalized'][i],
+                                                                                                   scores['rarity'][i],
+                                                                                                   scores['statistical'][i]))
         print('')
 
 
@@ -112,4 +285,4 @@ if __name__ == '__main__':
     except Exception as e:
         print("Caught Exception!")
         print(e)
-        print(e.format_exc())
+        traceback.print_exc()
@@ -23,11 +23,12 @@
 
 from typing import List, Set, Dict
 from tcr.wallet import Wallet
-from tcr.wallet import WalletExternal
 from tcr.cardano import Cardano
 from tcr.nft import Nft
 import tcr.tcr
 from tcr.database import Database
+from tcr.chain_cache import ChainCache, get_cache_file
+from tcr.sales import Sales
 import json
 import os
 import logging
@@ -55,14 +56,23 @@ def main():
     parser.add_argument('--utxo', required=True,
                                   action='store',
                                   type=str,
+                                  nargs='+',
                                   metavar='UTXO',
                                   default=None,
-                                  help='UTXO to refund')
+                                  help='UTXOs to refund as hash or hash#ix, all in one transaction when possible')
+
+    parser.add_argument('--drop', required=False,
+                                  action='store',
+                                  type=str,
+                                  metavar='NAME',
+                                  default=None,
+                                  help='Record the refunds in the sales of this drop')
 
     args = parser.parse_args()
     network = args.network
     src_name = args.src
-    utxo_string = args.utxo
+    utxo_strings = args.utxo
+    drop_name = args.drop
 
     if not network in tcr.command.networks:
         raise Exception('Invalid Network: {}'.format(network))
@@ -80,7 +90,7 @@ def main():
     cardano.query_protocol_parameters()
     tip_slot = tip['slot']
 
-    database = Database('{}.ini'.format(network))
+    database = ChainCache(get_cache_file(network), Database('{}.ini'.format(network)))
     database.open()
     meta = database.query_chain_metadata()
     db_size = database.query_database_size()
@@ -100,34 +110,46 @@ def main():
 
     (utxos, lovelace) = cardano.query_utxos(src_wallet)
 
-    utxo_obj = None
-    for utxo in utxos:
-        if utxo['tx-hash'] == utxo_string:
-            utxo_obj = utxo
-            break
-
-    if utxo_obj == None:
-        logger.error("UTXO not found: {}".format(utxo_string))
-        raise Exception("UTXO not found: {}".format(utxo_string))
-
-    inputs = database.query_utxo_inputs(utxo_string)
-    if len(inputs) == 0:
-        logger.warning('Refund Payment, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
-        return
-
-    input_address = inputs[0]['address']
-    logger.info('Refunding: {} = {}'.format(utxo_obj['tx-hash'], utxo_obj['amount']))
-    logger.info('Destination: {}'.format(input_address))
-
-    # There can be different addresses in the inputs but they should be from the
-    # same wallet, Arbitrarily pick the first one.
-    destination = WalletExternal('customer',
-                                 cardano.get_network(),
-                                 input_address)
-
-    (tx_id, fee, amount) = tcr.tcr.transfer_utxo_ada(cardano, src_wallet, utxo_obj, destination)
-
-    logger.info('Refund TXID = {}, fee = {}, amount = {}'.format(tx_id, fee, amount))
+    # Payments to a minting shard are signed with the shard's key and recorded
+    # in the shard's sales
+    utxo_shards = {}
+    for shard in src_wallet.get_shards():
+        address_index = Wallet.get_shard_address_index(shard)
+        (shard_utxos, shard_lovelace) = cardano.query_utxos(src_wallet,
+                                                            [src_wallet.get_payment_address(address_index, delegated=True),
+                                                             src_wallet.get_payment_address(address_index, delegated=False)])
+        for utxo in shard_utxos:
+            utxo_shards[(utxo['tx-hash'], utxo['tx-ix'])] = shard
+
+    refund_utxos = []
+    for utxo_string in utxo_strings:
+        # hash or hash#ix
+        utxo_objs = [utxo for utxo in utxos if utxo_string in (utxo['tx-hash'], '{}#{}'.format(utxo['tx-hash'], utxo['tx-ix']))]
+        if len(utxo_objs) == 0:
+            logger.error("UTXO not found: {}".format(utxo_string))
+            raise Exception("UTXO not found: {}".format(utxo_string))
+
+        for utxo in utxo_objs:
+            logger.info('Refunding: {}#{} = {}'.format(utxo['tx-hash'], utxo['tx-ix'], utxo['amount']))
+        refund_utxos.extend(utxo_objs)
+
+    by_shard = {}
+    for utxo in refund_utxos:
+        by_shard.setdefault(utxo_shards.get((utxo['tx-hash'], utxo['tx-ix']), 0), []).append(utxo)
+
+    refunded = 0
+    for (shard, shard_utxos) in by_shard.items():
+        sales = None
+        if drop_name != None:
+            sales = Sales(network, drop_name, shard)
+
+        if shard != 0:
+            logger.info('Shard {}: Refunding {} UTXOs'.format(shard, len(shard_utxos)))
+        refunded += tcr.tcr.refund_payments(cardano, database, src_wallet, shard_utxos, sales,
+                                            address_index=Wallet.get_shard_address_index(shard))
+    database.close()
+
+    logger.info('Refunded {} of {} UTXOs'.format(refunded, len(refund_utxos)))
 
 if __name__ == '__main__':
     main()
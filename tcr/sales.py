@@ -35,8 +35,14 @@ class Sales:
     """
     Simple class to track each sale as JSON file
     """
-    def __init__(self, network: str, drop: str):
+    def __init__(self, network: str, drop: str, shard: int = 0):
+        """
+        @param shard Minting shard, each shard other than 0 keeps its own file
+        """
+
         self.filename = 'nft/{}/{}/sales.json'.format(network, drop)
+        if shard != 0:
+            self.filename = 'nft/{}/{}/sales_shard{}.json'.format(network, drop, shard)
         self.sales = {'transactions': []}
         try:
             with open(self.filename, 'r') as file:
@@ -21,59 +21,38 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import os
 import argparse
-import json
+import logging
+import traceback
+from tcr.trait_index import TraitIndex
 
 def main():
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('--directory', required=True,
                                        action='store',
+                                       nargs='+',
                                        type=str,
                                        metavar='NAME',
-                                       help='')
+                                       help='Directories of metadata files or drop archives (.tcrdrop)')
     parser.add_argument('--filter', required=True,
                                     action='store',
                                     type=str,
-                                    metavar='PATTERN',
-                                    help='')
+                                    metavar='QUERY',
+                                    help='e.g. \'color=red AND NOT (hat=cap OR hat="top hat")\', a comma is the same as AND')
     args = parser.parse_args()
-    directory = args.directory
+    directories = args.directory
     filter = args.filter
 
-    properties = {}
-    for pair in filter.split(','):
-        properties[pair.split('=')[0]] = pair.split('=')[1]
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
 
-    filenames= os.listdir(directory)
-    filenames.sort()
     count = 1
-    print('Search: {}'.format(properties))
-    for filename in filenames:
-        f = os.path.join(directory, filename)
-        if os.path.isfile(f) and f.endswith('.json'):
-            with open(f, 'r') as file:
-                md = json.load(file)
-                erc721 = md['721']
-                policy = erc721[list(erc721.keys())[0]]
-                token = policy[list(policy.keys())[0]]
-
-
-                match = True
-                for key in properties:
-
-                    if type(token[key]) is list:
-                        if properties[key] not in token[key]:
-                            match = False
-                            break
-                    else:
-                        if properties[key] != token[key]:
-                            match = False
-                            break
-
-                if match:
-                    print('\t{}. {}'.format(count, f))
-                    count += 1
+    print('Search: {}'.format(filter))
+    for directory in directories:
+        index = TraitIndex(directory)
+        index.update()
+        for f in index.search(filter):
+            print('\t{}. {}'.format(count, f))
+            count += 1
 
     print('')
 
@@ -84,4 +63,4 @@ if __name__ == '__main__':
     except Exception as e:
         print("Caught Exception!")
         print(e)
-        print(e.format_exc())
+        traceback.print_exc()
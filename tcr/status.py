@@ -29,6 +29,7 @@ import logging
 import argparse
 import tcr.command
 import tcr.nftmint
+import tcr.ownership
 import traceback
 
 def main():
@@ -50,10 +51,17 @@ def main():
                                     default=None,
                                     metavar='NAME',
                                     help='')
+    parser.add_argument('--slot',    required=False,
+                                    action='store',
+                                    type=int,
+                                    default=None,
+                                    metavar='SLOT',
+                                    help='Token owners as of this slot, default = latest')
     args = parser.parse_args()
     network = args.network
     wallet_name = args.wallet
     policy_name = args.policy
+    snapshot_slot = args.slot
 
     if not network in tcr.command.networks:
         raise Exception('Invalid Network: {}'.format(network))
@@ -110,7 +118,10 @@ def main():
                 logger.error('Policy: <{}> does not exist'.format(policy))
                 raise Exception('Policy: <{}> does not exist'.format(policy))
 
-            tokens = database.query_current_owner(cardano.get_policy_id(policy))
+            if snapshot_slot != None:
+                tokens = database.query_current_owner(cardano.get_policy_id(policy), snapshot_slot)
+            else:
+                tokens = tcr.ownership.query_current_owner(network, database, cardano.get_policy_id(policy))
             logger.info('{} = {} tokens'.format(policy, len(tokens)))
 
             keys = list(tokens.keys())
@@ -31,11 +31,12 @@ from typing import List
 from tcr.nft import Nft
 from tcr.cardano import Cardano
 from tcr.wallet import Wallet
-from tcr.wallet import WalletExternal
 from tcr.database import Database
 from tcr.metadata_list import MetadataList
+from tcr.mint_journal import MintJournal, get_journal_file
 
 import os
+import json
 import time
 import logging
 from tcr.sales import Sales
@@ -51,6 +52,18 @@ SECONDS_PER_DAY = int(HOURS_PER_DAY * SECONDS_PER_HOUR)
 SECONDS_PER_MONTH = int((DAYS_PER_YEAR / MONTHS_PER_YEAR) * SECONDS_PER_DAY)
 SECONDS_PER_YEAR = int(MONTHS_PER_YEAR * SECONDS_PER_MONTH)
 
+# Keeps a refund transaction well under the maximum transaction size
+MAX_REFUND_INPUTS = 60
+
+# Slots a mint transaction stays valid for, capped at the policy lock
+MINT_TTL_SLOTS = 30 * SECONDS_PER_MINUTE
+
+# Seconds to leave a submitted mint in the mempool before submitting it again
+MINT_RESUBMIT_DELAY = 5 * SECONDS_PER_MINUTE
+
+# Mints journaled before the TTL was recorded are given up on after this long
+MINT_LEGACY_TTL = SECONDS_PER_DAY
+
 logger = logging.getLogger('tcr')
 
 def transfer_all_assets(cardano: Cardano,
@@ -371,10 +384,9 @@ def burn_nft_internal(cardano: Cardano,
 def verify_unique_nfts(cardano: Cardano,
                        database: Database,
                        policy_name: str,
-                       nft_metadata_file: str) -> bool:
+                       nft_metadata: Dict) -> bool:
     # Make sure we're not about to mint multiple of the same token
     # Make sure the token we're about to mint hasn't already been minted
-    nft_metadata = Nft.parse_metadata_file(nft_metadata_file)
     policy_id = nft_metadata['policy-id']
 
     if policy_id != cardano.get_policy_id(policy_name):
@@ -400,19 +412,31 @@ def mint_nft_external(cardano: Cardano,
                       minting_wallet: Wallet,
                       policy_name: str,
                       input_utxos: List,
-                      nft_metadata_file: str,
-                      sales: Sales) -> bool:
+                      nft_metadata: Dict,
+                      sales: Sales,
+                      journal: MintJournal = None,
+                      journal_id: int = None,
+                      address_index: int = Wallet.ADDRESS_INDEX_MINT) -> bool:
     """
     Mint an NFT to a different wallet.
 
     input_utxos is a list of dictionaries.  Each object in the list looks like:
     {"utxo": Dict, "count": N}
-    "utxo" is minting "N" NFTs.  The sum must add up to the number in nft_metadata_file
+    "utxo" is minting "N" NFTs.  The sum must add up to the number in nft_metadata
     Each utxo is assumed to contain 0 other assets.
     The destination address will be queried for each input utxo
+
+    nft_metadata is the parsed metadata, @see Nft.merge_metadata.  It is only
+    written to a temporary file while cardano-cli builds the transaction.
+
+    If a journal is given the signed transaction is recorded under journal_id
+    before it is submitted.
+
+    address_index is the wallet address the payments were sent to, its key
+    signs the transaction along with the root, mint and presale keys.
     """
 
-    if not verify_unique_nfts(cardano, database, policy_name, nft_metadata_file):
+    if not verify_unique_nfts(cardano, database, policy_name, nft_metadata):
         logger.error("NFT Uniqueness Violation found.")
         raise Exception('NFT Uniqueness Violation')
 
@@ -446,71 +470,83 @@ def mint_nft_external(cardano: Cardano,
                                 'assets': {}
                             })
 
-    # draft
-    fee = 0
-    cardano.create_mint_nft_transaction_file(input_utxos,
-                                             address_outputs,
-                                             fee,
-                                             policy_name,
-                                             nft_metadata_file,
-                                             'transaction/mint_nft_external_draft_tx_{}'.format(os.getpid()))
-
-    # https://github.com/input-output-hk/cardano-ledger-specs/blob/master/doc/explanations/min-utxo.rst
-    cardano.calculate_min_required_utxo_mint(input_utxos,
-                                             address_outputs,
-                                             nft_metadata_file)
-
-    total_input_lovelace = 0
-    for item in input_utxos:
-        total_input_lovelace += item['utxo']['amount']
-
-    logger.debug("Mint NFT External, total payment received: {} ADA".format(total_input_lovelace / 1000000))
-
-    #fee
-    fee = cardano.calculate_min_fee('transaction/mint_nft_external_draft_tx_{}'.format(os.getpid()),
-                                    len(input_utxos),
-                                    len(address_outputs),
-                                    3)
-
-    # update output amounts
-    address_outputs[0]['amount'] = total_input_lovelace - fee # the project keeps
-
-    for i in range(0, len(input_utxos)):
-        # the first UTXO corresponds to the second address and so on
-        out_min_ada = address_outputs[i+1]['min-required-utxo']
-        out_min_ada = int(out_min_ada + input_utxos[i]['refund'])
-        address_outputs[0]['amount'] = address_outputs[0]['amount'] - out_min_ada # remove from the project
-        address_outputs[i+1]['amount'] = out_min_ada             # give to minter for tx min ADA requirement
-        sales.set_tx_ada(input_utxos[i]['utxo']['tx-hash'], input_utxos[i]['utxo']['tx-ix'], out_min_ada)
-
-    if len(address_outputs) == len(input_utxos) + 2:
-        address_outputs[-1]['amount'] = cardano.get_min_utxo_value()  # thank the dev
-        address_outputs[0]['amount'] -= address_outputs[-1]['amount'] # remove from the project
-
-    for output in address_outputs:
-        logger.debug('Mint NFT External, TX ADA Amount {} = {}'.format(output['address'], output['amount']))
-
-    # If our profit is less than the minimum required then just send everything back to the
-    # purchaser.  This represents a special case where we are allowing someone
-    # to mint our NFTs only for the network gas fee.  They will send 2.5 ADA and
-    # receive about 2.3 back.
-    if address_outputs[0]['amount'] < cardano.get_min_utxo_value():
-        logger.debug('Mint NFT External, adjust outputs')
-        address_outputs[1]['amount'] = address_outputs[1]['amount'] + address_outputs[0]['amount']
-        address_outputs[0]['amount'] = 0
-        sales.set_tx_ada(input_utxos[0]['utxo']['tx-hash'], input_utxos[0]['utxo']['tx-ix'], address_outputs[1]['amount'])
-        logger.debug('Mint NFT External, adjusted output[0] {} = {}'.format(address_outputs[0]['address'], address_outputs[0]['amount']))
-        logger.debug('Mint NFT External, adjusted output[1] {} = {}'.format(address_outputs[1]['address'], address_outputs[1]['amount']))
-
-    logger.debug('Mint NFT External, Fee = {} lovelace'.format(fee))
+    # A short TTL so a mint that can't land is given up on, @see reconcile_mint_journal
+    invalid_hereafter = cardano.get_mint_invalid_hereafter(policy_name, MINT_TTL_SLOTS)
+
+    nft_metadata_file = Nft.create_temp_metadata_file(nft_metadata)
+    try:
+        # draft
+        fee = 0
+        cardano.create_mint_nft_transaction_file(input_utxos,
+                                                 address_outputs,
+                                                 fee,
+                                                 policy_name,
+                                                 nft_metadata,
+                                                 nft_metadata_file,
+                                                 'transaction/mint_nft_external_draft_tx_{}'.format(os.getpid()),
+                                                 invalid_hereafter)
+
+        # https://github.com/input-output-hk/cardano-ledger-specs/blob/master/doc/explanations/min-utxo.rst
+        cardano.calculate_min_required_utxo_mint(input_utxos,
+                                                 address_outputs,
+                                                 nft_metadata)
+
+        total_input_lovelace = 0
+        for item in input_utxos:
+            total_input_lovelace += item['utxo']['amount']
+
+        logger.debug("Mint NFT External, total payment received: {} ADA".format(total_input_lovelace / 1000000))
+
+        #fee
+        fee = cardano.calculate_min_fee('transaction/mint_nft_external_draft_tx_{}'.format(os.getpid()),
+                                        len(input_utxos),
+                                        len(address_outputs),
+                                        3)
+
+        # update output amounts
+        address_outputs[0]['amount'] = total_input_lovelace - fee # the project keeps
+
+        for i in range(0, len(input_utxos)):
+            # the first UTXO corresponds to the second address and so on
+            out_min_ada = address_outputs[i+1]['min-required-utxo']
+            out_min_ada = int(out_min_ada + input_utxos[i]['refund'])
+            address_outputs[0]['amount'] = address_outputs[0]['amount'] - out_min_ada # remove from the project
+            address_outputs[i+1]['amount'] = out_min_ada             # give to minter for tx min ADA requirement
+            sales.set_tx_ada(input_utxos[i]['utxo']['tx-hash'], input_utxos[i]['utxo']['tx-ix'], out_min_ada)
+
+        if len(address_outputs) == len(input_utxos) + 2:
+            address_outputs[-1]['amount'] = cardano.get_min_utxo_value()  # thank the dev
+            address_outputs[0]['amount'] -= address_outputs[-1]['amount'] # remove from the project
+
+        for output in address_outputs:
+            logger.debug('Mint NFT External, TX ADA Amount {} = {}'.format(output['address'], output['amount']))
+
+        # If our profit is less than the minimum required then just send everything back to the
+        # purchaser.  This represents a special case where we are allowing someone
+        # to mint our NFTs only for the network gas fee.  They will send 2.5 ADA and
+        # receive about 2.3 back.
+        if address_outputs[0]['amount'] < cardano.get_min_utxo_value():
+            logger.debug('Mint NFT External, adjust outputs')
+            address_outputs[1]['amount'] = address_outputs[1]['amount'] + address_outputs[0]['amount']
+            address_outputs[0]['amount'] = 0
+            sales.set_tx_ada(input_utxos[0]['utxo']['tx-hash'], input_utxos[0]['utxo']['tx-ix'], address_outputs[1]['amount'])
+            logger.debug('Mint NFT External, adjusted output[0] {} = {}'.format(address_outputs[0]['address'], address_outputs[0]['amount']))
+            logger.debug('Mint NFT External, adjusted output[1] {} = {}'.format(address_outputs[1]['address'], address_outputs[1]['amount']))
+
+        logger.debug('Mint NFT External, Fee = {} lovelace'.format(fee))
+
+        #final
+        (output, mint_map) = cardano.create_mint_nft_transaction_file(input_utxos,
+                                                                      address_outputs,
+                                                                      fee,
+                                                                      policy_name,
+                                                                      nft_metadata,
+                                                                      nft_metadata_file,
+                                                                      'transaction/mint_nft_external_unsigned_tx_{}'.format(os.getpid()),
+                                                                      invalid_hereafter)
+    finally:
+        os.remove(nft_metadata_file)
 
-    #final
-    (output, mint_map) = cardano.create_mint_nft_transaction_file(input_utxos,
-                                                                  address_outputs,
-                                                                  fee,
-                                                                  policy_name,
-                                                                  nft_metadata_file,
-                                                                  'transaction/mint_nft_external_unsigned_tx_{}'.format(os.getpid()))
     for item in mint_map:
         hash = item.split('#')[0]
         ix = int(item.split('#')[1])
@@ -519,11 +555,23 @@ def mint_nft_external(cardano: Cardano,
     # TODO wallet root should be replaced with policy key after creating policy
     # key is updated
     #sign
+    signing_key_files = [minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_ROOT),
+                         minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_MINT),
+                         minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_PRESALE)]
+    if not address_index in [Wallet.ADDRESS_INDEX_ROOT, Wallet.ADDRESS_INDEX_MINT, Wallet.ADDRESS_INDEX_PRESALE]:
+        signing_key_files.append(minting_wallet.get_signing_key_file(address_index))
     cardano.sign_transaction('transaction/mint_nft_external_unsigned_tx_{}'.format(os.getpid()),
-                             [minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_ROOT),
-                              minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_MINT),
-                              minting_wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_PRESALE)],
+                             signing_key_files,
                              'transaction/mint_nft_external_signed_tx_{}'.format(os.getpid()))
+
+    if journal != None:
+        with open('transaction/mint_nft_external_signed_tx_{}'.format(os.getpid()), 'r') as file:
+            signed_tx = json.load(file)
+        journal.built(journal_id,
+                      cardano.get_transaction_id('transaction/mint_nft_external_signed_tx_{}'.format(os.getpid())),
+                      signed_tx,
+                      invalid_hereafter)
+
     #submit
     tx_id = cardano.submit_transaction('transaction/mint_nft_external_signed_tx_{}'.format(os.getpid()))
 
@@ -534,71 +582,364 @@ def batch_mint_next_nft_in_series(cardano: Cardano,
                                   minting_wallet: Wallet,
                                   policy_name: str,
                                   input_utxos: List,
-                                  nft_metadata_file: str,
-                                  sales: Sales) -> bool:
+                                  nft_metadata: Dict,
+                                  sales: Sales,
+                                  journal: MintJournal = None,
+                                  journal_id: int = None,
+                                  address_index: int = Wallet.ADDRESS_INDEX_MINT) -> bool:
     """
-    Mint the NFT defined in nft_metadata_file.
+    Mint the NFT defined in nft_metadata.
 
-    @param nft_metadata_file Could contain a single asset or multiple assets
+    @param nft_metadata The parsed metadata, @see Nft.merge_metadata.  Could
+                        contain a single asset or multiple assets
+    @param journal Optional mint journal, journal_id is the entry reserved
+                   for this mint, @see MintJournal.reserve
+    @param address_index Wallet address the payments were sent to
     """
 
-    logger.debug('Mint Next Series NFT, merged nft metadata: {}'.format(nft_metadata_file))
     for item in input_utxos:
         logger.debug('Mint Next Series NFT, {} / {}, {} NFTs, input: {}#{}'.format(minting_wallet.get_name(), policy_name, item['count'], item['utxo']['tx-hash'], item['utxo']['tx-ix']))
         sales.add_utxo(item['utxo']['tx-hash'], item['utxo']['tx-ix'], item['utxo']['amount'], item['count'])
 
-    nft_metadata = Nft.parse_metadata_file(nft_metadata_file)
-
     logger.info('Mint Next Series NFT, Mint NFTs: {}'.format(nft_metadata['token-names']))
     tx_id = mint_nft_external(cardano,
                               database,
                               minting_wallet,
                               policy_name,
                               input_utxos,
-                              nft_metadata_file,
-                              sales)
+                              nft_metadata,
+                              sales,
+                              journal,
+                              journal_id,
+                              address_index)
 
     if tx_id != None:
+        if journal != None:
+            journal.submitted(journal_id, tx_id)
+
         # Set the output txid to mark the transaction successful
         for item in input_utxos:
             sales.set_output_txid(item['utxo']['tx-hash'], item['utxo']['tx-ix'], tx_id)
     else:
+        if journal != None:
+            journal.failed(journal_id)
+
         # delete the utxo so the main payment processor will try again
         for item in input_utxos:
             sales.remove_utxo(item['utxo']['tx-hash'], item['utxo']['tx-ix'])
 
-    return True
+    return tx_id != None
+
+def apply_mint_journal_entry(entry: Dict, nft_metadata: MetadataList, sales: Sales) -> bool:
+    """
+    Make the metadata list and sales agree with a submitted mint.  Safe to
+    repeat, the minter normally does this right after submitting.
+
+    @return True if anything had to change
+    """
+
+    changed = nft_metadata.remove_files(entry['files']) > 0
+    for item in entry['inputs']:
+        if sales.add_utxo(item['tx-hash'], item['tx-ix'], item['amount'], item['count']):
+            changed = True
+        sales.set_output_txid(item['tx-hash'], item['tx-ix'], entry['txid'])
+
+    if changed:
+        logger.info('Mint journal {}, applied {} to metadata and sales'.format(entry['id'], entry['txid']))
+        sales.commit()
+
+    return changed
+
+def is_mint_expired(database: Database, entry: Dict) -> bool:
+    """
+    True once the transaction of a journal entry can't be added to the chain.
+    """
+
+    ttl = entry.get('ttl')
+    if ttl == None:
+        # journaled before the TTL was recorded
+        return time.time() - entry['time'] > MINT_LEGACY_TTL
+
+    return database.query_latest_slot() > ttl
+
+def reconcile_mint_journal(cardano: Cardano,
+                           database: Database,
+                           journal: MintJournal,
+                           nft_metadata: MetadataList,
+                           sales: Sales) -> None:
+    """
+    Resolve the unfinished mints in the journal against the chain.
+
+    A mint only reserved never reached cardano-cli and is failed.  A built or
+    submitted mint holds its payments and metadata files until its
+    transaction is found on chain.  While it isn't, the recorded signed
+    transaction is submitted again, a submitted one only after it has had
+    MINT_RESUBMIT_DELAY to get into a block.  Once db-sync is past the
+    transaction's TTL without it the mint is failed and its payments and files
+    released.  Mints are applied to the metadata list and sales when they are
+    submitted and confirmed once db-sync has the transaction.
+    """
+
+    for entry in journal.get_unresolved():
+        journal_id = entry['id']
+        if entry['state'] == MintJournal.RESERVE:
+            logger.info('Mint journal {}, never built, failed'.format(journal_id))
+            journal.failed(journal_id)
+            continue
+
+        # hold the payments and files until resolved so they aren't minted twice
+        if entry['state'] == MintJournal.BUILT:
+            for item in entry['inputs']:
+                sales.add_utxo(item['tx-hash'], item['tx-ix'], item['amount'], item['count'])
+            nft_metadata.remove_files(entry['files'])
+            sales.commit()
+        else:
+            apply_mint_journal_entry(entry, nft_metadata, sales)
+
+        (txtime, txslotno) = database.query_txhash_time(entry['txid'])
+        if txslotno == None and is_mint_expired(database, entry):
+            # The transaction can't be added to the chain any more, check once more
+            (txtime, txslotno) = database.query_txhash_time(entry['txid'])
+            if txslotno == None:
+                logger.warning('Mint journal {}, {} not on chain past TTL {}, failed'.format(journal_id, entry['txid'], entry.get('ttl')))
+                journal.failed(journal_id)
+                for item in entry['inputs']:
+                    sales.remove_utxo(item['tx-hash'], item['tx-ix'])
+                sales.commit()
+                nft_metadata.append_files(entry['files'])
+                continue
+        elif txslotno == None:
+            if entry['state'] == MintJournal.SUBMITTED and time.time() - entry['time'] < MINT_RESUBMIT_DELAY:
+                # most likely still waiting for a block
+                continue
+
+            logger.info('Mint journal {}, {} {}, submit again'.format(journal_id, entry['state'], entry['txid']))
+            signed_tx_file = 'transaction/mint_journal_signed_tx_{}'.format(os.getpid())
+            with open(signed_tx_file, 'w') as file:
+                file.write(json.dumps(entry['signed-tx']))
+
+            tx_id = None
+            try:
+                tx_id = cardano.submit_transaction(signed_tx_file)
+            except Exception as e:
+                # Rejected, it may already be on chain and db-sync is behind
+                logger.warning('Mint journal {}, {} not submitted: {}'.format(journal_id, entry['txid'], e))
+
+            if tx_id == None:
+                logger.warning('Mint journal {}, {} not on chain, left unresolved'.format(journal_id, entry['txid']))
+                continue
+
+            # recorded again so the next resubmit waits from now
+            journal.submitted(journal_id, entry['txid'])
+            entry = journal.get_entry(journal_id)
+            apply_mint_journal_entry(entry, nft_metadata, sales)
+            continue
+
+        if entry['state'] == MintJournal.BUILT:
+            journal.submitted(journal_id, entry['txid'])
+            entry = journal.get_entry(journal_id)
+            apply_mint_journal_entry(entry, nft_metadata, sales)
+
+        logger.info('Mint journal {}, {} confirmed at slot {}'.format(journal_id, entry['txid'], txslotno))
+        journal.confirmed(journal_id)
 
 def refund_payment(cardano: Cardano,
                    database: Database,
                    wallet: Wallet,
                    utxo: Dict,
-                   sales: Sales) -> None:
+                   sales: Sales) -> bool:
     logger.debug('Refund Payment, from: {} / UTXO: {}'.format(wallet.get_name(), utxo['tx-hash']))
-    logger.debug('Refund Payment, amount: {} lovelace'.format(wallet.get_name(), utxo['amount']))
-    sales.add_utxo(utxo['tx-hash'], utxo['tx-ix'], utxo['amount'], 0)
+    logger.debug('Refund Payment, amount: {} lovelace'.format(utxo['amount']))
 
-    inputs = database.query_utxo_inputs(utxo['tx-hash'])
-    if len(inputs) == 0:
-        logger.warning('Refund Payment, No UTXO Inputs - Waiting for DB SYNC.  Skip for now.')
-        sales.remove_utxo(utxo['tx-hash'], utxo['tx-ix'])
-        return False
+    return refund_payments(cardano, database, wallet, [utxo], sales) == 1
+
+def split_fee(fee: int, amounts: List[int]) -> List[int]:
+    """
+    Split a transaction fee across inputs in proportion to their amounts.  The
+    shares add up to fee exactly, any rounding goes to the largest amount.
+    """
+
+    total = sum(amounts)
+    shares = [fee * amount // total for amount in amounts]
+    largest = amounts.index(max(amounts))
+    shares[largest] += fee - sum(shares)
+
+    return shares
+
+def refund_payments(cardano: Cardano,
+                    database: Database,
+                    wallet: Wallet,
+                    utxos: List,
+                    sales: Sales = None,
+                    max_inputs: int = MAX_REFUND_INPUTS,
+                    address_index: int = Wallet.ADDRESS_INDEX_MINT) -> int:
+    """
+    Refund payments in as few transactions as possible.  Each transaction has
+    one output per sender, paying back all of the sender's UTXOs in it, and
+    each UTXO pays its share of the fee in proportion to its amount.
+
+    @param sales Optional sales record, each refunded UTXO is added with its
+                 fee share in the refund
+    @param max_inputs Most UTXOs spent by one transaction
+    @param address_index Wallet address the payments were sent to
+    @return The number of UTXOs refunded
+    """
+
+    utxos = [utxo for utxo in utxos if sales == None or not sales.contains(utxo['tx-hash'], utxo['tx-ix'])]
+    for utxo in [utxo for utxo in utxos if len(utxo['assets']) > 0]:
+        logger.warning('Refund Payments, UTXO {}#{} contains other assets.  Skipping.'.format(utxo['tx-hash'], utxo['tx-ix']))
+    utxos = [utxo for utxo in utxos if len(utxo['assets']) == 0]
+    if len(utxos) == 0:
+        return 0
+
+    senders = database.query_senders(list(set([utxo['tx-hash'] for utxo in utxos])))
 
     # There can be different addresses in the inputs but they should be from the
-    # same wallet, Arbitrarily pick the first one.
-    input_address = inputs[0]['address']
-    sales.set_input_address(utxo['tx-hash'], utxo['tx-ix'], input_address)
-    destination = WalletExternal('customer',
-                                 cardano.get_network(),
-                                 input_address)
-
-    (tx_id, fee, amount) = transfer_utxo_ada(cardano, wallet, utxo, destination)
-    sales.set_output_txid(utxo['tx-hash'], utxo['tx-ix'], tx_id)
-    sales.set_tx_ada(utxo['tx-hash'], utxo['tx-ix'], amount)
-    sales.set_refund(utxo['tx-hash'], utxo['tx-ix'], fee, amount)
+    # same wallet, the first one is used.
+    by_sender = {}
+    for utxo in utxos:
+        if not utxo['tx-hash'] in senders:
+            logger.warning('Refund Payments, No UTXO Inputs for {} - Waiting for DB SYNC.  Skip for now.'.format(utxo['tx-hash']))
+            continue
+
+        by_sender.setdefault(senders[utxo['tx-hash']]['address'], []).append(utxo)
+
+    # Fill each transaction with whole senders, up to max_inputs
+    batches = [[]]
+    for (address, sender_utxos) in by_sender.items():
+        for i in range(0, len(sender_utxos), max_inputs):
+            group = (address, sender_utxos[i:i + max_inputs])
+            if sum([len(g[1]) for g in batches[-1]]) + len(group[1]) > max_inputs:
+                batches.append([])
+            batches[-1].append(group)
+
+    refunded = 0
+    for batch in batches:
+        if len(batch) == 0:
+            continue
+
+        input_utxos = [utxo for (address, group) in batch for utxo in group]
+        logger.info('Refund Payments, {} UTXOs to {} senders'.format(len(input_utxos), len(batch)))
+        if sales != None:
+            for (address, group) in batch:
+                for utxo in group:
+                    sales.add_utxo(utxo['tx-hash'], utxo['tx-ix'], utxo['amount'], 0)
+                    sales.set_input_address(utxo['tx-hash'], utxo['tx-ix'], address)
+
+        # Draft transaction for fee calculation
+        outputs = [{'address': address, 'amount': 1, 'assets': {}} for (address, group) in batch]
+        cardano.create_transfer_transaction_file(input_utxos,
+                                                 outputs,
+                                                 0,
+                                                 'transaction/refund_payments_draft_tx_{}'.format(os.getpid()))
+        fee = cardano.calculate_min_fee('transaction/refund_payments_draft_tx_{}'.format(os.getpid()),
+                                        len(input_utxos),
+                                        len(outputs),
+                                        2)
+        logger.debug('Refund Payments, Fee = {} lovelace'.format(fee))
+
+        shares = split_fee(fee, [utxo['amount'] for utxo in input_utxos])
+        fee_shares = {}
+        for i in range(0, len(input_utxos)):
+            fee_shares[(input_utxos[i]['tx-hash'], input_utxos[i]['tx-ix'])] = shares[i]
+
+        for i in range(0, len(batch)):
+            outputs[i]['amount'] = sum([utxo['amount'] - fee_shares[(utxo['tx-hash'], utxo['tx-ix'])] for utxo in batch[i][1]])
+            logger.debug('Refund Payments, {} = {} lovelace'.format(outputs[i]['address'], outputs[i]['amount']))
+
+        # Final unsigned transaction
+        cardano.create_transfer_transaction_file(input_utxos,
+                                                 outputs,
+                                                 fee,
+                                                 'transaction/refund_payments_unsigned_tx_{}'.format(os.getpid()))
+
+        cardano.sign_transaction('transaction/refund_payments_unsigned_tx_{}'.format(os.getpid()),
+                                 [wallet.get_signing_key_file(Wallet.ADDRESS_INDEX_ROOT), wallet.get_signing_key_file(address_index)],
+                                 'transaction/refund_payments_signed_tx_{}'.format(os.getpid()))
+
+        tx_id = cardano.submit_transaction('transaction/refund_payments_signed_tx_{}'.format(os.getpid()))
+        logger.info('Refund Payments, TXID = {}, fee = {}'.format(tx_id, fee))
+
+        if sales != None:
+            for utxo in input_utxos:
+                if tx_id == None:
+                    # try again on the next pass
+                    sales.remove_utxo(utxo['tx-hash'], utxo['tx-ix'])
+                    continue
+
+                fee_share = fee_shares[(utxo['tx-hash'], utxo['tx-ix'])]
+                sales.set_output_txid(utxo['tx-hash'], utxo['tx-ix'], tx_id)
+                sales.set_tx_ada(utxo['tx-hash'], utxo['tx-ix'], utxo['amount'] - fee_share)
+                sales.set_refund(utxo['tx-hash'], utxo['tx-ix'], fee_share, utxo['amount'] - fee_share)
+            sales.commit()
+
+        if tx_id != None:
+            refunded += len(input_utxos)
+
+    return refunded
+
+def query_presale_utxos(cardano: Cardano, minting_wallet: Wallet) -> Dict:
+    """
+    Snapshot of the presale address UTXOs.
+
+    @return {(tx hash, tx index): utxo}
+    """
+
+    presale_address = minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)
+    (utxos, total_lovelace) = cardano.query_utxos(minting_wallet, [presale_address])
+    return {(utxo['tx-hash'], utxo['tx-ix']): utxo for utxo in utxos}
+
+def mint_whitelist_batch(cardano: Cardano,
+                         database: Database,
+                         minting_wallet: Wallet,
+                         policy_name: str,
+                         nft_metadata: MetadataList,
+                         input_utxos: List,
+                         sales: Sales,
+                         merged_archive: str = None,
+                         journal: MintJournal = None) -> bool:
+    """
+    Mint the NFTs for a batch of whitelist payments in one transaction.
+
+    @return True if the transaction was submitted
+    """
+
+    nfts_to_mint = sum([item['count'] for item in input_utxos])
+    logger.debug('Mint {} NFTs for {} queued UTXOs'.format(nfts_to_mint, len(input_utxos)))
+    nft_metadata_files = []
+    for i in range(0, nfts_to_mint):
+        mdfile = nft_metadata.peek_next_file()
+        nft_metadata_files.append(mdfile)
+        logger.debug('Merging NFT metadata: {}'.format(mdfile))
+
+    policy_id = cardano.get_policy_id(policy_name)
+    merged_metadata = Nft.merge_metadata(policy_id, nft_metadata_files)
+
+    journal_id = None
+    if journal != None:
+        journal_id = journal.reserve(input_utxos, nft_metadata_files)
+
+    submitted = batch_mint_next_nft_in_series(cardano,
+                                              database,
+                                              minting_wallet,
+                                              policy_name,
+                                              input_utxos,
+                                              merged_metadata,
+                                              sales,
+                                              journal,
+                                              journal_id)
+    if not submitted:
+        nft_metadata.revert()
+        logger.error('Presale, Fail to mint')
+    else:
+        nft_metadata.commit()
+        logger.info('Presale, Mint TX submitted, {} payments'.format(len(input_utxos)))
+        if merged_archive != None:
+            Nft.archive_metadata(merged_archive, merged_metadata)
+        logger.info('Presale, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
     sales.commit()
 
-    return True
+    return submitted
 
 def process_whitelist(cardano: Cardano,
                               database: Database,
@@ -607,139 +948,222 @@ def process_whitelist(cardano: Cardano,
                               drop_name: str,
                               metadata_set_file: str,
                               whitelist_payments: List,
-                              max_per_tx: int) -> None:
+                              max_per_tx: int,
+                              merged_archive: str = None,
+                              poll_interval: int = 10,
+                              confirm_timeout: int = 600,
+                              max_failed_passes: int = 3) -> None:
     """
     Process payments in the given whitelist.  The number of NFTs to mint for each
     transaction is set in the whitelist payment.
+
+    Each pass works from one snapshot of the presale address.  Payments are
+    batched into mint transactions of up to max_per_tx NFTs and the snapshot
+    is only queried again once the submitted payments have left the address.
+    Passes repeat until no payment is left to mint, so payments that failed to
+    mint are retried.  If max_failed_passes passes in a row submit nothing the
+    payments still unminted are logged and an exception is raised.
+
+    @param merged_archive Optional JSON lines file to record the merged metadata
+                          of each mint, @see Nft.archive_metadata
+    @param poll_interval Seconds between snapshots while waiting for confirmation
+    @param confirm_timeout Seconds to wait for submitted payments to confirm
+    @param max_failed_passes Passes in a row that may fail to submit anything
     """
 
     logger.info('Presale whitelist minting wallet address: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)))
     sales = Sales(cardano.get_network(), drop_name)
 
     nft_metadata = MetadataList(metadata_set_file)
+
+    journal = MintJournal(get_journal_file(cardano.get_network(), drop_name))
+    reconcile_mint_journal(cardano, database, journal, nft_metadata, sales)
+    journal.compact()
     logger.info('Presale, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
 
-    for payment in whitelist_payments:
-        # payment is a dictionary with:
-        #     'utxo-txid', 'utxo-txix', 'from-stake-addr', 'nfts'
-        presale_address = minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)
-        (utxos, total_lovelace) = cardano.query_utxos(minting_wallet, [presale_address])
-        utxos = cardano.query_utxos_time(database, utxos)
-        utxos.sort(key=lambda item : item['slot-no'])
+    utxos = query_presale_utxos(cardano, minting_wallet)
+    failed_passes = 0
+    while True:
+        submitted = []
+        queued = set()
+        input_utxos = []
+        nfts_to_mint = 0
+        for payment in whitelist_payments:
+            # payment is a dictionary with:
+            #     'utxo-txid', 'utxo-txix', 'from-stake-addr', 'nfts'
+            key = (payment['utxo-txid'], payment['utxo-txix'])
+
+            # If the payment UTXO doesn't exist then presumably the presale has
+            # already been processed.
+            if not key in utxos:
+                logger.debug('Presale, UTXO: {}#{} already processed'.format(payment['utxo-txid'], payment['utxo-txix']))
+                continue
+
+            if sales.contains(payment['utxo-txid'], payment['utxo-txix']):
+                # UTXO is still in the wallet but contained in sales database which
+                # means it's already been processed but still pending completiong.
+                logger.debug('Presale, UTXO: {}#{} transaction still pending'.format(payment['utxo-txid'], payment['utxo-txix']))
+                continue
+
+            if key in queued:
+                logger.warning('Presale, UTXO: {}#{} listed more than once'.format(payment['utxo-txid'], payment['utxo-txix']))
+                continue
+
+            if payment['nfts'] < 1 or payment['nfts'] > max_per_tx:
+                logger.error('Presale, Invalid NFTs requested: {}'.format(payment['nfts']))
+                raise Exception('Presale, Invalid NFTs requested: {}'.format(payment['nfts']))
+
+            if nfts_to_mint + payment['nfts'] > max_per_tx:
+                if mint_whitelist_batch(cardano, database, minting_wallet, policy_name, nft_metadata, input_utxos, sales, merged_archive, journal):
+                    submitted.extend(input_utxos)
+                input_utxos = []
+                nfts_to_mint = 0
 
-        # search the wallet utxos to see if the payment utxo exists.  If it does
-        # exist then the requested number of NFTs need to be minted for it.  If
-        # it doesn't exist then presumably the presale has already been processed.
-        utxo_objs = [utxo for utxo in utxos if payment['utxo-txid'] == utxo['tx-hash'] and payment['utxo-txix'] == utxo['tx-ix']]
-        if len(utxo_objs) > 1:
-            logger.error('Presale, Expected only 1 match.  Got: {}'.format(len(utxo_objs)))
-            raise Exception('Presale, Expected only 1 match.  Got: {}'.format(len(utxo_objs)))
-
-        if len(utxo_objs) == 0:
-            # payment UTXO not found which means it's already been processed.
-            # Can skip to the next one.
-            logger.debug('Presale, UTXO: {}#{} already processed'.format(payment['utxo-txid'], payment['utxo-txix']))
-            continue
+            # Got a payment to process, verify requested number of NFTs
+            if nft_metadata.get_remaining() < nfts_to_mint + payment['nfts']:
+                logger.error('Presale, NFTs Remaining: {}, Required: {}'.format(nft_metadata.get_remaining() - nfts_to_mint, payment['nfts']))
+                raise Exception('Presale, NFTs Remaining: {}, Required: {}'.format(nft_metadata.get_remaining() - nfts_to_mint, payment['nfts']))
+
+            input_utxos.append({'utxo': utxos[key], 'count': payment['nfts'], 'refund': 0})
+            queued.add(key)
+            nfts_to_mint += payment['nfts']
+            logger.debug('Queue For Mint, UTXO {} = {} NFTs, refund: {}'.format(payment['utxo-txid'], payment['nfts'], 0))
 
-        if sales.contains(payment['utxo-txid'], payment['utxo-txix']):
-            # UTXO is still in the wallet but contained in sales database which
-            # means it's already been processed but still pending completiong.
-            logger.debug('Presale, UTXO: {}#{} transaction still pending'.format(payment['utxo-txid'], payment['utxo-txix']))
+        if len(input_utxos) > 0:
+            if mint_whitelist_batch(cardano, database, minting_wallet, policy_name, nft_metadata, input_utxos, sales, merged_archive, journal):
+                submitted.extend(input_utxos)
+
+        if len(queued) == 0:
+            break
+
+        if len(submitted) == 0:
+            failed_passes += 1
+            if failed_passes >= max_failed_passes:
+                for key in sorted(queued):
+                    logger.error('Presale, UTXO: {}#{} not minted'.format(key[0], key[1]))
+                journal.close()
+                raise Exception('Presale, {} payments not minted after {} passes'.format(len(queued), failed_passes))
+
+            logger.warning('Presale, No mint submitted for {} payments, retry'.format(len(queued)))
+            time.sleep(poll_interval)
+            utxos = query_presale_utxos(cardano, minting_wallet)
             continue
 
-        # Got a payment to process, verify requested number of NFTs
-        if nft_metadata.get_remaining() < payment['nfts']:
-            logger.error('Presale, NFTs Remaining: {}, Required: {}'.format(nft_metadata.get_remaining(), payment['nfts']))
-            raise Exception('Presale, NFTs Remaining: {}, Required: {}'.format(nft_metadata.get_remaining(), payment['nfts']))
+        failed_passes = 0
 
-        if payment['nfts'] < 1 or payment['nfts'] > max_per_tx:
-            logger.error('Presale, Invalid NFTs requested: {}'.format(payment['nfts']))
-            raise Exception('Presale, Invalid NFTs requested: {}'.format(payment['nfts']))
+        # Wait for the submitted payments to be spent before the next pass
+        logger.info('Presale, Monitor: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)))
+        pending = set([(item['utxo']['tx-hash'], item['utxo']['tx-ix']) for item in submitted])
+        start = time.time()
+        while True:
+            time.sleep(poll_interval)
+            utxos = query_presale_utxos(cardano, minting_wallet)
+            pending = set([key for key in pending if key in utxos])
+            if len(pending) == 0:
+                break
 
-        # Everything looks good, mint the NFTs
-        input_utxos = []
-        nfts_to_mint = payment['nfts']
-
-        input_utxos.append({'utxo': utxo_objs[0], 'count': nfts_to_mint, 'refund': 0})
-        logger.debug('Queue For Mint, UTXO {} = {} NFTs, refund: {}'.format(utxo_objs[0]['tx-hash'], nfts_to_mint, 0))
-
-        logger.debug('Mint {} NFTs for {} queued UTXOs'.format(nfts_to_mint, len(input_utxos)))
-        # Mint the NFTs requested
-        nft_metadata_files = []
-        for i in range(0, nfts_to_mint):
-            mdfile = nft_metadata.peek_next_file()
-            nft_metadata_files.append(mdfile)
-            logger.debug('Merging NFT metadata: {}'.format(mdfile))
-
-        policy_id = cardano.get_policy_id(policy_name)
-        merged_metadata_file = Nft.merge_metadata_files(policy_id,
-                                                        nft_metadata_files)
-
-        if not batch_mint_next_nft_in_series(cardano,
-                                             database,
-                                             minting_wallet,
-                                             policy_name,
-                                             input_utxos,
-                                             merged_metadata_file,
-                                             sales):
-            nft_metadata.revert()
-            logger.error('process_incoming_payments, Fail to mint')
-        else:
-            nft_metadata.commit()
-            logger.info('Presale, Mint TX submitted')
-            logger.info('Presale, Monitor: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_PRESALE)))
-            logger.info('Presale, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
-        sales.commit()
+            if time.time() - start > confirm_timeout:
+                logger.warning('Presale, {} payments not confirmed after {}s'.format(len(pending), confirm_timeout))
+                break
 
-        #
-        time.sleep(30)
+    reconcile_mint_journal(cardano, database, journal, nft_metadata, sales)
+    journal.close()
 
     logger.info('!!!!!!!!!!!!!!!!!!!!!!!!!!')
     logger.info('!!! Whitelist COMPLETE !!!')
     logger.info('!!!!!!!!!!!!!!!!!!!!!!!!!!')
 
-def process_incoming_payments(cardano: Cardano,
-                              database: Database,
-                              minting_wallet: Wallet,
-                              policy_name: str,
-                              drop_name: str,
-                              metadata_set_file: str,
-                              prices: Dict[int, int],
-                              max_per_tx: int) -> None:
+class PaymentProcessor:
     """
-    Listing for incoming payments and mint NFT to the address the payment came
-    from.  NFTs are minted in the order defined in metadata_set_file and assumes
-    that all NFTs have the same price.
+    Payments and minting for one drop, one poll at a time.
 
-    @param prices A dictionary to define the price for a single item or a bundle.
+    @see process_incoming_payments for the parameters
     """
 
-    logger.info('Monitor Incoming Payments on   (delegated): {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True)))
-    logger.info('Monitor Incoming Payments on (undelegated): {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=False)))
-    sales = Sales(cardano.get_network(), drop_name)
+    # Seconds to wait when there is nothing to do
+    POLL_INTERVAL = 30
+
+    def __init__(self,
+                 cardano: Cardano,
+                 database: Database,
+                 minting_wallet: Wallet,
+                 policy_name: str,
+                 drop_name: str,
+                 metadata_set_file: str,
+                 prices: Dict[int, int],
+                 max_per_tx: int,
+                 merged_archive: str = None,
+                 shard: int = 0,
+                 allocator = None):
+        self.cardano = cardano
+        self.database = database
+        self.minting_wallet = minting_wallet
+        self.policy_name = policy_name
+        self.drop_name = drop_name
+        self.prices = prices
+        self.max_per_tx = max_per_tx
+        self.merged_archive = merged_archive
+        self.allocator = allocator
+
+        self.address_index = Wallet.get_shard_address_index(shard)
+        logger.info('Monitor Incoming Payments on   (delegated): {}'.format(self.minting_wallet.get_payment_address(self.address_index, delegated=True)))
+        logger.info('Monitor Incoming Payments on (undelegated): {}'.format(self.minting_wallet.get_payment_address(self.address_index, delegated=False)))
+        self.sales = Sales(self.cardano.get_network(), drop_name, shard)
+
+        self.nft_metadata = MetadataList(metadata_set_file)
+
+        self.journal = MintJournal(get_journal_file(self.cardano.get_network(), drop_name, shard))
+        reconcile_mint_journal(self.cardano, self.database, self.journal, self.nft_metadata, self.sales)
+        self.journal.compact()
+        logger.info('process_incoming_payments, NFTs Remaining: {}'.format(self.nft_metadata.get_remaining()))
+
+    def close(self) -> None:
+        self.journal.close()
+
+    def poll_once(self) -> int:
+        """
+        Check the payment address once, minting or refunding what is there.
+
+        @return Seconds to wait before the next poll
+        """
+
+        if len(self.journal.get_unresolved()) > 0:
+            reconcile_mint_journal(self.cardano, self.database, self.journal, self.nft_metadata, self.sales)
 
-    nft_metadata = MetadataList(metadata_set_file)
-    logger.info('process_incoming_payments, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
-
-    while True:
         #time.sleep(2)
-        (utxos, total_lovelace) = cardano.query_utxos(minting_wallet,
-                                                      [minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=True),
-                                                       minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT, delegated=False)])
-        utxos = cardano.query_utxos_time(database, utxos)
+        (utxos, total_lovelace) = self.cardano.query_utxos(self.minting_wallet,
+                                                           [self.minting_wallet.get_payment_address(self.address_index, delegated=True),
+                                                            self.minting_wallet.get_payment_address(self.address_index, delegated=False)])
+        utxos = self.cardano.query_utxos_time(self.database, utxos)
         utxos.sort(key=lambda item : item['slot-no'])
 
         matching_utxos = 0
         for utxo in utxos:
-            if utxo['amount'] in prices and not sales.contains(utxo['tx-hash'], utxo['tx-ix']):
+            if utxo['amount'] in self.prices and not self.sales.contains(utxo['tx-hash'], utxo['tx-ix']):
                 matching_utxos += 1
 
         if matching_utxos == 0:
-            logger.debug('process_incoming_payments, Waiting for a new matching UTXO')
-            time.sleep(30)
-            continue
+            if self.allocator != None and self.allocator.holding:
+                # Idle, give the files back so a busy shard can mint them
+                files = list(self.nft_metadata.metadata_list['files'])
+                self.nft_metadata.remove_files(files)
+                self.allocator.release(files)
+                logger.info('process_incoming_payments, Released {} NFTs'.format(len(files)))
 
-        if nft_metadata.get_remaining() > 0:
+            logger.debug('process_incoming_payments, Waiting for a new matching UTXO')
+            return PaymentProcessor.POLL_INTERVAL
+
+        if self.allocator != None and self.nft_metadata.get_remaining() < self.max_per_tx:
+            files = self.allocator(self.max_per_tx - self.nft_metadata.get_remaining(), self.nft_metadata.get_remaining())
+            if len(files) > 0:
+                self.nft_metadata.append_files(files)
+                logger.info('process_incoming_payments, Allocated {} NFTs, Remaining: {}'.format(len(files), self.nft_metadata.get_remaining()))
+            elif self.nft_metadata.get_remaining() == 0 and not self.allocator.sold_out:
+                # Other shards still hold files they may release
+                logger.info('process_incoming_payments, Waiting for NFTs from other shards')
+                return PaymentProcessor.POLL_INTERVAL
+
+        if self.nft_metadata.get_remaining() > 0:
             if len(utxos) > 0:
                 # There are NFTs available.  So go find a UTXO that NFTs can be minted to.
                 # Collect incoming utxos that match a payment and batch them together for processing
@@ -748,13 +1172,13 @@ def process_incoming_payments(cardano: Cardano,
 
                 # search for UTXOs that the full requested amount can be fulfilled
                 for utxo in utxos:
-                    if sales.contains(utxo['tx-hash'], utxo['tx-ix']):
+                    if self.sales.contains(utxo['tx-hash'], utxo['tx-ix']):
                         # If already processed this UTXO then skip it.
                         continue
 
-                    if utxo['amount'] in prices:
-                        num_nfts = prices[utxo['amount']]
-                        if num_nfts + nfts_to_mint <= nft_metadata.get_remaining() and num_nfts + nfts_to_mint <= max_per_tx:
+                    if utxo['amount'] in self.prices:
+                        num_nfts = self.prices[utxo['amount']]
+                        if num_nfts + nfts_to_mint <= self.nft_metadata.get_remaining() and num_nfts + nfts_to_mint <= self.max_per_tx:
                             logger.info('RX UTXO {}: {} lovelace'.format(utxo['tx-hash'], utxo['amount']))
                             logger.info('Request {} NFTs'.format(num_nfts))
                             input_utxos.append({'utxo': utxo, 'count': num_nfts, 'refund': 0})
@@ -766,11 +1190,11 @@ def process_incoming_payments(cardano: Cardano,
                             # amount can be granted
                             if nfts_to_mint == 0:
                                 # This could happen on the last mint transaction
-                                if num_nfts > nft_metadata.get_remaining():
+                                if num_nfts > self.nft_metadata.get_remaining():
                                     price_per_nft = utxo['amount'] / num_nfts
-                                    refund_nfts = num_nfts - nft_metadata.get_remaining()
+                                    refund_nfts = num_nfts - self.nft_metadata.get_remaining()
                                     refund_price = int(refund_nfts * price_per_nft)
-                                    num_nfts = nft_metadata.get_remaining()
+                                    num_nfts = self.nft_metadata.get_remaining()
                                     input_utxos.append({'utxo': utxo, 'count': num_nfts, 'refund': refund_price})
                                     nfts_to_mint += num_nfts
                                     logger.debug('Queue For Mint, UTXO {} = {} NFTs, refund: {}'.format(utxo['tx-hash'], num_nfts, refund_price))
@@ -789,29 +1213,34 @@ def process_incoming_payments(cardano: Cardano,
                     # Mint the NFTs requested
                     nft_metadata_files = []
                     for i in range(0, nfts_to_mint):
-                        mdfile = nft_metadata.peek_next_file()
+                        mdfile = self.nft_metadata.peek_next_file()
                         nft_metadata_files.append(mdfile)
                         logger.debug('Merging NFT metadata: {}'.format(mdfile))
 
-                    policy_id = cardano.get_policy_id(policy_name)
-                    merged_metadata_file = Nft.merge_metadata_files(policy_id,
-                                                                    nft_metadata_files)
+                    policy_id = self.cardano.get_policy_id(self.policy_name)
+                    merged_metadata = Nft.merge_metadata(policy_id, nft_metadata_files)
 
-                    if not batch_mint_next_nft_in_series(cardano,
-                                                         database,
-                                                         minting_wallet,
-                                                         policy_name,
+                    journal_id = self.journal.reserve(input_utxos, nft_metadata_files)
+                    if not batch_mint_next_nft_in_series(self.cardano,
+                                                         self.database,
+                                                         self.minting_wallet,
+                                                         self.policy_name,
                                                          input_utxos,
-                                                         merged_metadata_file,
-                                                         sales):
-                        nft_metadata.revert()
+                                                         merged_metadata,
+                                                         self.sales,
+                                                         self.journal,
+                                                         journal_id,
+                                                         self.address_index):
+                        self.nft_metadata.revert()
                         logger.error('process_incoming_payments, Fail to mint')
                     else:
-                        nft_metadata.commit()
+                        self.nft_metadata.commit()
+                        if self.merged_archive != None:
+                            Nft.archive_metadata(self.merged_archive, merged_metadata)
                         logger.info('Mint complete')
-                        logger.info('Monitor Incoming Payments on: {}'.format(minting_wallet.get_payment_address(Wallet.ADDRESS_INDEX_MINT)))
-                        logger.info('process_incoming_payments, NFTs Remaining: {}'.format(nft_metadata.get_remaining()))
-                    sales.commit()
+                        logger.info('Monitor Incoming Payments on: {}'.format(self.minting_wallet.get_payment_address(self.address_index)))
+                        logger.info('process_incoming_payments, NFTs Remaining: {}'.format(self.nft_metadata.get_remaining()))
+                    self.sales.commit()
                 else:
                     # The UTXO is being processed
                     pass
@@ -822,22 +1251,64 @@ def process_incoming_payments(cardano: Cardano,
 
             # Copy the UTXOs that match a payment amount
             for utxo in utxos:
-                if sales.contains(utxo['tx-hash'], utxo['tx-ix']):
+                if self.sales.contains(utxo['tx-hash'], utxo['tx-ix']):
                     # If already processed this UTXO then skip it.
                     continue
 
-                if utxo['amount'] in prices:
+                if utxo['amount'] in self.prices:
                     logger.debug('Queue For Refund, UTXO {} = {} NFTs, refund: {}'.format(utxo['tx-hash'], 0, utxo['amount']))
                     input_utxos.append({'utxo': utxo, 'count': 0})
 
             # Give the refund
-            for item in input_utxos:
-                logger.info("Refund: {} = {}".format(item['utxo']['tx-hash'], item['utxo']['amount']))
-                if not refund_payment(cardano, database, minting_wallet, item['utxo'], sales):
-                    logger.error('processing_incoming_payments, Fail to refund')
-                else:
-                    logger.info('processing_incoming_payments, Refund complete.')
-            time.sleep(30)
+            if len(input_utxos) > 0:
+                refunded = refund_payments(self.cardano, self.database, self.minting_wallet, [item['utxo'] for item in input_utxos], self.sales,
+                                           address_index=self.address_index)
+                logger.info('processing_incoming_payments, Refunded {} of {} UTXOs'.format(refunded, len(input_utxos)))
+            return PaymentProcessor.POLL_INTERVAL
+
+        return 0
+
+def process_incoming_payments(cardano: Cardano,
+                              database: Database,
+                              minting_wallet: Wallet,
+                              policy_name: str,
+                              drop_name: str,
+                              metadata_set_file: str,
+                              prices: Dict[int, int],
+                              max_per_tx: int,
+                              merged_archive: str = None,
+                              shard: int = 0,
+                              allocator = None) -> None:
+    """
+    Listing for incoming payments and mint NFT to the address the payment came
+    from.  NFTs are minted in the order defined in metadata_set_file and assumes
+    that all NFTs have the same price.
+
+    @param prices A dictionary to define the price for a single item or a bundle.
+    @param merged_archive Optional JSON lines file to record the merged metadata
+                          of each mint, @see Nft.archive_metadata
+    @param shard Minting shard, payments are taken on the shard's address,
+                 @see Wallet.get_shard_address_index
+    @param allocator Optional callable, allocator(count, remaining) returns
+                     up to count more metadata files for metadata_set_file when
+                     it runs low, @see tcr.mint_shards.ShardAllocator
+    """
+
+    processor = PaymentProcessor(cardano,
+                                 database,
+                                 minting_wallet,
+                                 policy_name,
+                                 drop_name,
+                                 metadata_set_file,
+                                 prices,
+                                 max_per_tx,
+                                 merged_archive,
+                                 shard,
+                                 allocator)
+    while True:
+        delay = processor.poll_once()
+        if delay > 0:
+            time.sleep(delay)
 
 
     logger.info('!!!!!!!!!!!!!!!!!!!!!!!!')
@@ -0,0 +1,343 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: trait_index.py
+Author: Kris Henderson
+
+Inverted index of the traits of a drop for answering "which tokens have X
+and Y" without reading every metadata file.
+
+Each token gets a number and each trait=value is a bitmap of the tokens that
+have it, stored as a Python int.  AND / OR / NOT of a query are &, | and ~
+of the bitmaps.  The index is saved next to the metadata and only files that
+changed since it was saved are read again.
+
+Query syntax:
+    color=red AND NOT (hat=cap OR hat="top hat")
+    color=red,size=large    same as color=red AND size=large
+    hat=top hat             unquoted values may hold spaces
+    scene="rock and roll"   values with AND, OR or NOT must be quoted
+"""
+
+from typing import Dict, List, Tuple
+import json
+import logging
+import os
+import re
+
+from tcr.drop_archive import DropArchive
+
+logger = logging.getLogger('trait-index')
+
+INDEX_FILE = '.trait_index'
+INDEX_VERSION = 1
+
+def get_pairs(md: Dict) -> List[str]:
+    """
+    The trait=value pairs of a token.  A list property has a pair for each
+    value in the list.
+    """
+
+    erc721 = md['721']
+    policy = erc721[list(erc721.keys())[0]]
+    token = policy[list(policy.keys())[0]]
+
+    pairs = []
+    for key in token:
+        values = token[key] if type(token[key]) is list else [token[key]]
+        for value in values:
+            if isinstance(value, (dict, list)):
+                continue
+            pairs.append('{}={}'.format(key, value))
+
+    return pairs
+
+class TraitIndex:
+    def __init__(self, source: str):
+        """
+        @param source A directory of metadata files or a drop archive.  The
+                      index is saved to <directory>/.trait_index or
+                      <archive>.trait_index
+        """
+
+        self.source = source
+        if os.path.isdir(source):
+            self.index_file = os.path.join(source, INDEX_FILE)
+        else:
+            self.index_file = source + INDEX_FILE
+
+        # files[name] = [mtime_ns, size, token number, [pairs]]
+        self.files = {}
+        self.tokens = []
+        self.bitmaps = {}
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def load(self) -> None:
+        if not os.path.isfile(self.index_file):
+            return
+
+        try:
+            with open(self.index_file, 'r') as file:
+                index = json.load(file)
+        except ValueError:
+            logger.warning('Invalid index, rebuild: {}'.format(self.index_file))
+            return
+
+        if index.get('version') != INDEX_VERSION:
+            return
+
+        self.files = index['files']
+        self.tokens = index['tokens']
+        self.bitmaps = {pair: int(bitmap, 16) for (pair, bitmap) in index['bitmaps'].items()}
+
+    def save(self) -> None:
+        index = {'version': INDEX_VERSION,
+                 'files': self.files,
+                 'tokens': self.tokens,
+                 'bitmaps': {pair: format(bitmap, 'x') for (pair, bitmap) in self.bitmaps.items()}}
+
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as file:
+            file.write(json.dumps(index, separators=(',', ':')))
+        os.replace(tmp_file, self.index_file)
+
+    def remove(self, name: str) -> None:
+        (mtime, size, number, pairs) = self.files.pop(name)
+        for pair in pairs:
+            self.bitmaps[pair] &= ~(1 << number)
+            if self.bitmaps[pair] == 0:
+                del self.bitmaps[pair]
+        self.tokens[number] = None
+
+    def add(self, name: str, stat: Tuple[int, int], md: Dict) -> None:
+        number = len(self.tokens)
+        self.tokens.append(name)
+        pairs = get_pairs(md)
+        for pair in pairs:
+            self.bitmaps[pair] = self.bitmaps.get(pair, 0) | (1 << number)
+        self.files[name] = [stat[0], stat[1], number, pairs]
+
+    def compact(self) -> None:
+        """
+        Renumber the tokens when many have been removed.
+        """
+
+        files = self.files
+        self.files = {}
+        self.tokens = []
+        self.bitmaps = {}
+        for name in sorted(files):
+            (mtime, size, number, pairs) = files[name]
+            number = len(self.tokens)
+            self.tokens.append(name)
+            for pair in pairs:
+                self.bitmaps[pair] = self.bitmaps.get(pair, 0) | (1 << number)
+            self.files[name] = [mtime, size, number, pairs]
+
+    def update(self) -> int:
+        """
+        Read the metadata files that are new or changed since the index was
+        saved and drop the ones that were deleted.
+
+        @return The number of files read
+        """
+
+        if os.path.isdir(self.source):
+            current = {}
+            for entry in os.scandir(self.source):
+                if entry.name.endswith('.json') and entry.is_file():
+                    stat = entry.stat()
+                    current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+            changed = [name for name in sorted(current) if not name in self.files or tuple(self.files[name][0:2]) != current[name]]
+            removed = [name for name in self.files if not name in current]
+            for name in removed + [name for name in changed if name in self.files]:
+                self.remove(name)
+
+            for name in changed:
+                with open(name, 'r') as file:
+                    self.add(name, current[name], json.load(file))
+        else:
+            # An archive is rewritten as a whole so any change reads it all again
+            stat = os.stat(self.source)
+            stat = (stat.st_mtime_ns, stat.st_size)
+            if len(self.files) > 0 and all([tuple(entry[0:2]) == stat for entry in self.files.values()]):
+                return 0
+
+            removed = list(self.files.keys())
+            self.files = {}
+            self.tokens = []
+            self.bitmaps = {}
+            changed = []
+            with DropArchive(self.source) as archive:
+                for i in range(0, len(archive)):
+                    changed.append(archive.get_name(i))
+                    self.add(archive.get_name(i), stat, archive.read(i))
+
+        if len(self.tokens) > 2 * len(self.files) + 64:
+            self.compact()
+
+        if len(changed) > 0 or len(removed) > 0:
+            self.save()
+            logger.info('Trait index {}: {} read, {} removed, {} tokens'.format(self.index_file, len(changed), len(removed), len(self.files)))
+
+        return len(changed)
+
+    def get_all(self) -> int:
+        bitmap = 0
+        for (mtime, size, number, pairs) in self.files.values():
+            bitmap |= 1 << number
+        return bitmap
+
+    def get_bitmap(self, pair: str) -> int:
+        return self.bitmaps.get(pair, 0)
+
+    def get_names(self, bitmap: int) -> List[str]:
+        """
+        The metadata file names of the tokens in bitmap, sorted.
+        """
+
+        names = []
+        number = 0
+        while bitmap != 0:
+            if bitmap & 1:
+                names.append(self.tokens[number])
+            bitmap >>= 1
+            number += 1
+
+        return sorted(names)
+
+    def search(self, query: str) -> List[str]:
+        return self.get_names(parse_query(query)(self))
+
+# An unquoted value may hold spaces, it runs until , ( ) or an AND / OR / NOT
+TOKEN_PATTERN = re.compile(r'\s*(\(|\)|,|[^\s(),=]+="[^"]*"|[^\s(),=]+=(?:(?!\s+(?:AND|OR|NOT)\b)[^(),])*|[^\s(),]+)',
+                           re.IGNORECASE)
+
+def tokenize(query: str) -> List[str]:
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = TOKEN_PATTERN.match(query, position)
+        if match == None:
+            raise Exception('Invalid query at: {}'.format(query[position:]))
+        tokens.append(match.group(1).rstrip())
+        position = match.end()
+        while position < len(query) and query[position].isspace():
+            position += 1
+
+    # An unquoted value ends at a keyword, catch a value that was meant to run on
+    for i in range(1, len(tokens) - 1):
+        if tokens[i].upper() in ('AND', 'OR', 'NOT') and '=' in tokens[i - 1] and not tokens[i - 1].endswith('"'):
+            if not '=' in tokens[i + 1] and not tokens[i + 1] in ('(', ')', ',') and tokens[i + 1].upper() != 'NOT':
+                raise Exception('Expected trait=value after {}, quote values that contain AND, OR or NOT: {}'.format(tokens[i], query))
+
+    return tokens
+
+def parse_query(query: str):
+    """
+    Compile a query into a function of a TraitIndex that returns the bitmap
+    of the matching tokens.
+
+        expression := term (OR term)*
+        term       := factor ((AND | ,) factor)*
+        factor     := NOT factor | ( expression ) | trait=value
+    """
+
+    tokens = tokenize(query)
+    position = [0]
+
+    def peek() -> str:
+        return tokens[position[0]] if position[0] < len(tokens) else None
+
+    def take() -> str:
+        token = peek()
+        if token == None:
+            raise Exception('Unexpected end of query: {}'.format(query))
+        position[0] += 1
+        return token
+
+    def expression():
+        terms = [term()]
+        while peek() != None and peek().upper() == 'OR':
+            take()
+            terms.append(term())
+
+        if len(terms) == 1:
+            return terms[0]
+
+        def evaluate_or(index):
+            bitmap = 0
+            for t in terms:
+                bitmap |= t(index)
+            return bitmap
+        return evaluate_or
+
+    def term():
+        factors = [factor()]
+        while peek() != None and (peek().upper() == 'AND' or peek() == ','):
+            take()
+            factors.append(factor())
+
+        if len(factors) == 1:
+            return factors[0]
+
+        def evaluate_and(index):
+            bitmap = factors[0](index)
+            for f in factors[1:]:
+                if bitmap == 0:
+                    break
+                bitmap &= f(index)
+            return bitmap
+        return evaluate_and
+
+    def factor():
+        token = take()
+        if token.upper() == 'NOT':
+            operand = factor()
+            return lambda index: index.get_all() & ~operand(index)
+
+        if token == '(':
+            result = expression()
+            if take() != ')':
+                raise Exception('Expected ) in query: {}'.format(query))
+            return result
+
+        if not '=' in token:
+            raise Exception('Expected trait=value in query, got: {}'.format(token))
+
+        (key, value) = token.split('=', 1)
+        if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+            value = value[1:-1]
+        pair = '{}={}'.format(key, value)
+        return lambda index: index.get_bitmap(pair)
+
+    result = expression()
+    if peek() != None:
+        raise Exception('Unexpected {} in query: {}'.format(peek(), query))
+
+    return result
@@ -25,7 +25,7 @@ File: wallet.py
 Author: Kris Henderson
 """
 
-from typing import Tuple
+from typing import Tuple, List
 import os
 import logging
 
@@ -46,6 +46,9 @@ class Wallet:
     ADDRESS_INDEX_PRESALE = 2
     ADDRESS_INDEX_MUTATE_REQUEST = 3
 
+    # Deposit addresses of the extra minting shards, @see get_shard_address_index
+    ADDRESS_INDEX_SHARD_BASE = 100
+
     def __init__(self,
                  name: str,
                  network: str):
@@ -77,6 +80,30 @@ class Wallet:
         self.signing_key_file_base = 'wallet/{}/{}_{}_key.skey'.format(self.network, name, '{}')
         self.verification_key_file_base = 'wallet/{}/{}_{}_key.vkey'.format(self.network, name, '{}')
 
+    @staticmethod
+    def get_shard_address_index(shard: int) -> int:
+        """
+        Address index that takes payments for a minting shard.  Shard 0 is the
+        regular mint address.
+        """
+
+        if shard == 0:
+            return Wallet.ADDRESS_INDEX_MINT
+
+        return Wallet.ADDRESS_INDEX_SHARD_BASE + shard
+
+    def get_shards(self) -> List[int]:
+        """
+        Minting shards, other than shard 0, that have an address set up in this
+        wallet.
+        """
+
+        shards = []
+        while os.path.isfile(self.payment_address_file_base.format(Wallet.get_shard_address_index(len(shards) + 1))):
+            shards.append(len(shards) + 1)
+
+        return shards
+
     def get_name(self) -> str:
         """
         Return the name of the wallet.
@@ -390,6 +417,9 @@ class WalletExternal(Wallet):
     def get_verification_key_file(self):
         raise Exception("External wallet does not have verification key file")
 
+    def get_shards(self) -> List[int]:
+        return []
+
     def get_payment_address(self, idx: int, delegated: bool=True):
         return self.payment_address
 
@@ -0,0 +1,69 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_aio.py
+Author: Kris Henderson
+"""
+
+import unittest
+import asyncio
+import subprocess
+
+from aio import AsyncCommand, AsyncProxy, AsyncCardano
+from cardano import Cardano
+
+UTXO_TABLE = ('                           TxHash                                 TxIx        Amount\n'
+              '--------------------------------------------------------------------------------------\n'
+              'aa00000000000000000000000000000000000000000000000000000000000000     0        5000000 lovelace + TxOutDatumNone\n'
+              'bb00000000000000000000000000000000000000000000000000000000000000     1        2000000 lovelace + 1 policy.token + TxOutDatumNone')
+
+class FakeDatabase:
+    def __init__(self):
+        self.calls = 0
+
+    def query_txhash_time(self, txhash):
+        self.calls += 1
+        return ('time_{}'.format(txhash), self.calls)
+
+class TestAio(unittest.TestCase):
+    def test_parse_utxos(self):
+        (utxos, lovelace) = Cardano.parse_utxos(UTXO_TABLE)
+        self.assertEqual(7000000, lovelace)
+        self.assertEqual(2, len(utxos))
+        self.assertEqual(1, utxos[1]['tx-ix'])
+        self.assertEqual({'policy.token': 1}, utxos[1]['assets'])
+
+    def test_run(self):
+        self.assertEqual('hello', asyncio.run(AsyncCommand.run(['echo', 'hello'], None)))
+        self.assertEqual('input', asyncio.run(AsyncCommand.run(['cat'], None, input='input')))
+        with self.assertRaises(subprocess.CalledProcessError):
+            asyncio.run(AsyncCommand.run(['false'], None))
+
+    def test_query_utxos_time(self):
+        async def query():
+            cardano = AsyncCardano(Cardano('testnet', 'unittest_protocol_parameters.json'))
+            return await cardano.query_utxos_time(AsyncProxy(FakeDatabase()), [{'tx-hash': 'aa'}, {'tx-hash': 'bb'}])
+
+        utxos = asyncio.run(query())
+        self.assertEqual(['time_aa', 'time_bb'], [utxo['time'] for utxo in utxos])
+        self.assertEqual([1, 2], sorted([utxo['slot-no'] for utxo in utxos]))
@@ -0,0 +1,120 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_car.py
+Author: Kris Henderson
+"""
+
+import unittest
+import hashlib
+import os
+import shutil
+
+import cid
+from car import CarBundle
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            return (value, offset)
+
+class TestCar(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-car'
+        os.makedirs(self.directory)
+
+        self.files = []
+        for i in range(0, 10):
+            fname = os.path.join(self.directory, 'TCRx002x{:05}x001.png'.format(9 - i))
+            with open(fname, 'wb') as file:
+                file.write('image {}'.format(i).encode('utf-8') * (1000 + i))
+            self.files.append(fname)
+
+        # more than one chunk
+        fname = os.path.join(self.directory, 'large.png')
+        with open(fname, 'wb') as file:
+            file.write(bytes(range(256)) * (cid.CHUNK_SIZE * 2 // 256) + b'tail')
+        self.files.append(fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cids(self):
+        bundle = CarBundle(self.files)
+        self.assertEqual(sorted([os.path.basename(f) for f in self.files]), bundle.get_names())
+        self.assertTrue(bundle.get_root().startswith('bafybei'))
+
+        cids = bundle.get_cids()
+        for fname in self.files:
+            self.assertEqual(cid.calculate_file(fname, 1), cids[os.path.basename(fname)])
+
+        # same files, same root
+        self.assertEqual(bundle.get_root(), CarBundle(list(reversed(self.files))).get_root())
+
+    def test_car(self):
+        bundle = CarBundle(self.files)
+        car_file = os.path.join(self.directory, 'bundle.car')
+        size = bundle.write(car_file)
+        with open(car_file, 'rb') as file:
+            data = file.read()
+        self.assertEqual(size, len(data))
+
+        (header_length, offset) = read_varint(data, 0)
+        header = data[offset:offset + header_length]
+        self.assertIn(b'\x00' + bundle.root, header)
+        offset += header_length
+
+        blocks = []
+        while offset < len(data):
+            (length, offset) = read_varint(data, offset)
+            (version, start) = read_varint(data, offset)
+            (codec, start) = read_varint(data, start)
+            self.assertEqual(1, version)
+            self.assertEqual(b'\x12\x20', data[start:start + 2])
+            digest = data[start + 2:start + 34]
+            block = data[start + 34:offset + length]
+            self.assertEqual(hashlib.sha256(block).digest(), digest)
+            blocks.append((codec, data[offset:start + 34]))
+            offset += length
+
+        # 10 single raw blocks, 3 raw blocks + 1 node for the large file, the directory
+        self.assertEqual(10 + 4 + 1, len(blocks))
+        self.assertEqual((cid.CODEC_DAG_PB, bundle.root), blocks[-1])
+
+    def test_duplicate_name(self):
+        other = os.path.join(self.directory, 'other')
+        os.makedirs(other)
+        shutil.copy(self.files[0], other)
+        self.assertRaises(Exception, CarBundle, [self.files[0], os.path.join(other, os.path.basename(self.files[0]))])
+
+    def test_changed_file(self):
+        bundle = CarBundle(self.files)
+        with open(self.files[0], 'ab') as file:
+            file.write(b'changed')
+        self.assertRaises(Exception, list, bundle.stream())
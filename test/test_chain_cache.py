@@ -0,0 +1,136 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_chain_cache.py
+Author: Kris Henderson
+"""
+
+import unittest
+import datetime
+import os
+import shutil
+
+from chain_cache import ChainCache
+
+class FakeDatabase:
+    def __init__(self):
+        self.calls = 0
+        self.latest_slot = 10000
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+    def query_latest_slot(self):
+        return self.latest_slot
+
+    def query_sync_progress(self):
+        return 100.0
+
+    def query_txhash_time(self, txhash):
+        self.calls += 1
+        return (datetime.datetime(2022, 1, 1, 0, 0, int(txhash) % 60), int(txhash))
+
+    def query_utxo_inputs_slot(self, txid):
+        self.calls += 1
+        return ([{'address': 'addr{}'.format(txid), 'value': 1000000}], int(txid))
+
+    def query_stake_address(self, address):
+        self.calls += 1
+        return 'stake_' + address
+
+    def query_nft_mint(self, fingerprint):
+        self.calls += 1
+        return ('policy', {'name': fingerprint}, 100)
+
+class TestChainCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-chain-cache'
+        self.cache_file = os.path.join(self.directory, 'chain_cache.db')
+        os.makedirs(self.directory)
+        self.database = FakeDatabase()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_confirmed(self):
+        cache = ChainCache(self.cache_file, self.database, min_depth_slots=600)
+        self.assertEqual(100.0, cache.query_sync_progress())
+
+        inputs = cache.query_utxo_inputs('100')
+        self.assertEqual(1, self.database.calls)
+        self.assertEqual(inputs, cache.query_utxo_inputs('100'))
+        self.assertEqual((datetime.datetime(2022, 1, 1, 0, 0, 40), 100), cache.query_txhash_time('100'))
+        self.assertEqual(('policy', {'name': 'asset1'}), cache.query_nft_metadata('asset1'))
+        self.assertEqual(('policy', {'name': 'asset1'}), cache.query_nft_metadata('asset1'))
+        self.assertEqual('stake_addr1', cache.query_stake_address('addr1'))
+        self.assertEqual('stake_addr1', cache.query_stake_address('addr1'))
+        self.assertEqual(4, self.database.calls)
+        cache.close()
+        self.assertTrue(self.database.closed)
+
+        # persisted across runs
+        cache = ChainCache(self.cache_file, self.database)
+        self.assertEqual(inputs, cache.query_utxo_inputs('100'))
+        self.assertEqual((datetime.datetime(2022, 1, 1, 0, 0, 40), 100), cache.query_txhash_time('100'))
+        self.assertEqual(4, self.database.calls)
+        self.assertEqual(2, cache.hits)
+        cache.close()
+
+    def test_unconfirmed(self):
+        cache = ChainCache(self.cache_file, self.database, min_depth_slots=600)
+        cache.query_txhash_time('9500')
+        cache.query_txhash_time('9500')
+        self.assertEqual(2, self.database.calls)
+        cache.close()
+
+    def test_evict(self):
+        cache = ChainCache(self.cache_file, self.database, max_entries=20)
+        for i in range(0, 20):
+            cache.query_txhash_time(str(i))
+
+        # keep the first one in use
+        cache.query_txhash_time('0')
+        cache.query_txhash_time('20')
+        self.assertEqual(18, cache.entries)
+        calls = self.database.calls
+        cache.query_txhash_time('0')
+        cache.query_txhash_time('20')
+        self.assertEqual(calls, self.database.calls)
+        cache.query_txhash_time('1')
+        self.assertEqual(calls + 1, self.database.calls)
+        cache.close()
+
+    def test_bulk(self):
+        self.database.query_senders = lambda txids: {txid: {'address': 'addr' + txid, 'stake-address': 'stake' + txid, 'slot': int(txid)} for txid in txids}
+        self.database.query_stake_addresses = lambda addresses: {address: ('stake_' + address if address != 'addr_enterprise' else None) for address in addresses}
+
+        cache = ChainCache(self.cache_file, self.database, min_depth_slots=600)
+        senders = cache.query_senders(['100', '9900'])
+        self.assertEqual('stake100', senders['100']['stake-address'])
+        self.assertEqual(['100'], list(cache.get_many('sender', ['100', '9900']).keys()))
+
+        self.assertEqual({'addr1': 'stake_addr1', 'addr_enterprise': None}, cache.query_stake_addresses(['addr1', 'addr_enterprise']))
+        self.assertEqual('stake_addr1', cache.query_stake_address('addr1'))
+        self.assertEqual(0, self.database.calls)
+        cache.close()
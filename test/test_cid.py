@@ -0,0 +1,70 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_cid.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import shutil
+
+import cid
+
+class TestCid(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-cid'
+        os.makedirs(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_v0(self):
+        self.assertEqual('QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o', cid.calculate_bytes(b'hello world\n'))
+        self.assertEqual('QmbFMke1KXqnYyBBWxB74N4c5SBnJMVAiMNRcGu6x1AwQH', cid.calculate_bytes(b''))
+
+    def test_v1(self):
+        self.assertEqual('bafkreifzjut3te2nhyekklss27nh3k72ysco7y32koao5eei66wof36n5e', cid.calculate_bytes(b'hello world', 1))
+        self.assertEqual('bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku', cid.calculate_bytes(b'', 1))
+
+    def test_version(self):
+        self.assertEqual(0, cid.get_version('QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'))
+        self.assertEqual(1, cid.get_version('bafkreihdwdcefgh4dqkjv67uzcmw7ojee6xedzdetojuzjevtenxquvyku'))
+
+    def test_multiple_chunks(self):
+        # Two levels of links, more than MAX_LINKS chunks
+        data = bytes(range(256)) * (cid.CHUNK_SIZE * (cid.MAX_LINKS + 2) // 256) + b'tail'
+        fname = os.path.join(self.directory, 'image.png')
+        with open(fname, 'wb') as file:
+            file.write(data)
+
+        for version in (0, 1):
+            self.assertEqual(cid.calculate_bytes(data, version), cid.calculate_file(fname, version))
+
+        self.assertTrue(cid.calculate_file(fname, 0).startswith('Qm'))
+        self.assertTrue(cid.calculate_file(fname, 1).startswith('bafybei'))
+        self.assertNotEqual(cid.calculate_bytes(data), cid.calculate_bytes(data[:-1]))
+
+    def test_base58_leading_zeros(self):
+        self.assertEqual('11', cid.encode_base58(b'\x00\x00'))
+        self.assertEqual('112', cid.encode_base58(b'\x00\x00\x01'))
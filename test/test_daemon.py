@@ -0,0 +1,107 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_daemon.py
+Author: Kris Henderson
+"""
+
+import unittest
+import asyncio
+
+import daemon
+from daemon import check_payment_addresses, serve, open_processors
+
+class FakeWallet:
+    def __init__(self, address):
+        self.address = address
+
+    def get_payment_address(self, index, delegated=True):
+        return '{}_{}_{}'.format(self.address, index, delegated)
+
+class FakeProcessor:
+    def __init__(self, failures):
+        self.failures = failures
+        self.count = 0
+
+    def poll_once(self):
+        self.count += 1
+        if self.count <= self.failures:
+            raise Exception('transient')
+        return 0
+
+class FakeCardano:
+    def get_network(self):
+        return 'unittest'
+
+class FakeDatabase:
+    def __init__(self):
+        self.opened = False
+
+    def open(self):
+        self.opened = True
+
+class FakePaymentProcessor:
+    def __init__(self, cardano, database, *args):
+        # the processor reconciles its journal with the database right away
+        if not database.opened:
+            raise Exception('Database not open')
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.payment_processor = daemon.PaymentProcessor
+        daemon.PaymentProcessor = FakePaymentProcessor
+
+    def tearDown(self):
+        daemon.PaymentProcessor = self.payment_processor
+
+    def test_distinct_addresses(self):
+        check_payment_addresses({'drop1': FakeWallet('a'), 'drop2': FakeWallet('b')})
+
+    def test_shared_address(self):
+        with self.assertRaises(Exception):
+            check_payment_addresses({'drop1': FakeWallet('a'), 'drop2': FakeWallet('a')})
+
+    def test_serve(self):
+        processors = {'drop1': FakeProcessor(0), 'drop2': FakeProcessor(3)}
+
+        async def run():
+            try:
+                await asyncio.wait_for(serve(processors, retry_delay=0), 0.5)
+            except asyncio.TimeoutError:
+                pass
+
+        # a failing poll doesn't stop the drop
+        asyncio.run(run())
+        self.assertTrue(processors['drop1'].count > 3)
+        self.assertTrue(processors['drop2'].count > 3)
+
+    def test_open_processors(self):
+        drop = {'wallet': FakeWallet('a'), 'policy': 'policy', 'metadata-set-file': 'drop.json', 'prices': {10000000: 1}, 'max-per-tx': 1}
+        database = FakeDatabase()
+        processors = open_processors(FakeCardano(), database, {'drop1': drop, 'drop2': drop})
+        self.assertTrue(database.opened)
+        self.assertEqual(['drop1', 'drop2'], list(processors))
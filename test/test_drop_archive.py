@@ -0,0 +1,89 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_drop_archive.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+from drop_archive import DropArchive, load_documents
+
+class TestDropArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-drop-archive'
+        self.md_dir = os.path.join(self.directory, 'nft_metadata')
+        self.archive_file = os.path.join(self.directory, 'drop.tcrdrop')
+        self.count = 300
+
+        os.makedirs(self.md_dir)
+        self.files = []
+        for i in range(0, self.count):
+            fname = os.path.join(self.md_dir, 'TCRx002x{:05}x001.json'.format(i))
+            token = {'name': 'Token {}'.format(i), 'id': i, 'image': 'ipfs://Qm{:05}'.format(i), 'tags': ['a', 'ü']}
+            with open(fname, 'w') as file:
+                file.write(json.dumps({'721': {'policy': {'TCRx002x{:05}x001'.format(i): token}}}, indent=4))
+            self.files.append(fname)
+
+        DropArchive.create(self.archive_file, self.files)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_by_index(self):
+        with DropArchive(self.archive_file) as archive:
+            self.assertEqual(self.count, len(archive))
+            for i in range(0, self.count):
+                self.assertEqual(self.files[i], archive.get_name(i))
+                with open(self.files[i], 'r') as file:
+                    self.assertEqual(json.load(file), archive.read(i))
+
+    def test_read_by_name(self):
+        with DropArchive(self.archive_file) as archive:
+            md = archive.read_file(self.files[123])
+            self.assertEqual(123, md['721']['policy']['TCRx002x00123x001']['id'])
+            self.assertEqual(None, archive.find('missing.json'))
+            self.assertRaises(KeyError, archive.read_file, 'missing.json')
+            self.assertRaises(IndexError, archive.read, self.count)
+
+    def test_export(self):
+        export_dir = os.path.join(self.directory, 'export')
+        with DropArchive(self.archive_file) as archive:
+            fnames = archive.export(export_dir)
+
+        self.assertEqual(self.count, len(fnames))
+        for i in range(0, self.count):
+            with open(self.files[i], 'r') as a, open(fnames[i], 'r') as b:
+                self.assertEqual(json.load(a), json.load(b))
+
+    def test_load_documents(self):
+        from_files = list(load_documents(self.md_dir))
+        from_archive = list(load_documents(self.archive_file))
+        self.assertEqual(self.count, len(from_files))
+        self.assertEqual(from_files, from_archive)
+
+    def test_not_an_archive(self):
+        self.assertRaises(Exception, DropArchive, self.files[0])
@@ -0,0 +1,48 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_genwhitelist.py
+Author: Kris Henderson
+"""
+
+import unittest
+
+from genwhitelist import compile_bonus_rules, get_bonus, DEFAULT_HOLDER_BONUS
+
+class TestHolderBonus(unittest.TestCase):
+    def test_default(self):
+        trie = compile_bonus_rules(DEFAULT_HOLDER_BONUS['prefix'])
+        self.assertEqual(3, get_bonus(trie, 'TCRx001x05x00001'))
+        self.assertEqual(3, get_bonus(trie, 'TCRx001x03x00101'))
+        self.assertEqual(2, get_bonus(trie, 'TCRx001x02x00007'))
+        self.assertEqual(1, get_bonus(trie, 'TCRx001x01x00007'))
+        self.assertEqual(0, get_bonus(trie, 'TCRx001x06x00007'))
+        self.assertEqual(0, get_bonus(trie, 'TCRx001x0'))
+        self.assertEqual(0, get_bonus(trie, ''))
+
+    def test_longest_prefix(self):
+        trie = compile_bonus_rules({'A': 1, 'AB': 2, 'ABCD': 4, '': 9})
+        self.assertEqual(9, get_bonus(trie, 'X'))
+        self.assertEqual(1, get_bonus(trie, 'A'))
+        self.assertEqual(2, get_bonus(trie, 'ABC'))
+        self.assertEqual(4, get_bonus(trie, 'ABCDE'))
@@ -0,0 +1,198 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_ipfs_client.py
+Author: Kris Henderson
+"""
+
+import unittest
+import http.server
+import json
+import os
+import shutil
+import threading
+import urllib.parse
+
+import cid
+
+try:
+    from ipfs_client import IpfsClient, UploadManifest, upload_files
+    from car import CarBundle
+except ImportError:
+    IpfsClient = None
+
+class FakeIpfsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Mimics the add, pin/add and pin/ls calls of the IPFS API.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, document):
+        body = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        if 'Content-Length' in self.headers:
+            return self.rfile.read(int(self.headers['Content-Length']))
+
+        # chunked transfer encoding
+        body = b''
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+            if size == 0:
+                return body
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        body = self.read_body()
+        server = self.server
+
+        if url.path == '/api/v0/add':
+            with server.lock:
+                server.adds += 1
+                if server.fail_next > 0:
+                    server.fail_next -= 1
+                    self.reply(503, {'Message': 'busy'})
+                    return
+
+            boundary = self.headers['Content-Type'].split('boundary=')[1].encode('utf-8')
+            part = body.split(b'--' + boundary)[1]
+            content = part.split(b'\r\n\r\n', 1)[1][:-2]
+            self.reply(200, {'Hash': cid.calculate_bytes(content)})
+        elif url.path == '/api/v0/pin/add':
+            with server.lock:
+                server.pins += 1
+                server.pinned.update(query['arg'])
+            self.reply(200, {'Pins': query['arg']})
+        elif url.path == '/api/v0/dag/import':
+            boundary = self.headers['Content-Type'].split('boundary=')[1].encode('utf-8')
+            part = body.split(b'--' + boundary)[1]
+            server.imported = part.split(b'\r\n\r\n', 1)[1][:-2]
+            self.reply(200, {'Root': {'Cid': {'/': server.import_root}, 'PinErrorMsg': ''}})
+        elif url.path == '/api/v0/pin/ls':
+            if query['arg'][0] in server.pinned:
+                self.reply(200, {'Keys': {query['arg'][0]: {'Type': 'recursive'}}})
+            else:
+                self.reply(500, {'Message': 'path is not pinned'})
+        else:
+            self.reply(404, {'Message': 'not found'})
+
+@unittest.skipIf(IpfsClient == None, 'requests is not installed')
+class TestIpfsClient(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-ipfs-client'
+        self.manifest_file = os.path.join(self.directory, 'ipfs_manifest.jsonl')
+        os.makedirs(self.directory)
+
+        self.files = []
+        for i in range(0, 20):
+            fname = os.path.join(self.directory, 'image{:02}.png'.format(i))
+            with open(fname, 'wb') as file:
+                file.write('image {}'.format(i).encode('utf-8') * 100)
+            self.files.append(fname)
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeIpfsHandler)
+        self.server.lock = threading.Lock()
+        self.server.adds = 0
+        self.server.pins = 0
+        self.server.fail_next = 0
+        self.server.pinned = set()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.api_url = 'http://127.0.0.1:{}/api/v0'.format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def expected_cid(self, fname):
+        return cid.calculate_file(fname)
+
+    def test_upload(self):
+        with IpfsClient(None, None, self.api_url) as client:
+            self.assertEqual(self.expected_cid(self.files[0]), client.upload(self.files[0]))
+        self.assertEqual(1, self.server.adds)
+        self.assertEqual(1, self.server.pins)
+
+    def test_upload_files(self):
+        with IpfsClient(None, None, self.api_url) as client, UploadManifest(self.manifest_file) as manifest:
+            cids = upload_files(client, self.files + self.files[:5], manifest, workers=4)
+
+        self.assertEqual(len(self.files), len(cids))
+        for fname in self.files:
+            self.assertEqual(self.expected_cid(fname), cids[fname])
+        self.assertEqual(len(self.files), self.server.adds)
+        self.assertEqual(len(self.files), self.server.pins)
+
+    def test_resume(self):
+        with IpfsClient(None, None, self.api_url) as client, UploadManifest(self.manifest_file) as manifest:
+            upload_files(client, self.files[:8], manifest, workers=4)
+
+        # an interrupted write leaves a partial line
+        with open(self.manifest_file, 'a') as file:
+            file.write('{"sha256": "ab')
+
+        with IpfsClient(None, None, self.api_url) as client, UploadManifest(self.manifest_file) as manifest:
+            self.assertEqual(8, len(manifest))
+            cids = upload_files(client, self.files, manifest, workers=4)
+
+        self.assertEqual(len(self.files), len(cids))
+        self.assertEqual(len(self.files), self.server.adds)
+
+        with UploadManifest(self.manifest_file) as manifest:
+            self.assertEqual(len(self.files), len(manifest))
+
+    def test_already_pinned(self):
+        self.server.pinned.add(self.expected_cid(self.files[0]))
+        self.server.pinned.add(self.expected_cid(self.files[1]))
+        with IpfsClient(None, None, self.api_url) as client, UploadManifest(self.manifest_file) as manifest:
+            cids = upload_files(client, self.files, manifest, workers=4)
+            self.assertEqual(len(self.files), len(manifest))
+
+        self.assertEqual(self.expected_cid(self.files[0]), cids[self.files[0]])
+        self.assertEqual(len(self.files) - 2, self.server.adds)
+
+    def test_dag_import(self):
+        bundle = CarBundle(self.files)
+        self.server.import_root = bundle.get_root()
+        with IpfsClient(None, None, self.api_url) as client:
+            self.assertEqual([bundle.get_root()], client.dag_import(bundle.stream()))
+
+        self.assertEqual(b''.join(bundle.stream()), self.server.imported)
+        self.assertEqual(0, self.server.adds)
+
+    def test_retry(self):
+        self.server.fail_next = 2
+        with IpfsClient(None, None, self.api_url) as client:
+            self.assertEqual(self.expected_cid(self.files[0]), client.upload(self.files[0]))
+        self.assertEqual(3, self.server.adds)
@@ -0,0 +1,84 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_metadata_cache.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+from metadata_cache import MetadataCache
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-metadata-cache'
+        os.makedirs(self.directory)
+        self.files = []
+        for i in range(0, 10):
+            fname = os.path.join(self.directory, 'token{:02}.json'.format(i))
+            self.write(fname, i)
+            self.files.append(fname)
+
+        self.parsed = 0
+        self.cache = MetadataCache(self.parse, max_entries=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, fname, value):
+        with open(fname, 'w') as file:
+            file.write(json.dumps({'value': value}))
+
+    def parse(self, raw):
+        self.parsed += 1
+        return raw['value']
+
+    def test_hit(self):
+        self.assertEqual(3, self.cache.get(self.files[3]))
+        self.assertEqual(3, self.cache.get(self.files[3]))
+        self.assertEqual(1, self.parsed)
+
+    def test_changed_file(self):
+        self.assertEqual(3, self.cache.get(self.files[3]))
+        stat = os.stat(self.files[3])
+        self.write(self.files[3], 300)
+        os.utime(self.files[3], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+        self.assertEqual(300, self.cache.get(self.files[3]))
+        self.assertEqual(2, self.parsed)
+
+    def test_evict_least_recently_used(self):
+        for i in range(0, 4):
+            self.cache.get(self.files[i])
+        self.cache.get(self.files[0])
+        self.cache.get(self.files[4])
+        self.assertEqual(4, len(self.cache))
+
+        # files[1] was the least recently used
+        self.cache.get(self.files[0])
+        self.assertEqual(5, self.parsed)
+        self.cache.get(self.files[1])
+        self.assertEqual(6, self.parsed)
+
@@ -88,3 +88,11 @@ class TestMetadataList(unittest.TestCase):
             self.metadata_list.commit()
             self.assertEqual('file{:04}.json'.format(i), fname)
             self.metadata_list = MetadataList(self.filename)
+
+    def test_remove_files(self):
+        self.assertEqual(2, self.metadata_list.remove_files(['file0000.json', 'file0002.json', 'missing.json']))
+        self.assertEqual(0, self.metadata_list.remove_files(['file0000.json']))
+        self.assertEqual(self.count - 2, self.metadata_list.get_remaining())
+        list2 = MetadataList(self.filename)
+        self.assertEqual('file0001.json', list2.peek_next_file())
+        self.assertEqual('file0003.json', list2.peek_next_file())
@@ -0,0 +1,60 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_metadata_writer.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+from metadata_writer import MetadataWriter
+
+class TestMetadataWriter(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-metadata-writer/nft_metadata'
+        self.count = 500
+
+    def tearDown(self):
+        shutil.rmtree('unittest-metadata-writer')
+
+    def test_write_all(self):
+        fnames = []
+        with MetadataWriter(self.directory, workers=4, max_pending=8) as writer:
+            for i in range(0, self.count):
+                document = {'721': {'policy': {'token{:04}'.format(i): {'name': 'Token {}'.format(i), 'id': i}}}}
+                fnames.append(writer.write('token{:04}'.format(i), document))
+
+        self.assertEqual(self.count, len(os.listdir(self.directory)))
+        for i in range(0, self.count):
+            self.assertEqual('{}/token{:04}.json'.format(self.directory, i), fnames[i])
+            with open(fnames[i], 'r') as file:
+                document = json.load(file)
+                self.assertEqual(i, document['721']['policy']['token{:04}'.format(i)]['id'])
+
+    def test_close_raises_write_error(self):
+        writer = MetadataWriter(self.directory)
+        writer.write('missing/token', {'721': {}})
+        self.assertRaises(FileNotFoundError, writer.close)
@@ -0,0 +1,108 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_mint_journal.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import shutil
+
+from mint_journal import MintJournal
+
+class TestMintJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-mint-journal'
+        self.journal_file = os.path.join(self.directory, 'mint_journal.jsonl')
+        os.makedirs(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reserve(self, journal, i):
+        utxo = {'tx-hash': 'hash{}'.format(i), 'tx-ix': 0, 'amount': 10000000}
+        return journal.reserve([{'utxo': utxo, 'count': 2}], ['file{}a.json'.format(i), 'file{}b.json'.format(i)])
+
+    def test_states(self):
+        journal = MintJournal(self.journal_file)
+        first = self.reserve(journal, 1)
+        second = self.reserve(journal, 2)
+        third = self.reserve(journal, 3)
+        journal.built(first, 'txid1', {'cborHex': '00'})
+        journal.submitted(first, 'txid1')
+        journal.confirmed(first)
+        journal.built(second, 'txid2', {'cborHex': '01'})
+        journal.failed(third)
+        journal.close()
+
+        journal = MintJournal(self.journal_file)
+        unresolved = journal.get_unresolved()
+        self.assertEqual(1, len(unresolved))
+        self.assertEqual(second, unresolved[0]['id'])
+        self.assertEqual(MintJournal.BUILT, unresolved[0]['state'])
+        self.assertEqual('txid2', unresolved[0]['txid'])
+        self.assertEqual({'cborHex': '01'}, unresolved[0]['signed-tx'])
+        self.assertEqual(['file2a.json', 'file2b.json'], unresolved[0]['files'])
+        self.assertEqual([{'tx-hash': 'hash2', 'tx-ix': 0, 'amount': 10000000, 'count': 2}], unresolved[0]['inputs'])
+
+        # ids keep increasing after a reopen
+        self.assertEqual(4, self.reserve(journal, 4))
+        journal.close()
+
+    def test_compact(self):
+        journal = MintJournal(self.journal_file)
+        for i in range(0, 10):
+            journal_id = self.reserve(journal, i)
+            journal.built(journal_id, 'txid{}'.format(i), {})
+            journal.submitted(journal_id, 'txid{}'.format(i))
+            if i != 7:
+                journal.confirmed(journal_id)
+
+        journal.compact()
+        with open(self.journal_file, 'r') as file:
+            self.assertEqual(1, len(file.readlines()))
+
+        last = self.reserve(journal, 10)
+        journal.close()
+
+        journal = MintJournal(self.journal_file)
+        self.assertEqual([8, last], [entry['id'] for entry in journal.get_unresolved()])
+        self.assertEqual(MintJournal.SUBMITTED, journal.get_entry(8)['state'])
+        journal.close()
+
+    def test_partial_record(self):
+        journal = MintJournal(self.journal_file)
+        first = self.reserve(journal, 1)
+        journal.close()
+        with open(self.journal_file, 'a') as file:
+            file.write('{"id": 1, "state": "bui')
+
+        journal = MintJournal(self.journal_file)
+        self.assertEqual(MintJournal.RESERVE, journal.get_entry(first)['state'])
+        journal.failed(first)
+        journal.close()
+
+        journal = MintJournal(self.journal_file)
+        self.assertEqual(MintJournal.FAILED, journal.get_entry(first)['state'])
+        journal.close()
@@ -0,0 +1,125 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_mint_shards.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+from metadata_list import MetadataList
+from mint_shards import ShardCoordinator, get_shard_metadata_set_file
+
+class FakeProcess:
+    def __init__(self, alive):
+        self.alive = alive
+
+    def is_alive(self):
+        self.alive -= 1
+        return self.alive >= 0
+
+class TestMintShards(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-mint-shards'
+        self.metadata_set_file = os.path.join(self.directory, 'drop.json')
+        self.count = 100
+        os.makedirs(self.directory)
+        with open(self.metadata_set_file, 'w') as file:
+            file.write(json.dumps({'files': ['file{:03}.json'.format(i) for i in range(0, self.count)]}))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_disjoint(self):
+        coordinator = ShardCoordinator(self.metadata_set_file, 3, range_size=7)
+        allocated = []
+        for i in range(0, 20):
+            files = coordinator.allocate(i % 3, 5)
+            allocated.extend(files)
+
+        self.assertEqual(self.count, len(allocated))
+        self.assertEqual(len(allocated), len(set(allocated)))
+        self.assertEqual([], coordinator.allocate(0, 5))
+        self.assertEqual(0, MetadataList(self.metadata_set_file).get_remaining())
+
+    def test_recover(self):
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=10)
+        self.assertEqual(os.path.join(self.directory, 'drop_shard1.json'), coordinator.shard_files[1])
+        files = coordinator.allocate(1, 1)
+        self.assertEqual(10, len(files))
+
+        # the shard saved its range but the drop list was never saved
+        shard_metadata = MetadataList(get_shard_metadata_set_file(self.metadata_set_file, 1))
+        shard_metadata.append_files(files)
+        with open(self.metadata_set_file, 'w') as file:
+            file.write(json.dumps({'files': ['file{:03}.json'.format(i) for i in range(0, self.count)]}))
+
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=10)
+        self.assertEqual(self.count - 10, coordinator.metadata.get_remaining())
+        self.assertEqual('file010.json', coordinator.allocate(0, 1)[0])
+
+    def test_release(self):
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=60)
+        files = coordinator.allocate(0, 1)
+        self.assertEqual(60, len(files))
+        self.assertEqual(40, len(coordinator.allocate(1, 1)))
+
+        # shard 1 used up its range but shard 0 may still give some back
+        self.assertEqual([], coordinator.allocate(1, 1))
+        self.assertFalse(coordinator.is_sold_out(1))
+
+        coordinator.release(0, files[10:])
+        self.assertFalse(coordinator.is_sold_out(1))
+        self.assertEqual(files[10:], coordinator.allocate(1, 1))
+
+        # shard 1 holds the last files
+        self.assertFalse(coordinator.is_sold_out(0))
+        coordinator.release(1, [])
+        self.assertTrue(coordinator.is_sold_out(0))
+        self.assertTrue(coordinator.is_sold_out(1))
+
+    def test_recover_held(self):
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=100)
+        files = coordinator.allocate(1, 1)
+        MetadataList(get_shard_metadata_set_file(self.metadata_set_file, 1)).append_files(files)
+
+        # after a restart the coordinator still knows shard 1 has them
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=100)
+        self.assertEqual([], coordinator.allocate(0, 1))
+        self.assertFalse(coordinator.is_sold_out(0))
+
+    def test_dead_shard(self):
+        coordinator = ShardCoordinator(self.metadata_set_file, 2, range_size=100)
+        files = coordinator.allocate(1, 1)
+        MetadataList(get_shard_metadata_set_file(self.metadata_set_file, 1)).append_files(files)
+        self.assertFalse(coordinator.is_sold_out(0))
+
+        # shard 1 exits while shard 0 is still running
+        coordinator.serve([FakeProcess(2), FakeProcess(0)])
+        self.assertEqual(0, coordinator.held[1])
+        self.assertEqual(self.count, coordinator.metadata.get_remaining())
+        self.assertEqual(0, MetadataList(get_shard_metadata_set_file(self.metadata_set_file, 1)).get_remaining())
+        self.assertEqual(files[:10], coordinator.allocate(0, 10)[:10])
@@ -0,0 +1,104 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_mint_verify.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+from mint_verify import MintVerifier
+
+class TestMintVerify(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-mint-verify'
+        self.manifest_file = os.path.join(self.directory, 'verify_manifest.json')
+        self.count = 100
+
+        os.makedirs(self.directory)
+        self.files = []
+        for i in range(0, self.count):
+            fname = os.path.join(self.directory, 'TCRx002x{:05}x001.json'.format(i))
+            self.write(fname, 'policy', i, 'ipfs://Qm{:05}'.format(i))
+            self.files.append(fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, fname, policy_id, i, image):
+        token = {'name': 'Token {}'.format(i), 'image': image}
+        with open(fname, 'w') as file:
+            file.write(json.dumps({'721': {policy_id: {'TCRx002x{:05}x001'.format(i): token}}}))
+
+    def test_verify(self):
+        verifier = MintVerifier(self.manifest_file, 'policy', workers=2)
+        self.assertEqual([], verifier.verify(self.files))
+        self.assertEqual(self.count, verifier.checked)
+        self.assertTrue(os.path.isfile(self.manifest_file))
+
+    def test_failures(self):
+        self.write(self.files[3], 'policy', 3, 'images/TCRx002x00003x001.png')
+        self.write(self.files[5], 'other', 5, 'ipfs://Qm00005')
+        with open(self.files[7], 'w') as file:
+            file.write('{"721": {"policy": {"a": {"image": "ipfs://a"}, "b": {"image": "ipfs://b"}}}}')
+
+        failures = MintVerifier(self.manifest_file, 'policy').verify(self.files)
+        self.assertEqual([(self.files[3], 'Image not uploaded to IPFS'),
+                          (self.files[5], 'Policy ID mismatch'),
+                          (self.files[7], 'There should only be one token name')], failures)
+
+    def test_only_changed_files(self):
+        MintVerifier(self.manifest_file, 'policy').verify(self.files)
+
+        verifier = MintVerifier(self.manifest_file, 'policy')
+        self.assertEqual([], verifier.verify(self.files))
+        self.assertEqual(0, verifier.checked)
+        self.assertEqual(self.count, verifier.reused)
+
+        self.write(self.files[10], 'policy', 10, 'images/TCRx002x00010x001.png')
+        verifier = MintVerifier(self.manifest_file, 'policy')
+        self.assertEqual([(self.files[10], 'Image not uploaded to IPFS')], verifier.verify(self.files))
+        self.assertEqual(1, verifier.checked)
+
+    def test_policy_change(self):
+        MintVerifier(self.manifest_file, 'policy').verify(self.files)
+
+        verifier = MintVerifier(self.manifest_file, 'other')
+        self.assertEqual(self.count, len(verifier.verify(self.files)))
+        self.assertEqual(self.count, verifier.checked)
+
+    def test_broken_seal(self):
+        MintVerifier(self.manifest_file, 'policy').verify(self.files)
+        with open(self.manifest_file, 'r') as file:
+            manifest = json.load(file)
+        manifest['files'][self.files[0]]['verdict'] = 'forged'
+        with open(self.manifest_file, 'w') as file:
+            file.write(json.dumps(manifest))
+
+        verifier = MintVerifier(self.manifest_file, 'policy')
+        self.assertEqual([], verifier.verify(self.files))
+        self.assertEqual(self.count, verifier.checked)
+
@@ -0,0 +1,47 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_nft.py
+Author: Kris Henderson
+"""
+
+import unittest
+import numpy
+
+from nft import Nft
+
+class TestNft(unittest.TestCase):
+    def test_card_order_counts(self):
+        counts = [5, 1, 30, 0, 12]
+        order = Nft.get_card_order(counts, numpy.random.RandomState(1))
+        self.assertEqual(sum(counts), len(order))
+        for card_index in range(0, len(counts)):
+            self.assertEqual(counts[card_index], order.count(card_index))
+
+    def test_card_order_seed(self):
+        counts = [10, 20, 30]
+        order1 = Nft.get_card_order(counts, numpy.random.RandomState(7))
+        order2 = Nft.get_card_order(counts, numpy.random.RandomState(7))
+        order3 = Nft.get_card_order(counts, numpy.random.RandomState(8))
+        self.assertEqual(order1, order2)
+        self.assertNotEqual(order1, order3)
@@ -0,0 +1,119 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_ownership.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import shutil
+
+from ownership import OwnershipStore
+
+class FakeDatabase:
+    """
+    Chain of blocks, each a list of created outputs and a list of spent
+    (tx hash, tx index) pairs.
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.spent = {}
+
+    def add_block(self, outputs, spends):
+        block_id = len(self.blocks) + 1
+        for output in outputs:
+            output['block-id'] = block_id
+            output['slot'] = block_id * 20
+        for spend in spends:
+            self.spent[spend] = block_id
+        self.blocks.append(outputs)
+
+    def query_latest_block_id(self):
+        return len(self.blocks)
+
+    def query_policy_outputs(self, policy_ids, after_block_id, to_block_id, unspent=False):
+        outputs = []
+        for block in self.blocks[after_block_id:to_block_id]:
+            for output in block:
+                if not output['policy-id'] in policy_ids:
+                    continue
+
+                spent = self.spent.get((output['tx-hash'], output['tx-ix']))
+                if unspent and spent != None and spent <= to_block_id:
+                    continue
+
+                outputs.append(output)
+
+        return outputs
+
+    def query_policy_spends(self, policy_ids, after_block_id, to_block_id):
+        return [spend for spend in self.spent if self.spent[spend] > after_block_id and self.spent[spend] <= to_block_id]
+
+def output(tx_hash, name, address, policy_id='policy'):
+    return {'tx-hash': tx_hash, 'tx-ix': 0, 'policy-id': policy_id, 'name': name, 'quantity': 1, 'address': address}
+
+class TestOwnership(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-ownership'
+        self.store_file = os.path.join(self.directory, 'ownership.db')
+        os.makedirs(self.directory)
+
+        self.database = FakeDatabase()
+        self.database.add_block([output('a', 'TOKEN1', 'stake1'), output('b', 'TOKEN2', 'stake1')], [])
+        self.database.add_block([output('c', 'TOKEN1', 'stake2')], [('a', 0)])
+        self.database.add_block([output('d', 'OTHER1', 'stake3', 'other')], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_bootstrap(self):
+        store = OwnershipStore(self.store_file, self.database, confirmations=0)
+        store.add_policy('policy')
+        self.assertEqual(3, store.get_watermark())
+        self.assertEqual({'TOKEN1': {'address': 'stake2', 'slot': 40},
+                          'TOKEN2': {'address': 'stake1', 'slot': 20}}, store.get_owners('policy'))
+        self.assertEqual({}, store.get_owners('other'))
+        store.close()
+
+    def test_update(self):
+        store = OwnershipStore(self.store_file, self.database, confirmations=1)
+        store.add_policy('policy')
+        self.assertEqual(2, store.get_watermark())
+        self.assertEqual(0, store.update())
+
+        self.database.add_block([output('e', 'TOKEN2', 'stake3')], [('b', 0)])
+        self.database.add_block([output('f', 'TOKEN1', 'stake4')], [('c', 0)])
+        self.assertEqual(2, store.update())
+        self.assertEqual(4, store.get_watermark())
+        self.assertEqual({'TOKEN1': {'address': 'stake2', 'slot': 40},
+                          'TOKEN2': {'address': 'stake3', 'slot': 80}}, store.get_owners('policy'))
+        store.close()
+
+        store = OwnershipStore(self.store_file, self.database, confirmations=0)
+        self.assertEqual(['policy'], store.get_policies())
+        self.assertEqual(1, store.update())
+        self.assertEqual({'TOKEN1': {'address': 'stake4', 'slot': 100},
+                          'TOKEN2': {'address': 'stake3', 'slot': 80}}, store.get_owners('policy'))
+        store.close()
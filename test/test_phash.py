@@ -0,0 +1,72 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_phash.py
+Author: Kris Henderson
+"""
+
+import unittest
+import random
+
+from phash import BKTree, hamming_distance
+
+class TestBKTree(unittest.TestCase):
+    def setUp(self):
+        self.rng = random.Random(1234)
+        self.hashes = [self.rng.getrandbits(256) for i in range(0, 2000)]
+        self.tree = BKTree()
+        for i in range(0, len(self.hashes)):
+            self.tree.add(self.hashes[i], 'image{:04}.png'.format(i))
+
+    def test_hamming_distance(self):
+        self.assertEqual(0, hamming_distance(0b1011, 0b1011))
+        self.assertEqual(2, hamming_distance(0b1011, 0b0001))
+
+    def test_length(self):
+        self.assertEqual(len(self.hashes), len(self.tree))
+
+    def test_exact_match(self):
+        matches = self.tree.search(self.hashes[100], 0)
+        self.assertEqual([(0, 'image0100.png')], matches)
+
+    def test_near_match(self):
+        # flip 3 bits of an existing hash
+        value = self.hashes[42] ^ (1 << 7) ^ (1 << 100) ^ (1 << 200)
+        self.assertEqual([], self.tree.search(value, 2))
+        self.assertEqual([(3, 'image0042.png')], self.tree.search(value, 3))
+
+    def test_matches_linear_scan(self):
+        query = self.rng.getrandbits(256)
+        expected = []
+        for i in range(0, len(self.hashes)):
+            distance = hamming_distance(query, self.hashes[i])
+            if distance <= 120:
+                expected.append((distance, 'image{:04}.png'.format(i)))
+        expected.sort()
+
+        matches = self.tree.search(query, 120)
+        matches.sort()
+        self.assertEqual(expected, matches)
+
+    def test_empty(self):
+        self.assertEqual([], BKTree().search(0, 10))
@@ -0,0 +1,95 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_rarity.py
+Author: Kris Henderson
+"""
+
+import unittest
+import json
+import os
+import shutil
+
+from rarity import TraitTable, load_tokens, parse_combos
+
+class TestRarity(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-rarity'
+        os.makedirs(self.directory)
+
+        self.tokens = []
+        for i in range(0, 12):
+            token = {'name': 'Token {}'.format(i),
+                     'image': 'ipfs://Qm{:05}'.format(i),
+                     'color': ['red', 'green', 'blue'][i % 3],
+                     'size': ['small', 'large'][i % 2],
+                     'tags': ['a', 'b'] if i == 0 else ['a']}
+            if i != 5:
+                token['hat'] = 'cap'
+            fname = os.path.join(self.directory, 'TCRx001x{:05}x001.json'.format(i))
+            with open(fname, 'w') as file:
+                file.write(json.dumps({'721': {'policy': {'TCRx001x{:05}x001'.format(i): token}}}))
+            self.tokens.append((fname, token))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load(self):
+        self.assertEqual(self.tokens, load_tokens(self.directory, workers=2))
+
+    def test_counts(self):
+        table = TraitTable(self.tokens)
+        self.assertEqual(['color', 'size', 'tags', 'hat'], table.traits)
+
+        (labels, counts, inverse) = table.counts(('color',))
+        self.assertEqual(['blue', 'green', 'red'], labels)
+        self.assertEqual([4, 4, 4], counts.tolist())
+        self.assertEqual('red', labels[inverse[0]])
+
+        (labels, counts, inverse) = table.counts(('hat',))
+        self.assertEqual({'cap': 11, '<none>': 1}, dict(zip(labels, counts.tolist())))
+
+        self.assertEqual((['a', 'b'], [12, 1]), (table.list_counts('tags')[0], table.list_counts('tags')[1].tolist()))
+
+    def test_combination(self):
+        table = TraitTable(self.tokens)
+        (labels, counts, inverse) = table.counts(('color', 'size'))
+        self.assertEqual(6, len(labels))
+        self.assertEqual([2] * 6, counts.tolist())
+        for i in range(0, len(self.tokens)):
+            token = self.tokens[i][1]
+            self.assertEqual('{}+{}'.format(token['color'], token['size']), labels[inverse[i]])
+
+    def test_parse_combos(self):
+        traits = ['color', 'size', 'hat']
+        self.assertEqual([('color', 'size')], parse_combos(['color+size'], traits))
+        self.assertEqual([('color', 'size'), ('color', 'hat'), ('size', 'hat')], parse_combos(['2'], traits))
+
+    def test_scores(self):
+        table = TraitTable(self.tokens)
+        scores = table.scores()
+        # token 5 is the only one without a hat and token 0 has the only b tag
+        order = scores['rarity'].argsort()[::-1].tolist()
+        self.assertEqual(set([0, 5]), set(order[:2]))
+        self.assertEqual(set([0, 5]), set(scores['statistical'].argsort()[:2].tolist()))
+        self.assertEqual(len(self.tokens), len(scores['normalized']))
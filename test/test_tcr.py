@@ -0,0 +1,334 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_tcr.py
+Author: Kris Henderson
+"""
+
+import unittest
+import os
+import json
+import shutil
+
+import tcr.tcr
+from tcr.sales import Sales
+from tcr.metadata_list import MetadataList
+from tcr.mint_journal import MintJournal
+
+class FakeWallet:
+    def get_name(self):
+        return 'wallet'
+
+    def get_payment_address(self, index, delegated=True):
+        return 'addr_{}'.format(index)
+
+    def get_signing_key_file(self, index):
+        return 'key_{}'.format(index)
+
+class FakeCardano:
+    def __init__(self, utxos):
+        self.utxos = utxos
+
+    def get_network(self):
+        return 'unittest'
+
+    def query_utxos(self, wallet, addresses=None):
+        utxos = list(self.utxos.values())
+        return (utxos, sum([utxo['amount'] for utxo in utxos]))
+
+class FakeRefundCardano:
+    def __init__(self, fee, submit_ok=True):
+        self.fee = fee
+        self.submit_ok = submit_ok
+        self.transactions = []
+
+    def create_transfer_transaction_file(self, utxo_inputs, address_outputs, fee_amount, transaction_file):
+        if fee_amount > 0:
+            self.transactions.append((list(utxo_inputs), [dict(output) for output in address_outputs], fee_amount))
+
+    def calculate_min_fee(self, transaction_file, tx_in_count, tx_out_count, witness_count):
+        return self.fee
+
+    def sign_transaction(self, unsigned_transaction_file, signing_key_file, signed_transaction_file):
+        pass
+
+    def submit_transaction(self, transaction_file):
+        if not self.submit_ok:
+            return None
+        return 'refund{}'.format(len(self.transactions))
+
+class FakeSendersDatabase:
+    def __init__(self, senders):
+        self.senders = senders
+
+    def query_senders(self, txids):
+        return {txid: {'address': self.senders[txid], 'stake-address': None, 'slot': 1} for txid in txids if txid in self.senders}
+
+class TestRefundPayments(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = os.path.abspath('unittest-refund-payments')
+        os.makedirs(os.path.join(self.directory, 'nft', 'unittest', 'drop'))
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def utxo(self, hash, ix, amount):
+        return {'tx-hash': hash, 'tx-ix': ix, 'amount': amount, 'assets': {}}
+
+    def test_split_fee(self):
+        for (fee, amounts) in [(170000, [10000000, 20000000, 30000000]),
+                               (200001, [3333333, 3333333, 3333334]),
+                               (7, [1, 1, 1]),
+                               (181517, [5000000, 12345678, 1, 99999999])]:
+            shares = tcr.tcr.split_fee(fee, amounts)
+            self.assertEqual(fee, sum(shares))
+
+        # Rounded down the shares are [2, 5, 2], the remaining 1 goes to the largest amount
+        self.assertEqual([2, 6, 2], tcr.tcr.split_fee(10, [1, 2, 1]))
+        self.assertEqual([2, 3, 5], tcr.tcr.split_fee(10, [20, 30, 50]))
+
+    def test_refund(self):
+        cardano = FakeRefundCardano(1000)
+        database = FakeSendersDatabase({'a': 'addr_a', 'b': 'addr_b'})
+        sales = Sales('unittest', 'drop')
+        utxos = [self.utxo('a', 0, 10000000), self.utxo('a', 1, 30000000), self.utxo('b', 0, 20000000)]
+
+        self.assertEqual(3, tcr.tcr.refund_payments(cardano, database, FakeWallet(), utxos, sales))
+        self.assertEqual(1, len(cardano.transactions))
+        (inputs, outputs, fee) = cardano.transactions[0]
+        self.assertEqual(1000, fee)
+        self.assertEqual({'addr_a': 40000000 - 667, 'addr_b': 20000000 - 333},
+                         {output['address']: output['amount'] for output in outputs})
+        for utxo in utxos:
+            self.assertTrue(sales.contains(utxo['tx-hash'], utxo['tx-ix']))
+
+    def test_max_inputs(self):
+        cardano = FakeRefundCardano(1000)
+        database = FakeSendersDatabase({'a': 'addr_a'})
+        utxos = [self.utxo('a', i, 5000000) for i in range(0, 7)]
+
+        self.assertEqual(7, tcr.tcr.refund_payments(cardano, database, FakeWallet(), utxos, max_inputs=3))
+        self.assertEqual([3, 3, 1], [len(inputs) for (inputs, outputs, fee) in cardano.transactions])
+        for (inputs, outputs, fee) in cardano.transactions:
+            self.assertEqual(['addr_a'], [output['address'] for output in outputs])
+            self.assertEqual(sum([utxo['amount'] for utxo in inputs]) - fee, outputs[0]['amount'])
+
+    def test_submit_failed(self):
+        cardano = FakeRefundCardano(1000, submit_ok=False)
+        database = FakeSendersDatabase({'a': 'addr_a', 'b': 'addr_b'})
+        sales = Sales('unittest', 'drop')
+        utxos = [self.utxo('a', 0, 10000000), self.utxo('b', 0, 20000000)]
+
+        self.assertEqual(0, tcr.tcr.refund_payments(cardano, database, FakeWallet(), utxos, sales))
+        for utxo in utxos:
+            self.assertFalse(sales.contains(utxo['tx-hash'], utxo['tx-ix']))
+        self.assertFalse(Sales('unittest', 'drop').contains('a', 0))
+
+class TestProcessWhitelist(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = os.path.abspath('unittest-process-whitelist')
+        os.makedirs(os.path.join(self.directory, 'nft', 'unittest', 'drop'))
+        os.chdir(self.directory)
+
+        self.metadata_set_file = 'nft/unittest/drop/drop.json'
+        with open(self.metadata_set_file, 'w') as file:
+            file.write(json.dumps({'files': ['file{:03}.json'.format(i) for i in range(0, 20)]}))
+
+        self.batches = []
+        self.results = []
+        self.mint_whitelist_batch = tcr.tcr.mint_whitelist_batch
+        tcr.tcr.mint_whitelist_batch = self.fake_mint_whitelist_batch
+
+    def tearDown(self):
+        tcr.tcr.mint_whitelist_batch = self.mint_whitelist_batch
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def fake_mint_whitelist_batch(self, cardano, database, minting_wallet, policy_name, nft_metadata, input_utxos, sales, merged_archive, journal):
+        self.batches.append([item['count'] for item in input_utxos])
+        if len(self.results) > 0 and not self.results.pop(0):
+            return False
+
+        for item in input_utxos:
+            for i in range(0, item['count']):
+                nft_metadata.peek_next_file()
+            del cardano.utxos[(item['utxo']['tx-hash'], item['utxo']['tx-ix'])]
+        nft_metadata.commit()
+        return True
+
+    def process(self, counts, max_failed_passes=3):
+        utxos = {}
+        payments = []
+        for i in range(0, len(counts)):
+            utxos[('tx{}'.format(i), 0)] = {'tx-hash': 'tx{}'.format(i), 'tx-ix': 0, 'amount': 10000000}
+            payments.append({'utxo-txid': 'tx{}'.format(i), 'utxo-txix': 0, 'from-stake-addr': 'stake', 'nfts': counts[i]})
+
+        cardano = FakeCardano(utxos)
+        tcr.tcr.process_whitelist(cardano, None, FakeWallet(), 'policy', 'drop', self.metadata_set_file,
+                                  payments, 5, poll_interval=0, max_failed_passes=max_failed_passes)
+        return cardano
+
+    def test_batches(self):
+        cardano = self.process([2, 3, 1, 4, 5])
+        self.assertEqual([[2, 3], [1, 4], [5]], self.batches)
+        self.assertEqual({}, cardano.utxos)
+
+    def test_retry(self):
+        # The second batch fails once and is minted on the next pass
+        self.results = [True, False, True]
+        cardano = self.process([2, 3, 1, 4, 5])
+        self.assertEqual([[2, 3], [1, 4], [5], [1, 4]], self.batches)
+        self.assertEqual({}, cardano.utxos)
+
+    def test_retry_all_failed(self):
+        # A pass that submits nothing is tried again
+        self.results = [False, False]
+        cardano = self.process([2, 3])
+        self.assertEqual([[2, 3], [2, 3], [2, 3]], self.batches)
+        self.assertEqual({}, cardano.utxos)
+
+    def test_not_minted(self):
+        self.results = [False] * 10
+        self.assertRaises(Exception, self.process, [2, 3], 3)
+        self.assertEqual([[2, 3], [2, 3], [2, 3]], self.batches)
+
+class FakeChain:
+    """
+    Cardano and Database for reconcile_mint_journal.
+    """
+
+    def __init__(self, latest_slot):
+        self.latest_slot = latest_slot
+        self.on_chain = {}
+        self.submits = 0
+
+    def submit_transaction(self, transaction_file):
+        self.submits += 1
+        raise Exception('BadInputsUTxO')
+
+    def query_txhash_time(self, txhash):
+        if txhash in self.on_chain:
+            return ('time', self.on_chain[txhash])
+        return (None, None)
+
+    def query_latest_slot(self):
+        return self.latest_slot
+
+class TestReconcileMintJournal(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = os.path.abspath('unittest-reconcile-mint-journal')
+        os.makedirs(os.path.join(self.directory, 'nft', 'unittest', 'drop'))
+        os.makedirs(os.path.join(self.directory, 'transaction'))
+        os.chdir(self.directory)
+
+        self.files = ['file{:03}.json'.format(i) for i in range(0, 5)]
+        with open('drop.json', 'w') as file:
+            file.write(json.dumps({'files': self.files}))
+
+        self.journal = MintJournal('journal.jsonl')
+        self.journal_id = self.journal.reserve([{'utxo': {'tx-hash': 'pay', 'tx-ix': 0, 'amount': 10000000}, 'count': 2}], self.files[0:2])
+        self.journal.built(self.journal_id, 'mint', {'cborHex': '00'}, 1000)
+
+    def tearDown(self):
+        self.journal.close()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def reconcile(self, chain):
+        nft_metadata = MetadataList('drop.json')
+        sales = Sales('unittest', 'drop')
+        tcr.tcr.reconcile_mint_journal(chain, chain, self.journal, nft_metadata, sales)
+        return (nft_metadata, sales)
+
+    def test_built_held(self):
+        # Not on chain and before the TTL, the payment and files stay held
+        chain = FakeChain(900)
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(1, chain.submits)
+        self.assertEqual(MintJournal.BUILT, self.journal.get_entry(self.journal_id)['state'])
+        self.assertTrue(sales.contains('pay', 0))
+        self.assertEqual(3, nft_metadata.get_remaining())
+
+        # Lands later
+        chain.on_chain['mint'] = 950
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(MintJournal.CONFIRMED, self.journal.get_entry(self.journal_id)['state'])
+        self.assertTrue(sales.contains('pay', 0))
+        self.assertEqual(3, nft_metadata.get_remaining())
+
+    def test_built_expired(self):
+        chain = FakeChain(900)
+        self.reconcile(chain)
+
+        # Past the TTL without the transaction, the payment and files are released
+        chain.latest_slot = 1001
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(MintJournal.FAILED, self.journal.get_entry(self.journal_id)['state'])
+        self.assertFalse(sales.contains('pay', 0))
+        self.assertEqual(5, nft_metadata.get_remaining())
+        self.assertEqual([], self.journal.get_unresolved())
+
+    def test_submitted_never_lands(self):
+        self.journal.submitted(self.journal_id, 'mint')
+
+        # Still waiting for a block, not submitted again yet
+        chain = FakeChain(900)
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(0, chain.submits)
+        self.assertEqual(MintJournal.SUBMITTED, self.journal.get_entry(self.journal_id)['state'])
+        self.assertTrue(sales.contains('pay', 0))
+        self.assertEqual(3, nft_metadata.get_remaining())
+
+        # Dropped from the mempool, submitted again
+        self.journal.get_entry(self.journal_id)['time'] -= tcr.tcr.MINT_RESUBMIT_DELAY + 1
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(1, chain.submits)
+        self.assertEqual(MintJournal.SUBMITTED, self.journal.get_entry(self.journal_id)['state'])
+        self.assertEqual(3, nft_metadata.get_remaining())
+
+        chain.latest_slot = 1001
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(MintJournal.FAILED, self.journal.get_entry(self.journal_id)['state'])
+        self.assertFalse(sales.contains('pay', 0))
+        self.assertEqual(5, nft_metadata.get_remaining())
+
+    def test_no_ttl(self):
+        journal_id = self.journal.reserve([{'utxo': {'tx-hash': 'old', 'tx-ix': 0, 'amount': 10000000}, 'count': 1}], self.files[2:3])
+        self.journal.built(journal_id, 'old-mint', {'cborHex': '00'})
+
+        chain = FakeChain(900)
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(MintJournal.BUILT, self.journal.get_entry(journal_id)['state'])
+        self.assertTrue(sales.contains('old', 0))
+
+        # Journaled before the TTL was recorded, given up on after a while
+        self.journal.get_entry(journal_id)['time'] -= tcr.tcr.MINT_LEGACY_TTL + 1
+        (nft_metadata, sales) = self.reconcile(chain)
+        self.assertEqual(MintJournal.FAILED, self.journal.get_entry(journal_id)['state'])
+        self.assertFalse(sales.contains('old', 0))
+        self.assertEqual(3, nft_metadata.get_remaining())
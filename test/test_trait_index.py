@@ -0,0 +1,122 @@
+# Copyright 2022 Kristofer Henderson
+#
+# MIT License:
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is furnished
+# to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+File: test_trait_index.py
+Author: Kris Henderson
+"""
+
+import unittest
+import json
+import os
+import shutil
+import time
+
+from drop_archive import DropArchive
+from trait_index import TraitIndex, parse_query, tokenize
+
+class TestTraitIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = 'unittest-trait-index'
+        os.makedirs(self.directory)
+
+        self.files = []
+        for i in range(0, 30):
+            token = {'name': 'Token {}'.format(i),
+                     'color': ['red', 'green', 'blue'][i % 3],
+                     'size': ['small', 'large'][i % 2],
+                     'hat': 'top hat' if i % 5 == 0 else 'cap',
+                     'tags': ['a', 'b'] if i < 10 else ['a']}
+            self.files.append(self.write(i, token))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, i, token):
+        fname = os.path.join(self.directory, 'TCRx001x{:05}x001.json'.format(i))
+        with open(fname, 'w') as file:
+            file.write(json.dumps({'721': {'policy': {'TCRx001x{:05}x001'.format(i): token}}}))
+        return fname
+
+    def expected(self, numbers):
+        return sorted([self.files[i] for i in numbers])
+
+    def test_query(self):
+        index = TraitIndex(self.directory)
+        self.assertEqual(30, index.update())
+
+        self.assertEqual(self.expected(range(0, 30, 3)), index.search('color=red'))
+        self.assertEqual(self.expected(range(0, 30, 6)), index.search('color=red AND size=small'))
+        self.assertEqual(self.expected(range(0, 30, 6)), index.search('color=red,size=small'))
+        self.assertEqual(self.expected([i for i in range(0, 30) if i % 3 != 1]), index.search('color=red or color=blue'))
+        self.assertEqual(self.expected([i for i in range(0, 30) if i % 3 != 0]), index.search('NOT color=red'))
+        self.assertEqual(self.expected([0, 10, 15, 25]), index.search('hat="top hat" AND (color=red OR color=green)'))
+        self.assertEqual(self.expected([i for i in range(0, 10) if i % 5 != 0]), index.search('tags=b AND NOT hat="top hat"'))
+        self.assertEqual([], index.search('color=purple'))
+
+    def test_query_spaces(self):
+        index = TraitIndex(self.directory)
+        index.update()
+
+        self.assertEqual(self.expected([0, 10, 20]), index.search('hat=top hat,size=small'))
+        self.assertEqual(self.expected([0, 10, 20]), index.search('hat=top hat , size=small'))
+        self.assertEqual(self.expected([0, 15]), index.search('hat=top hat AND color=red'))
+        self.assertEqual(self.expected([0, 15]), index.search('(hat=top hat) and color=red'))
+        self.assertEqual(self.expected([10, 25]), index.search('hat=top hat AND NOT color=red AND NOT color=blue'))
+
+    def test_query_keyword_in_value(self):
+        self.assertEqual(['scene="rock and roll"'], tokenize('scene="rock and roll"'))
+        self.assertRaises(Exception, tokenize, 'scene=rock and roll')
+        self.assertRaises(Exception, tokenize, 'scene=rock or roll, hat=cap')
+        self.assertRaises(Exception, tokenize, 'scene=rock not roll')
+
+    def test_invalid_query(self):
+        self.assertRaises(Exception, parse_query, 'color=red AND')
+        self.assertRaises(Exception, parse_query, '(color=red')
+        self.assertRaises(Exception, parse_query, 'color')
+
+    def test_incremental(self):
+        TraitIndex(self.directory).update()
+
+        index = TraitIndex(self.directory)
+        self.assertEqual(0, index.update())
+        self.assertEqual(self.expected(range(0, 30, 3)), index.search('color=red'))
+
+        # change one token, delete another
+        time.sleep(0.01)
+        self.write(3, {'name': 'Token 3', 'color': 'purple'})
+        os.remove(self.files[6])
+
+        index = TraitIndex(self.directory)
+        self.assertEqual(1, index.update())
+        self.assertEqual([self.files[3]], index.search('color=purple'))
+        self.assertEqual(self.expected([0] + list(range(9, 30, 3))), index.search('color=red'))
+        self.assertEqual(29, len(index))
+
+    def test_archive(self):
+        archive_file = os.path.join(self.directory, 'drop.tcrdrop')
+        DropArchive.create(archive_file, self.files)
+
+        index = TraitIndex(archive_file)
+        self.assertEqual(30, index.update())
+        self.assertEqual(self.expected(range(0, 30, 6)), index.search('color=red AND size=small'))
+        self.assertEqual(0, TraitIndex(archive_file).update())